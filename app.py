@@ -1,7 +1,23 @@
-import streamlit as st
+from emo_startup import startup_stage
 
-from emo_core import init_session_state, load_css, render_header
-from interface.ui import render_analyze_tab, render_compare_tab
+with startup_stage("import streamlit"):
+    import streamlit as st
+
+with startup_stage("import app modules"):
+    from emo_core import (
+        init_session_state,
+        load_css,
+        render_debug_panel,
+        render_header,
+        start_backend_warm_up,
+        start_metrics_endpoint,
+    )
+    from interface.ui import (
+        render_analyze_tab,
+        render_catalogue_tab,
+        render_compare_tab,
+        render_playlist_tab,
+    )
 
 
 # =========================================================
@@ -15,6 +31,12 @@ st.set_page_config(
     initial_sidebar_state="collapsed",
 )
 
+# Load and warm up the model in the background (once per process)
+start_backend_warm_up()
+
+# Optional Prometheus endpoint (EMOLYRICS_METRICS_PORT)
+start_metrics_endpoint()
+
 # Ensure session_state keys exist
 init_session_state()
 
@@ -30,8 +52,13 @@ def main() -> None:
     """Main entrypoint for the Streamlit app."""
     render_header()
 
-    tab_analyze, tab_compare = st.tabs(
-        ["Analyze your lyrics", "Compare versions of lyrics"]
+    tab_analyze, tab_compare, tab_playlist, tab_catalogue = st.tabs(
+        [
+            "Analyze your lyrics",
+            "Compare versions of lyrics",
+            "Playlist arc",
+            "Compare with the catalogue",
+        ]
     )
 
     with tab_analyze:
@@ -40,6 +67,15 @@ def main() -> None:
     with tab_compare:
         render_compare_tab()
 
+    with tab_playlist:
+        render_playlist_tab()
+
+    with tab_catalogue:
+        render_catalogue_tab()
+
+    # Stage timings, only with ?debug=1
+    render_debug_panel()
+
 
 if __name__ == "__main__":
     main()
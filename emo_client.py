@@ -0,0 +1,116 @@
+# emo_client.py
+"""Minimal client for the scoring service in emo_service.py."""
+from __future__ import annotations
+
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, List, Sequence
+
+
+# Base URL of the scoring service; when unset the app scores in-process
+SCORING_URL = os.environ.get("EMOLYRICS_SCORING_URL", "")
+
+REQUEST_TIMEOUT_SECONDS = 30.0
+
+# /score/batch limit of each service (base URL -> max texts per request),
+# as announced by its /schema endpoint or a 413 answer; see score_batch
+_REQUEST_LIMITS: Dict[str, int] = {}
+
+# 503 (service busy, see emo_service.MAX_INFLIGHT) is retried this many
+# times, waiting BUSY_BACKOFF_SECONDS, then twice that, ...
+BUSY_RETRIES = 3
+BUSY_BACKOFF_SECONDS = 0.25
+
+# /schema is read while a page renders, so it must fail fast
+SCHEMA_TIMEOUT_SECONDS = 2.0
+
+
+def _post_json(url: str, body: dict, timeout: float) -> dict:
+    """
+    POST body as JSON and return the decoded answer, retrying 503s.
+
+    Raises OSError (urllib.error.HTTPError / URLError, timeouts) on failure.
+    """
+    data = json.dumps(body).encode("utf-8")
+    request = urllib.request.Request(
+        url,
+        data=data,
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    for attempt in range(BUSY_RETRIES + 1):
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                return json.loads(response.read().decode("utf-8"))
+        except urllib.error.HTTPError as exc:
+            if exc.code != 503 or attempt == BUSY_RETRIES:
+                raise
+            time.sleep(BUSY_BACKOFF_SECONDS * 2 ** attempt)
+
+
+def score_batch(
+    texts: Sequence[str],
+    base_url: str = SCORING_URL,
+    timeout: float = REQUEST_TIMEOUT_SECONDS,
+) -> List[Dict[str, float]]:
+    """
+    Score many texts with /score/batch, in input order.
+
+    Texts are sent in requests of at most the service's limit
+    (emo_service.MAX_REQUEST_TEXTS, learned from /schema). If the limit
+    is not known yet, or the service was reconfigured, a 413 answer
+    carries the limit and the remaining texts are split accordingly.
+    """
+    url = base_url.rstrip("/") + "/score/batch"
+    scores: List[Dict[str, float]] = []
+    start = 0
+    while start < len(texts):
+        limit = _REQUEST_LIMITS.get(base_url, len(texts))
+        chunk = list(texts[start:start + limit])
+        try:
+            scores.extend(_post_json(url, {"lyrics": chunk}, timeout)["scores"])
+        except urllib.error.HTTPError as exc:
+            new_limit = _limit_from_error(exc) if exc.code == 413 else None
+            if new_limit is None or new_limit >= len(chunk):
+                raise
+            _REQUEST_LIMITS[base_url] = new_limit
+            continue
+        start += len(chunk)
+    return scores
+
+
+def _limit_from_error(exc: urllib.error.HTTPError) -> int | None:
+    """max_request_texts of a 413 answer, if it has one."""
+    try:
+        limit = json.loads(exc.read().decode("utf-8")).get("max_request_texts")
+    except (OSError, ValueError, AttributeError):
+        return None
+    return int(limit) if isinstance(limit, int) and limit > 0 else None
+
+
+def get_schema(base_url: str = SCORING_URL, timeout: float = SCHEMA_TIMEOUT_SECONDS):
+    """
+    EmotionSchema of the model behind the service (GET /schema).
+
+    Raises OSError (urllib.error.URLError, timeouts) if the service cannot
+    be reached.
+    """
+    from emo_scores import EmotionSchema
+
+    with urllib.request.urlopen(base_url.rstrip("/") + "/schema", timeout=timeout) as response:
+        data = json.loads(response.read().decode("utf-8"))
+    if isinstance(data.get("max_request_texts"), int):
+        _REQUEST_LIMITS[base_url] = data["max_request_texts"]
+    return EmotionSchema.from_dict(data)
+
+
+def is_healthy(base_url: str = SCORING_URL, timeout: float = 2.0) -> bool:
+    """True if the service answers /health."""
+    try:
+        with urllib.request.urlopen(base_url.rstrip("/") + "/health", timeout=timeout):
+            return True
+    except OSError:
+        return False
@@ -1,63 +1,217 @@
 # emo_core.py
 from __future__ import annotations
 
-import random
+import codecs
+import hashlib
+import os
+import sys
+import threading
+import time
+import uuid
+import zipfile
 from pathlib import Path
-from typing import Dict
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Tuple
 
-import altair as alt
-import pandas as pd
+import numpy as np
 import streamlit as st
 
+from emo_metrics import (
+    TEXTS_SCORED,
+    TRACK_CACHE_BYTES,
+    TRACK_CACHE_ENTRIES,
+    observe_batch,
+    timed,
+)
+from emo_scores import (  # EMOTION_ORDER / COLOR_MAP re-exported for callers
+    COLOR_MAP,
+    DEFAULT_SCHEMA,
+    EMOTION_ORDER,
+    EmotionSchema,
+    matrix_to_scores,
+    normalize_rows,
+    scores_to_matrix,
+    summarize,
+)
+
+# pandas and altair are imported where they are first used, so that
+# importing this module (and starting the app) stays cheap
+if TYPE_CHECKING:
+    import pandas as pd
+
 
 # =========================================================
 # Config / constants
 # =========================================================
 
-# Fixed order of emotions in the chart
-EMOTION_ORDER = ["Anger", "Fear", "Joy", "Love", "Sadness", "Surprise"]
-
-# Color palette for each emotion
-COLOR_MAP = {
-    "Anger": "#E63946",
-    "Fear": "#F4A261",
-    "Joy": "#2A9D8F",
-    "Love": "#E76F51",
-    "Sadness": "#457B9D",
-    "Surprise": "#8D99AE",
-}
+# Default emotion order and colors live in emo_scores (EMOTION_ORDER,
+# COLOR_MAP). The emotions actually shown come from the loaded model:
+# see get_emotion_schema().
 
 # Session state keys
 SESSION_KEY_SCORES = "current_emotion_scores"
 SESSION_KEY_LYRICS = "current_lyrics"
 SESSION_KEY_VERSIONS = "saved_versions_df"
+SESSION_KEY_SCHEMA = "emotion_schema"
+SESSION_KEY_TIMELINE = "current_emotion_timeline"
+SESSION_KEY_ATTRIBUTION = "current_attribution"
+SESSION_KEY_PLAYLIST = "current_playlist"
+SESSION_KEY_UPLOADED_TRACKS = "uploaded_playlist_tracks"
+SESSION_KEY_ID = "session_id"
+
+# Keys whose values live in the server-side session store (emo_sessions),
+# which bounds their memory; st.session_state only keeps SESSION_KEY_ID
+# and the schema. Read / write them with session_get() / session_set().
+SESSION_STORED_KEYS = (
+    SESSION_KEY_SCORES,
+    SESSION_KEY_LYRICS,
+    SESSION_KEY_VERSIONS,
+    SESSION_KEY_TIMELINE,
+    SESSION_KEY_ATTRIBUTION,
+    SESSION_KEY_PLAYLIST,
+    SESSION_KEY_UPLOADED_TRACKS,
+)
 
 # Paths (relative to project root)
 BASE_DIR = Path(__file__).parent
 CSS_FILE = BASE_DIR / "interface/styles.css"
 TEMPLATES_FILE = BASE_DIR / "interface/templates.html"
+CUBE_FILE = BASE_DIR / "data/emotion_cube.parquet"  # training/build_emotion_cube.py
 
 # Templates cache
 TEMPLATES_CACHE: str | None = None  # loaded lazily
 
+# Batch scoring / uploads
+SCORING_BATCH_SIZE = 32  # texts per encoder pass (same as the training notebook)
+UPLOAD_CHUNK_BYTES = 64 * 1024  # bytes read per step when decoding uploads
+
+# Emotion timeline: windows of TIMELINE_WINDOW_LINES lines, one every
+# TIMELINE_STRIDE_LINES lines, scored TIMELINE_CHUNK_SIZE windows at a time
+TIMELINE_WINDOW_LINES = 8
+TIMELINE_STRIDE_LINES = 2
+TIMELINE_CHUNK_SIZE = SCORING_BATCH_SIZE
+
+# Explain mode: at most this many occluded variants per song (adjacent
+# lines / stanzas are merged beyond it), and lines highlighted as top
+MAX_OCCLUSION_VARIANTS = 64
+ATTRIBUTION_TOP_K = 3
+
+# Playlist mode: per-track scores are cached process-wide by lyrics hash
+# (LRU, shared by all sessions, at most PLAYLIST_CACHE_TRACKS entries and
+# PLAYLIST_CACHE_BYTES of keys plus score rows)
+PLAYLIST_CACHE_TRACKS = 20_000
+PLAYLIST_CACHE_BYTES = int(float(os.environ.get("EMOLYRICS_TRACK_CACHE_MB", "16")) * 1e6)
+_TRACK_CACHE: OrderedDict[Tuple[Tuple[str, ...], str], np.ndarray] = OrderedDict()
+_TRACK_CACHE_LOCK = threading.Lock()
+_TRACK_CACHE_SIZE = [0]  # bytes held by _TRACK_CACHE, guarded by its lock
+
+# Scoring backend: "remote" (HTTP service), "local" (in-process model),
+# "stub" (random scores with simulated model latency, for load tests) or
+# "random" (placeholder). Setting EMOLYRICS_SCORING_URL implies "remote".
+SCORING_BACKEND = os.environ.get(
+    "EMOLYRICS_BACKEND",
+    "remote" if os.environ.get("EMOLYRICS_SCORING_URL") else "random",
+)
+
+# Schema of the scoring backend (see get_emotion_schema); after a failed
+# /schema request the service is asked again at most every
+# SCHEMA_RETRY_SECONDS
+_BACKEND_SCHEMA: EmotionSchema | None = None
+_SCHEMA_RETRY_AT = 0.0
+SCHEMA_RETRY_SECONDS = 30.0
+
+# Simulated cost of the "stub" backend: fixed per call + per 1000 chars
+STUB_BASE_MS = float(os.environ.get("EMOLYRICS_STUB_BASE_MS", "20"))
+STUB_MS_PER_KCHAR = float(os.environ.get("EMOLYRICS_STUB_MS_PER_KCHAR", "15"))
+
 
 # =========================================================
 # Session state init
 # =========================================================
 
 def init_session_state() -> None:
-    """Ensure all required session_state keys exist."""
-    if SESSION_KEY_SCORES not in st.session_state:
-        st.session_state[SESSION_KEY_SCORES] = {
-            emotion: 0.0 for emotion in EMOTION_ORDER
-        }
+    """
+    Ensure all required session keys exist.
+
+    If the model's emotion schema changed since the session was created
+    (e.g. a checkpoint with other classes was deployed), scores are reset
+    and saved versions get the new emotion columns. Values dropped from
+    the session store after its TTL are recreated empty here.
+    """
+    if SESSION_KEY_ID not in st.session_state:
+        st.session_state[SESSION_KEY_ID] = uuid.uuid4().hex
+    store = get_session_store()
+    session_id = st.session_state[SESSION_KEY_ID]
+    store.touch(session_id)
+
+    # Until the backend's schema is known, sessions run on DEFAULT_SCHEMA
+    # and nothing is migrated; a session created that way adopts the
+    # real schema once it is known, keeping any scores it already has
+    emotions = list(get_emotion_schema().emotions)
+    stored_emotions = st.session_state.get(SESSION_KEY_SCHEMA)
+    schema_changed = False
+    if emotion_schema_resolved():
+        schema_changed = stored_emotions is not None and stored_emotions != emotions
+        st.session_state[SESSION_KEY_SCHEMA] = emotions
+        if stored_emotions is None and store.contains(session_id, SESSION_KEY_SCORES):
+            scores = session_get(SESSION_KEY_SCORES)
+            if set(scores) != set(emotions) and not any(scores.values()):
+                session_set(SESSION_KEY_SCORES, {emotion: 0.0 for emotion in emotions})
+            if store.contains(session_id, SESSION_KEY_VERSIONS):
+                cols = ["version_id", "title", "lyrics"] + emotions
+                session_set(
+                    SESSION_KEY_VERSIONS,
+                    session_get(SESSION_KEY_VERSIONS).reindex(columns=cols, fill_value=0.0),
+                )
+    elif SCORING_BACKEND == "remote":
+        st.warning("The scoring service is not reachable; showing the default emotions.")
+
+    if not store.contains(session_id, SESSION_KEY_SCORES) or schema_changed:
+        session_set(SESSION_KEY_SCORES, {emotion: 0.0 for emotion in emotions})
+
+    if not store.contains(session_id, SESSION_KEY_LYRICS):
+        session_set(SESSION_KEY_LYRICS, "")
+
+    if not store.contains(session_id, SESSION_KEY_TIMELINE) or schema_changed:
+        session_set(SESSION_KEY_TIMELINE, None)
 
-    if SESSION_KEY_LYRICS not in st.session_state:
-        st.session_state[SESSION_KEY_LYRICS] = ""
+    if not store.contains(session_id, SESSION_KEY_ATTRIBUTION) or schema_changed:
+        session_set(SESSION_KEY_ATTRIBUTION, None)
 
-    if SESSION_KEY_VERSIONS not in st.session_state:
-        cols = ["version_id", "title", "lyrics"] + EMOTION_ORDER
-        st.session_state[SESSION_KEY_VERSIONS] = pd.DataFrame(columns=cols)
+    if not store.contains(session_id, SESSION_KEY_PLAYLIST) or schema_changed:
+        session_set(SESSION_KEY_PLAYLIST, None)
+
+    if not store.contains(session_id, SESSION_KEY_UPLOADED_TRACKS):
+        session_set(SESSION_KEY_UPLOADED_TRACKS, None)
+
+    cols = ["version_id", "title", "lyrics"] + emotions
+    if not store.contains(session_id, SESSION_KEY_VERSIONS):
+        import pandas as pd
+
+        session_set(SESSION_KEY_VERSIONS, pd.DataFrame(columns=cols))
+    elif schema_changed:
+        session_set(
+            SESSION_KEY_VERSIONS,
+            session_get(SESSION_KEY_VERSIONS).reindex(columns=cols, fill_value=0.0),
+        )
+
+
+@st.cache_resource(show_spinner=False)
+def get_session_store():
+    """Process-wide store for SESSION_STORED_KEYS (see emo_sessions)."""
+    from emo_sessions import SessionStore
+
+    return SessionStore()
+
+
+def session_get(key: str):
+    """Value of a SESSION_STORED_KEYS key for the current session."""
+    return get_session_store().get(st.session_state[SESSION_KEY_ID], key)
+
+
+def session_set(key: str, value) -> None:
+    """Store a SESSION_STORED_KEYS value for the current session (accounted)."""
+    get_session_store().set(st.session_state[SESSION_KEY_ID], key, value)
 
 
 # =========================================================
@@ -121,52 +275,554 @@ def render_header() -> None:
         st.markdown(header_html, unsafe_allow_html=True)
 
 
-def render_result_card(emotion: str, score: float) -> None:
+def render_result_card(
+    emotion: str,
+    score: float,
+    confidence: float | None = None,
+    ambiguous: bool = False,
+) -> None:
     """Fill and render the RESULT_CARD_TEMPLATE block."""
     template = get_template_block("RESULT_CARD_TEMPLATE")
     if not template:
         return
 
+    note = ""
+    if confidence is not None:
+        note = f"Confidence: <b>{confidence:.0%}</b>"
+        if ambiguous:
+            note += " · mixed emotions"
+
     html = (
         template.replace("{{EMOTION_CLASS}}", emotion)
+        .replace("{{EMOTION_COLOR}}", get_emotion_schema().color_map.get(emotion, "inherit"))
         .replace("{{EMOTION_NAME}}", emotion.upper())
         .replace("{{SCORE}}", f"{score:.1%}")
+        .replace("{{CONFIDENCE_NOTE}}", note)
     )
     st.markdown(html, unsafe_allow_html=True)
 
 
+def render_attribution_panel(attribution: Dict[str, object], emotion: str) -> None:
+    """
+    Render the lyrics with each line highlighted by its contribution to emotion.
+
+    Fills ATTRIBUTION_PANEL_TEMPLATE with one ATTRIBUTION_LINE_TEMPLATE per
+    unit; the ATTRIBUTION_TOP_K strongest units get a rank badge.
+    """
+    import html
+
+    panel = get_template_block("ATTRIBUTION_PANEL_TEMPLATE")
+    line_template = get_template_block("ATTRIBUTION_LINE_TEMPLATE")
+    if not panel or not line_template:
+        return
+
+    schema = get_emotion_schema()
+    contributions = attribution["contributions"][:, schema.emotions.index(emotion)]
+    scale = max(float(np.abs(contributions).max()), 1e-9)
+    ranks = {int(i): r + 1 for r, i in enumerate(np.argsort(-contributions)[:ATTRIBUTION_TOP_K])}
+    color = schema.color_map[emotion]
+
+    lines_html = []
+    for i, (unit, value) in enumerate(zip(attribution["units"], contributions)):
+        alpha = int(round(max(value, 0.0) / scale * 0x60))
+        rank = ranks.get(i) if value > 0 else None
+        lines_html.append(
+            line_template.replace("{{LINE_COLOR}}", f"{color}{alpha:02X}")
+            .replace("{{CONTRIBUTION}}", f"{value * 100:+.1f} pts")
+            .replace("{{RANK}}", f"#{rank}" if rank else "")
+            .replace("{{LINE_TEXT}}", "<br>".join(html.escape(line) for line in unit))
+        )
+
+    st.markdown(
+        panel.replace("{{EMOTION_NAME}}", emotion.upper())
+        .replace("{{EMOTION_COLOR}}", color)
+        .replace("{{LINES}}", "\n".join(lines_html)),
+        unsafe_allow_html=True,
+    )
+
+
+def render_scores_result_card(scores: Dict[str, float]) -> None:
+    """Render the result card for a {emotion: score} dict."""
+    summary = summarize_scores(scores)
+    emotion, score = summary["top"][0]
+    render_result_card(emotion, score, summary["confidence"], summary["ambiguous"])
+
+
 # =========================================================
 # Model / scores
 # =========================================================
 
+def get_emotion_schema() -> EmotionSchema:
+    """
+    Emotions (and colors) of the active scoring backend.
+
+    Comes from the checkpoint's label_classes (local), the service's
+    /schema endpoint (remote), or DEFAULT_SCHEMA (random / stub). Never
+    loads the model: until the backend's schema is known (a legacy .pt
+    checkpoint still loading in the warm-up thread, an unreachable
+    service) DEFAULT_SCHEMA is returned; see emotion_schema_resolved().
+    """
+    if _BACKEND_SCHEMA is None:
+        _resolve_backend_schema()
+    return _BACKEND_SCHEMA or DEFAULT_SCHEMA
+
+
+def emotion_schema_resolved() -> bool:
+    """True once get_emotion_schema() returns the backend's own schema."""
+    return _BACKEND_SCHEMA is not None
+
+
+def _resolve_backend_schema() -> None:
+    """Set _BACKEND_SCHEMA if the backend can tell its schema cheaply."""
+    global _BACKEND_SCHEMA, _SCHEMA_RETRY_AT
+    if SCORING_BACKEND == "local":
+        from emo_inference import peek_schema
+
+        _BACKEND_SCHEMA = peek_schema()
+    elif SCORING_BACKEND == "remote":
+        if time.monotonic() < _SCHEMA_RETRY_AT:
+            return
+        from emo_client import get_schema
+
+        try:
+            _BACKEND_SCHEMA = get_schema()
+        except (OSError, ValueError, KeyError) as exc:
+            _SCHEMA_RETRY_AT = time.monotonic() + SCHEMA_RETRY_SECONDS
+            print(f"Warning: cannot read the scoring service schema ({exc}); using the default emotions.")
+    else:
+        _BACKEND_SCHEMA = DEFAULT_SCHEMA
+
+
 def generate_emotion_scores(lyrics: str) -> Dict[str, float]:
     """
     Generate emotion scores for a given lyrics string.
 
-    AHORA MISMO: placeholder con valores aleatorios normalizados.
-    SUSTITUYE este cuerpo por tu pipeline real:
-      - SentenceTransformer(all-MiniLM-L6-v2)
-      - Red 768x9 + softmax
+    Thin wrapper over generate_emotion_scores_batch() with a batch of one.
 
     Devuelve un dict {emotion: score} donde los scores suelen sumar 1.
     """
-    raw_values = {emotion: random.random() for emotion in EMOTION_ORDER}
-    total = sum(raw_values.values()) or 1.0
-    return {k: v / total for k, v in raw_values.items()}
+    return generate_emotion_scores_batch([lyrics])[0]
+
+
+def generate_emotion_scores_batch(lyrics_list: List[str]) -> List[Dict[str, float]]:
+    """
+    Generate emotion scores for many lyrics in a single batched pass.
+
+    Returns one {emotion: score} dict per input, in the same order.
+    """
+    emotions = get_emotion_schema().emotions
+    return matrix_to_scores(generate_emotion_matrix(lyrics_list), emotions)
+
+
+def generate_emotion_matrix(lyrics_list: List[str]) -> np.ndarray:
+    """
+    Score many lyrics; returns a (len(lyrics_list), n_emotions) matrix with
+    columns in get_emotion_schema() order.
+
+    The backend is chosen by SCORING_BACKEND:
+      - "remote": POST to the scoring service at EMOLYRICS_SCORING_URL
+      - "local": load the checkpoint in-process (emo_inference)
+      - "stub": random scores with simulated latency (load tests)
+      - "random": placeholder con valores aleatorios normalizados
+
+    Calibration is applied by the model backends (local / remote).
+    """
+    emotions = get_emotion_schema().emotions
+    if not lyrics_list:
+        return np.zeros((0, len(emotions)))
+
+    with timed("score_batch"):
+        if SCORING_BACKEND == "remote":
+            from emo_client import score_batch
+
+            observe_batch(len(lyrics_list), source="remote")
+            matrix = scores_to_matrix(score_batch(lyrics_list), emotions)
+            TEXTS_SCORED.inc(len(lyrics_list), backend="remote")
+        elif SCORING_BACKEND == "local":
+            from emo_inference import score_matrix
+
+            matrix = score_matrix(lyrics_list)
+        elif SCORING_BACKEND == "stub":
+            matrix = _stub_scores_matrix(lyrics_list, len(emotions))
+        else:
+            matrix = _random_scores_matrix(lyrics_list, len(emotions))
+    return matrix
+
+
+def iter_emotion_timeline(
+    lyrics: str,
+    window: int = TIMELINE_WINDOW_LINES,
+    stride: int = TIMELINE_STRIDE_LINES,
+) -> Iterator[Tuple[List[int], np.ndarray]]:
+    """
+    Score sliding windows of `window` lines every `stride` lines.
+
+    Yields (window_starts, scores matrix) chunks as they are scored, so
+    the timeline can be drawn progressively. The local backend encodes
+    each block of lines once and pools overlapping windows from those
+    embeddings (emo_inference.iter_window_matrix); other backends score
+    the window texts, TIMELINE_CHUNK_SIZE per batch.
+    """
+    from emo_text import split_lines, window_texts
+
+    lines = split_lines(lyrics)
+    if not lines:
+        return
+
+    if SCORING_BACKEND == "local":
+        from emo_inference import iter_window_matrix
+
+        yield from iter_window_matrix(lines, window, stride, TIMELINE_CHUNK_SIZE)
+        return
+
+    texts, starts = window_texts(lines, window, stride)
+    for i in range(0, len(texts), TIMELINE_CHUNK_SIZE):
+        chunk = slice(i, i + TIMELINE_CHUNK_SIZE)
+        yield starts[chunk], generate_emotion_matrix(texts[chunk])
+
+
+def explain_emotions(lyrics: str, by: str = "line") -> Dict[str, object] | None:
+    """
+    Occlusion attribution: how much each line (or stanza) adds to each emotion.
+
+    Every unit is removed in turn and all variants are scored in one batch;
+    the contribution of a unit is the score of all units minus the score
+    without it. Both are scored the same way (same text preparation, same
+    model), so contributions carry no baseline bias.
+    Units are merged so there are at most MAX_OCCLUSION_VARIANTS variants.
+    Returns {"units": [[line, ...], ...], "contributions": (n_units,
+    n_emotions) matrix}, or None for lyrics with fewer than two units.
+    """
+    from emo_text import group_units, split_lines, split_stanzas
+
+    if by == "stanza":
+        units = split_stanzas(lyrics)
+    else:
+        units = [[line] for line in split_lines(lyrics)]
+    units = group_units(units, MAX_OCCLUSION_VARIANTS)
+    if len(units) < 2:
+        return None
+
+    with timed("explain"):
+        if SCORING_BACKEND == "local":
+            from emo_inference import occlusion_matrix
+
+            full, occluded = occlusion_matrix(["\n".join(unit) for unit in units])
+        else:
+            texts = ["\n".join(sum(units, []))] + [
+                "\n".join(sum(units[:i] + units[i + 1:], [])) for i in range(len(units))
+            ]
+            matrix = generate_emotion_matrix(texts)
+            full, occluded = matrix[0], matrix[1:]
+
+    return {"units": units, "contributions": full[None, :] - occluded}
+
+
+def score_playlist(tracks: List[str]) -> Tuple[np.ndarray, int]:
+    """
+    (n_tracks, n_emotions) scores of a playlist's lyrics, in track order.
+
+    Tracks already in the track cache (same lyrics and schema, from this
+    or any other session) are not rescored; the rest are scored in one
+    generate_emotion_matrix() call. Returns the matrix and the number of
+    cache hits.
+    """
+    emotions = tuple(get_emotion_schema().emotions)
+    keys = [(emotions, hashlib.sha1(text.encode("utf-8")).hexdigest()) for text in tracks]
+
+    matrix = np.zeros((len(tracks), len(emotions)))
+    missing: Dict[Tuple[Tuple[str, ...], str], List[int]] = {}
+    with _TRACK_CACHE_LOCK:
+        for i, key in enumerate(keys):
+            if key in _TRACK_CACHE:
+                _TRACK_CACHE.move_to_end(key)
+                matrix[i] = _TRACK_CACHE[key]
+            else:
+                missing.setdefault(key, []).append(i)  # duplicates scored once
+
+    if missing:
+        with timed("playlist_score"):
+            first = [rows[0] for rows in missing.values()]
+            scored = generate_emotion_matrix([tracks[i] for i in first])
+        with _TRACK_CACHE_LOCK:
+            for (key, rows), row in zip(missing.items(), scored):
+                matrix[rows] = row
+                if key not in _TRACK_CACHE:
+                    row = np.array(row)  # own copy: a view would pin the whole batch
+                    _TRACK_CACHE[key] = row
+                    _TRACK_CACHE_SIZE[0] += _track_entry_bytes(key, row)
+            while _TRACK_CACHE and (
+                len(_TRACK_CACHE) > PLAYLIST_CACHE_TRACKS
+                or _TRACK_CACHE_SIZE[0] > PLAYLIST_CACHE_BYTES
+            ):
+                _TRACK_CACHE_SIZE[0] -= _track_entry_bytes(*_TRACK_CACHE.popitem(last=False))
+            _publish_track_cache_stats()
+
+    n_hits = len(tracks) - sum(len(rows) for rows in missing.values())
+    return matrix, n_hits
+
+
+def _track_entry_bytes(key: Tuple[Tuple[str, ...], str], row: np.ndarray) -> int:
+    """Memory of one track cache entry (the emotions tuple is shared)."""
+    return sys.getsizeof(key) + sys.getsizeof(key[1]) + sys.getsizeof(row)
+
+
+def _publish_track_cache_stats() -> None:
+    """Update the track cache gauges; call with _TRACK_CACHE_LOCK held."""
+    TRACK_CACHE_ENTRIES.set(len(_TRACK_CACHE))
+    TRACK_CACHE_BYTES.set(_TRACK_CACHE_SIZE[0])
+
+
+def track_cache_stats() -> Dict[str, int]:
+    """Entry count and estimated bytes of the process-wide track cache."""
+    with _TRACK_CACHE_LOCK:
+        return {"entries": len(_TRACK_CACHE), "bytes": _TRACK_CACHE_SIZE[0]}
+
+
+def summarize_scores(scores: Dict[str, float]) -> Dict[str, object]:
+    """Top-k, confidence and ambiguous flag for one {emotion: score} dict."""
+    emotions = get_emotion_schema().emotions
+    return summarize(scores_to_matrix([scores], emotions), emotions)[0]
+
+
+@st.cache_resource(show_spinner=False)
+def start_backend_warm_up() -> threading.Thread:
+    """
+    Warm up the scoring backend once per server process, in the background.
+
+    The UI renders immediately; the first analysis blocks on the model lock
+    only if warm-up has not finished yet. Call it at the top of the app.
+    """
+    thread = threading.Thread(
+        target=_warm_up_backend,
+        name="emolyrics-warm-up",
+        daemon=True,
+    )
+    thread.start()
+    return thread
+
+
+def _warm_up_backend() -> None:
+    from emo_startup import log_startup_report, startup_stage
+
+    with startup_stage("import charts"):
+        import altair  # noqa: F401
+        import pandas  # noqa: F401
+
+    if SCORING_BACKEND == "local":
+        from emo_inference import warm_up
+
+        warm_up()
+    elif SCORING_BACKEND == "remote":
+        from emo_client import is_healthy
+
+        with startup_stage("scoring service check"):
+            if not is_healthy():
+                print("Warning: scoring service is not reachable yet.")
+    # The model is loaded (or the service checked): pages rendered from now
+    # on get the backend's schema without waiting
+    _resolve_backend_schema()
+
+    log_startup_report()
+
+
+def _stub_scores_matrix(lyrics_list: List[str], n_emotions: int) -> np.ndarray:
+    """Random scores after sleeping as long as a real encoder pass might take."""
+    total_chars = sum(len(lyrics) for lyrics in lyrics_list)
+    time.sleep((STUB_BASE_MS + STUB_MS_PER_KCHAR * total_chars / 1000) / 1000)
+    return _random_scores_matrix(lyrics_list, n_emotions)
+
+
+def _random_scores_matrix(lyrics_list: List[str], n_emotions: int) -> np.ndarray:
+    """Placeholder scorer: random normalized values per text."""
+    return normalize_rows(np.random.random((len(lyrics_list), n_emotions)))
+
+
+# =========================================================
+# Uploads (streamed decoding)
+# =========================================================
+
+def read_text_stream(fileobj, chunk_size: int = UPLOAD_CHUNK_BYTES) -> str:
+    """
+    Decode a binary file-like object as UTF-8, chunk by chunk.
+
+    Uses an incremental decoder so multi-byte characters split across
+    chunks are handled correctly and invalid bytes are ignored.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    parts = []
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        parts.append(decoder.decode(chunk))
+    parts.append(decoder.decode(b"", final=True))
+    return "".join(parts)
+
+
+def count_uploaded_texts(uploaded_files: Iterable) -> int:
+    """
+    Number of documents iter_uploaded_texts() will yield for the uploads.
+
+    Uses the same filter (non-empty files, .txt archive members), so a
+    progress bar over the yielded documents ends at exactly 1.0.
+    """
+    total = 0
+    for uploaded in uploaded_files:
+        if uploaded.name.lower().endswith(".zip"):
+            uploaded.seek(0)
+            with zipfile.ZipFile(uploaded) as zf:
+                total += len(_txt_members(zf))
+            uploaded.seek(0)
+        elif uploaded.size > 0:
+            total += 1
+    return total
+
+
+def iter_uploaded_texts(uploaded_files: Iterable) -> Iterator[Tuple[str, str]]:
+    """
+    Yield (name, text) for every non-empty .txt upload, expanding .zip archives.
+
+    Files are decoded one at a time so only the current document is held
+    in memory as text.
+    """
+    for uploaded in uploaded_files:
+        uploaded.seek(0)
+        if uploaded.name.lower().endswith(".zip"):
+            with zipfile.ZipFile(uploaded) as zf:
+                for info in _txt_members(zf):
+                    with zf.open(info) as member:
+                        yield Path(info.filename).stem, read_text_stream(member)
+        elif uploaded.size > 0:
+            yield Path(uploaded.name).stem, read_text_stream(uploaded)
+
+
+def decode_uploaded_tracks(uploaded_files: List) -> List[Tuple[str, str]]:
+    """
+    (name, text) of the non-blank uploaded documents, decoded once.
+
+    The result is kept in the session store keyed by the uploads' file ids
+    and sizes, so Streamlit reruns with the same files do not decode (or
+    unzip) them again.
+    """
+    key = [[getattr(f, "file_id", f.name), f.size] for f in uploaded_files]
+    cached = session_get(SESSION_KEY_UPLOADED_TRACKS)
+    if cached is not None and cached["key"] == key:
+        return [tuple(track) for track in cached["tracks"]]
+    tracks = [(name, text) for name, text in iter_uploaded_texts(uploaded_files) if text.strip()]
+    session_set(SESSION_KEY_UPLOADED_TRACKS, {"key": key, "tracks": [list(t) for t in tracks]})
+    return tracks
+
+
+def _txt_members(zf: zipfile.ZipFile) -> List[zipfile.ZipInfo]:
+    """Non-empty .txt file members of an archive."""
+    return [
+        info for info in zf.infolist()
+        if not info.is_dir() and info.file_size > 0 and _is_txt_member(info.filename)
+    ]
+
+
+def _is_txt_member(name: str) -> bool:
+    """True for .txt zip members, skipping macOS resource forks."""
+    return name.lower().endswith(".txt") and not name.startswith("__MACOSX/")
 
 
 # =========================================================
-# Versions storage (session only, no disk)
+# Versions storage (session store)
 # =========================================================
 
 def load_versions() -> pd.DataFrame:
-    """Load saved versions from session state."""
-    return st.session_state[SESSION_KEY_VERSIONS]
+    """Load saved versions from the session store."""
+    return session_get(SESSION_KEY_VERSIONS)
 
 
 def save_versions(df: pd.DataFrame) -> None:
-    """Persist versions DataFrame in session state."""
-    st.session_state[SESSION_KEY_VERSIONS] = df
+    """Persist versions DataFrame in the session store."""
+    session_set(SESSION_KEY_VERSIONS, df)
+
+
+def make_version_row(
+    title: str,
+    lyrics: str,
+    scores: Dict[str, float],
+) -> Dict[str, object]:
+    """Build one row of the versions DataFrame."""
+    row: Dict[str, object] = {
+        "version_id": str(uuid.uuid4()),
+        "title": title,
+        "lyrics": lyrics,
+    }
+    for emo in get_emotion_schema().emotions:
+        row[emo] = float(scores.get(emo, 0.0))
+    return row
+
+
+def append_versions(rows: List[Dict[str, object]]) -> None:
+    """Append several version rows to the session versions in one concat."""
+    if not rows:
+        return
+    import pandas as pd
+
+    with timed("save_version"):
+        df = pd.concat([load_versions(), pd.DataFrame(rows)], ignore_index=True)
+        save_versions(df)
+
+
+# =========================================================
+# Catalogue aggregates (emotion cube)
+# =========================================================
+
+# Cube dimensions shown in the UI: label -> dimension stored in the file
+CUBE_DIMENSIONS = {
+    "Genre × decade": "genre_decade",
+    "Genre": "genre",
+    "Decade": "decade",
+    "Year": "year",
+    "Artist": "artist",
+}
+
+
+@st.cache_resource(show_spinner="Loading catalogue aggregates...")
+def load_emotion_cube() -> pd.DataFrame | None:
+    """
+    The precomputed cube indexed by (dimension, key), or None if not built.
+
+    Loaded once per process; lookups are index lookups on a few thousand
+    rows instead of queries over the song dataset.
+    """
+    if not CUBE_FILE.exists():
+        return None
+    import pandas as pd
+
+    return pd.read_parquet(CUBE_FILE).set_index(["dimension", "key"]).sort_index()
+
+
+def cube_keys(cube: pd.DataFrame, dimension: str) -> List[str]:
+    """Group names of one dimension, largest groups first."""
+    if dimension not in cube.index.get_level_values("dimension"):
+        return []
+    return cube.loc[dimension].sort_values("count", ascending=False).index.tolist()
+
+
+def cube_profile(cube: pd.DataFrame, dimension: str, key: str, stat: str = "mean") -> Dict[str, float]:
+    """{emotion: value} of a group for stat ("mean", "p10", "p50" or "p90")."""
+    row = cube.loc[(dimension, key)]
+    return {
+        emo: float(row.get(f"{emo}_{stat}", 0.0))
+        for emo in get_emotion_schema().emotions
+    }
+
+
+@st.cache_resource(show_spinner="Loading similar-songs graph...")
+def load_similarity_graph():
+    """
+    The memory-mapped similar-songs graph (emo_graph), or None if not built.
+
+    Opened once per process; queries only read the pages they visit.
+    """
+    from emo_graph import load_graph
+
+    return load_graph()
 
 
 # =========================================================
@@ -178,6 +834,18 @@ def render_emotion_chart(
     placeholder: st.delta_generator.DeltaGenerator,
 ) -> None:
     """Render the emotion bar chart given a dict of scores."""
+    with timed("render_chart"):
+        _render_emotion_chart(scores, placeholder)
+
+
+def _render_emotion_chart(
+    scores: Dict[str, float],
+    placeholder: st.delta_generator.DeltaGenerator,
+) -> None:
+    import altair as alt
+    import pandas as pd
+
+    schema = get_emotion_schema()
     df = pd.DataFrame(list(scores.items()), columns=["Emotion", "Score"])
 
     max_val = df["Score"].max()
@@ -194,7 +862,7 @@ def render_emotion_chart(
         .encode(
             x=alt.X(
                 "Emotion",
-                sort=EMOTION_ORDER,
+                sort=list(schema.emotions),
                 axis=alt.Axis(
                     labelAngle=0,
                     title=None,
@@ -219,8 +887,8 @@ def render_emotion_chart(
             color=alt.Color(
                 "Emotion",
                 scale=alt.Scale(
-                    domain=list(COLOR_MAP.keys()),
-                    range=list(COLOR_MAP.values()),
+                    domain=list(schema.emotions),
+                    range=list(schema.colors),
                 ),
                 legend=None,
             ),
@@ -237,15 +905,184 @@ def render_emotion_chart(
     placeholder.altair_chart(chart, use_container_width=True)
 
 
+def render_emotion_timeline(
+    starts: List[int],
+    matrix: np.ndarray,
+    window: int,
+    placeholder: st.delta_generator.DeltaGenerator,
+) -> None:
+    """
+    Render a stacked area chart of window scores along the song.
+
+    x = first line of each window, one stacked band per emotion.
+    """
+    with timed("render_timeline"):
+        _render_emotion_timeline(starts, matrix, window, placeholder)
+
+
+def _render_emotion_timeline(
+    starts: List[int],
+    matrix: np.ndarray,
+    window: int,
+    placeholder: st.delta_generator.DeltaGenerator,
+) -> None:
+    import altair as alt
+    import pandas as pd
+
+    schema = get_emotion_schema()
+    emotions = list(schema.emotions)
+    n_windows = len(starts)
+    line = np.asarray(starts, dtype=int) + 1
+    df = pd.DataFrame({
+        "Line": np.repeat(line, len(emotions)),
+        "Lines": np.repeat([f"{s}–{s + window - 1}" for s in line], len(emotions)),
+        "Emotion": np.tile(emotions, n_windows),
+        "Score": np.asarray(matrix, dtype=float).reshape(-1),
+        "Order": np.tile(np.arange(len(emotions)), n_windows),
+    })
+
+    chart = (
+        alt.Chart(df)
+        .mark_area(interpolate="monotone", opacity=0.85)
+        .encode(
+            x=alt.X(
+                "Line:Q",
+                axis=alt.Axis(
+                    title="Line",
+                    titleColor="#6b7280",
+                    labelColor="#6b7280",
+                    tickMinStep=1,
+                    domain=False,
+                ),
+            ),
+            y=alt.Y(
+                "Score:Q",
+                stack="zero",
+                axis=alt.Axis(
+                    format="%",
+                    title=None,
+                    tickCount=5,
+                    grid=True,
+                    gridDash=[2, 4],
+                    gridColor="#e5e7eb",
+                    domain=False,
+                ),
+            ),
+            color=alt.Color(
+                "Emotion:N",
+                sort=emotions,
+                scale=alt.Scale(domain=emotions, range=list(schema.colors)),
+                legend=alt.Legend(orient="bottom", title=None),
+            ),
+            order=alt.Order("Order:Q"),
+            tooltip=["Lines", "Emotion", alt.Tooltip("Score", format=".1%")],
+        )
+        .properties(
+            height=220,
+            padding={"left": 10, "top": 5, "right": 10, "bottom": 10},
+        )
+        .configure_view(strokeWidth=0)
+        .configure_axis(labelFont="Inter", labelFontSize=12)
+    )
+
+    placeholder.altair_chart(chart, use_container_width=True)
+
+
+def render_playlist_arc(
+    titles: List[str],
+    matrix: np.ndarray,
+    target: np.ndarray | None = None,
+) -> None:
+    """
+    Render the emotional arc of a playlist: one line per emotion across
+    the track order, plus the target arc (dashed) when given.
+    """
+    with timed("render_playlist"):
+        _render_playlist_arc(titles, matrix, target)
+
+
+def _render_playlist_arc(
+    titles: List[str],
+    matrix: np.ndarray,
+    target: np.ndarray | None,
+) -> None:
+    import altair as alt
+    import pandas as pd
+
+    schema = get_emotion_schema()
+    emotions = list(schema.emotions)
+    n_tracks = len(titles)
+
+    def long_df(values: np.ndarray, series: str) -> pd.DataFrame:
+        return pd.DataFrame({
+            "Track": np.repeat(np.arange(1, n_tracks + 1), len(emotions)),
+            "Title": np.repeat(titles, len(emotions)),
+            "Emotion": np.tile(emotions, n_tracks),
+            "Score": np.asarray(values, dtype=float).reshape(-1),
+            "Series": series,
+        })
+
+    color = alt.Color(
+        "Emotion:N",
+        sort=emotions,
+        scale=alt.Scale(domain=emotions, range=list(schema.colors)),
+        legend=alt.Legend(orient="bottom", title=None),
+    )
+    x = alt.X(
+        "Track:Q",
+        axis=alt.Axis(title="Track", titleColor="#6b7280", labelColor="#6b7280", tickMinStep=1, domain=False),
+    )
+    y = alt.Y(
+        "Score:Q",
+        axis=alt.Axis(format="%", title=None, tickCount=5, grid=True, gridDash=[2, 4], gridColor="#e5e7eb", domain=False),
+    )
+    tooltip = ["Track", "Title", "Emotion", alt.Tooltip("Score", format=".1%")]
+
+    layers = [
+        alt.Chart(long_df(matrix, "Playlist"))
+        .mark_line(point=True, interpolate="monotone")
+        .encode(x=x, y=y, color=color, tooltip=tooltip)
+    ]
+    if target is not None:
+        active = np.asarray(target).max(axis=0) > 0  # only the waypoint emotions
+        target_df = long_df(target, "Target")
+        target_df = target_df[np.tile(active, n_tracks)]
+        layers.append(
+            alt.Chart(target_df)
+            .mark_line(strokeDash=[6, 4], opacity=0.6)
+            .encode(x=x, y=y, color=color, tooltip=["Track", "Emotion", alt.Tooltip("Score", format=".0%")])
+        )
+
+    chart = (
+        alt.layer(*layers)
+        .properties(
+            height=280,
+            padding={"left": 10, "top": 5, "right": 10, "bottom": 10},
+        )
+        .configure_view(strokeWidth=0)
+        .configure_axis(labelFont="Inter", labelFontSize=12)
+    )
+
+    st.altair_chart(chart, use_container_width=True)
+
+
 def render_compare_scatter(versions_df: pd.DataFrame) -> None:
     """
     Render a scatter+line plot comparing emotion scores across versions.
 
     x = Emotion, y = Score, color = Version title.
     """
+    with timed("render_compare"):
+        _render_compare_scatter(versions_df)
+
+
+def _render_compare_scatter(versions_df: pd.DataFrame) -> None:
+    import altair as alt
+
+    emotions = list(get_emotion_schema().emotions)
     long_df = versions_df.melt(
         id_vars=["title"],
-        value_vars=EMOTION_ORDER,
+        value_vars=emotions,
         var_name="Emotion",
         value_name="Score",
     )
@@ -253,7 +1090,7 @@ def render_compare_scatter(versions_df: pd.DataFrame) -> None:
     base = alt.Chart(long_df).encode(
         x=alt.X(
             "Emotion:N",
-            sort=EMOTION_ORDER,
+            sort=emotions,
             axis=alt.Axis(
                 labelAngle=0,
                 title=None,
@@ -292,3 +1129,62 @@ def render_compare_scatter(versions_df: pd.DataFrame) -> None:
     )
 
     st.altair_chart(chart, use_container_width=True)
+
+
+# =========================================================
+# Metrics / debug panel
+# =========================================================
+
+@st.cache_resource(show_spinner=False)
+def start_metrics_endpoint():
+    """
+    Serve /metrics on EMOLYRICS_METRICS_PORT, once per process (if set).
+
+    The endpoint listens on EMOLYRICS_METRICS_HOST (127.0.0.1 by default).
+    """
+    port = os.environ.get("EMOLYRICS_METRICS_PORT")
+    if not port:
+        return None
+    from emo_metrics import start_metrics_server
+
+    return start_metrics_server(int(port))
+
+
+def render_debug_panel() -> None:
+    """Per-stage latency table and raw metrics, shown with ?debug=1."""
+    if st.query_params.get("debug") != "1":
+        return
+
+    import pandas as pd
+
+    from emo_metrics import METRICS_ENABLED, STAGE_SECONDS, render_prometheus
+
+    with st.expander("🛠 Performance metrics", expanded=True):
+        if not METRICS_ENABLED:
+            st.info("Metrics are disabled (EMOLYRICS_METRICS=0).")
+            return
+        stats = STAGE_SECONDS.stats()
+        if not stats:
+            st.info("No timings recorded yet. Run an analysis first.")
+            return
+        df = pd.DataFrame(stats).set_index("stage")
+        for col in ["mean", "p50", "p95", "p99"]:
+            df[col] = (df[col] * 1000).round(2)
+        st.markdown("Stage timings (ms, process-wide, percentiles from histogram buckets)")
+        st.dataframe(df)
+        sessions = get_session_store().stats()
+        st.caption(
+            f"Session store: {sessions['sessions_memory']} sessions in memory "
+            f"({sessions['bytes_memory'] / 1e6:.1f} MB), {sessions['sessions_disk']} on disk "
+            f"({sessions['bytes_disk'] / 1e6:.1f} MB)"
+        )
+        tracks = track_cache_stats()
+        st.caption(
+            f"Track cache: {tracks['entries']} tracks "
+            f"({tracks['bytes'] / 1e6:.1f} of {PLAYLIST_CACHE_BYTES / 1e6:.0f} MB)"
+        )
+        st.download_button(
+            "Download Prometheus metrics",
+            render_prometheus(),
+            file_name="emolyrics_metrics.txt",
+        )
@@ -0,0 +1,318 @@
+# emo_graph.py
+"""
+Similar-songs graph: emotion-filtered recommendations.
+
+training/build_similar_graph.py turns the dataset's "Similar Songs" data
+into a CSR adjacency graph over the cleaned dataset's rows (node id =
+row_idx) and stores, next to it, every node's emotion scores:
+
+    data/similar_graph/indptr.npy    (n_nodes + 1,) int64
+    data/similar_graph/indices.npy   (n_edges,) int32, neighbours per node
+    data/similar_graph/weights.npy   (n_edges,) float32, similarity scores
+    data/similar_graph/scores.npy    (n_nodes, n_emotions) float16
+    data/similar_graph/nodes.parquet artist / song_title per node
+    data/similar_graph/search_keys.npy  (n_keys,) S32, sorted lowercase
+                                     label suffixes starting at a word
+    data/similar_graph/search_nodes.npy (n_keys,) int32, node of each key
+    data/similar_graph/meta.json     emotions, sizes, source checkpoint
+
+Arrays are memory-mapped, so loading is instant and a query only touches
+the pages of the nodes it visits: a bounded BFS or a local-push
+personalized PageRank around the seed, then a ranking of the visited
+nodes by graph relevance times emotion match. Song search is a binary
+search (np.searchsorted) in the sorted key array, so a keystroke reads a
+few pages instead of scanning every title. Only numpy is needed; pandas
+is imported when titles are looked up.
+"""
+from __future__ import annotations
+
+import json
+from collections import deque
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from emo_metrics import timed
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+# =========================================================
+# Config / constants
+# =========================================================
+
+BASE_DIR = Path(__file__).parent
+GRAPH_DIR = BASE_DIR / "data/similar_graph"
+
+# Bounded BFS: hops from the seed and nodes visited
+BFS_MAX_DEPTH = 2
+BFS_MAX_NODES = 5000
+
+# Personalized PageRank (local push): teleport probability, residual
+# tolerance per unit of degree and a cap on push operations
+PPR_ALPHA = 0.15
+PPR_EPSILON = 3e-4
+PPR_MAX_PUSHES = 5_000
+
+RECOMMEND_K = 10
+
+# Song search: every word start of a lowercase "artist – title" label is a
+# key, truncated to SEARCH_KEY_BYTES of UTF-8 (longer queries are checked
+# against the full label)
+SEARCH_KEY_BYTES = 32
+
+
+class SimilarityGraph:
+    """Memory-mapped CSR graph with per-node emotion scores."""
+
+    def __init__(self, directory: str | Path = GRAPH_DIR) -> None:
+        directory = Path(directory)
+        self.directory = directory
+        self.meta = json.loads((directory / "meta.json").read_text())
+        self.emotions: List[str] = list(self.meta["emotions"])
+        self.indptr = np.load(directory / "indptr.npy", mmap_mode="r")
+        self.indices = np.load(directory / "indices.npy", mmap_mode="r")
+        self.weights = np.load(directory / "weights.npy", mmap_mode="r")
+        self.scores = np.load(directory / "scores.npy", mmap_mode="r")
+        self._nodes = None  # DataFrame, loaded on first title lookup
+        self._search = None  # (keys, nodes), loaded on first search
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.indptr) - 1
+
+    def neighbors(self, node: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(neighbour ids, similarity weights) of a node."""
+        start, end = self.indptr[node], self.indptr[node + 1]
+        return self.indices[start:end], self.weights[start:end]
+
+    # ---- graph walks ----
+
+    def bfs(
+        self,
+        seed: int,
+        max_depth: int = BFS_MAX_DEPTH,
+        max_nodes: int = BFS_MAX_NODES,
+    ) -> Dict[int, float]:
+        """
+        Nodes within max_depth hops of seed (at most max_nodes): {node:
+        relevance}, where relevance is the best weight of an edge that
+        reached the node divided by its depth.
+        """
+        relevance: Dict[int, float] = {}
+        visited = {seed}
+        frontier = np.array([seed], dtype=np.int64)
+        for depth in range(1, max_depth + 1):
+            slices = [(self.indptr[u], self.indptr[u + 1]) for u in frontier.tolist()]
+            if not slices:
+                break
+            nbrs = np.concatenate([self.indices[s:e] for s, e in slices])
+            w = np.concatenate([self.weights[s:e] for s, e in slices])
+            if len(nbrs) == 0:
+                break
+            # Best weight per neighbour: sort by (node, -weight), keep first
+            order = np.lexsort((-w, nbrs))
+            nbrs, w = nbrs[order], w[order]
+            first = np.r_[True, nbrs[1:] != nbrs[:-1]]
+            new = []
+            for node, weight in zip(nbrs[first].tolist(), w[first].tolist()):
+                if node in visited:
+                    continue
+                visited.add(node)
+                relevance[node] = weight / depth
+                new.append(node)
+                if len(relevance) >= max_nodes:
+                    return relevance
+            frontier = np.array(new, dtype=np.int64)
+        return relevance
+
+    def personalized_pagerank(
+        self,
+        seeds: Sequence[int],
+        alpha: float = PPR_ALPHA,
+        epsilon: float = PPR_EPSILON,
+        max_pushes: int = PPR_MAX_PUSHES,
+    ) -> Dict[int, float]:
+        """
+        Approximate personalized PageRank from seeds (local push).
+
+        Residual mass is pushed from a node only while it exceeds epsilon
+        times its degree, so the work is bounded by 1 / (alpha * epsilon)
+        (and max_pushes) whatever the graph size. Edge weights are the
+        transition probabilities, normalized per node.
+        """
+        rank: Dict[int, float] = {}
+        residual = {int(s): 1.0 / len(seeds) for s in seeds}
+        queue = deque(residual)
+        queued = set(residual)
+        pushes = 0
+        while queue and pushes < max_pushes:
+            u = queue.popleft()
+            queued.discard(u)
+            mass = residual.pop(u, 0.0)
+            nbrs, w = self.neighbors(u)
+            rank[u] = rank.get(u, 0.0) + alpha * mass
+            pushes += 1
+            if len(nbrs) == 0:
+                rank[u] += (1.0 - alpha) * mass
+                continue
+            shares = (1.0 - alpha) * mass * w / w.sum()
+            degrees = self.indptr[nbrs + 1] - self.indptr[nbrs]
+            for v, share, degree in zip(nbrs.tolist(), shares.tolist(), degrees.tolist()):
+                residual[v] = residual.get(v, 0.0) + share
+                if v not in queued and residual[v] >= epsilon * max(degree, 1):
+                    queue.append(v)
+                    queued.add(v)
+        return rank
+
+    # ---- recommendations ----
+
+    def profile_vector(self, profile: Dict[str, float]) -> np.ndarray:
+        """{emotion: score} -> vector in the graph's emotion order."""
+        return np.array([float(profile.get(emotion, 0.0)) for emotion in self.emotions])
+
+    def recommend(
+        self,
+        seed: int,
+        target: Dict[str, float],
+        k: int = RECOMMEND_K,
+        method: str = "ppr",
+        min_match: float = 0.0,
+    ) -> List[Dict[str, object]]:
+        """
+        Songs similar to seed that also match the target emotion profile.
+
+        Candidates come from a walk around seed ("ppr" or "bfs"); each is
+        ranked by relevance (normalized to the best candidate) times the
+        cosine similarity of its emotion scores with target. Candidates
+        with a match below min_match are dropped. Returns up to k rows
+        {"node", "relevance", "match", "score"}, best first.
+        """
+        with timed("graph_query"):
+            if method == "bfs":
+                walk = self.bfs(seed)
+            elif method == "ppr":
+                walk = self.personalized_pagerank([seed])
+            else:
+                raise ValueError(f"Unknown method {method!r} (expected 'ppr' or 'bfs')")
+            walk.pop(seed, None)
+            if not walk:
+                return []
+
+            nodes = np.fromiter(walk.keys(), dtype=np.int64, count=len(walk))
+            relevance = np.fromiter(walk.values(), dtype=np.float64, count=len(walk))
+            relevance /= relevance.max()
+
+            target_vec = self.profile_vector(target)
+            scores = np.asarray(self.scores[nodes], dtype=np.float64)
+            norms = np.linalg.norm(scores, axis=1) * max(np.linalg.norm(target_vec), 1e-12)
+            match = scores @ target_vec / np.maximum(norms, 1e-12)
+
+            final = np.where(match >= min_match, relevance * match, -np.inf)
+            k = min(k, int(np.isfinite(final).sum()))
+            if k == 0:
+                return []
+            best = np.argpartition(-final, k - 1)[:k]
+            best = best[np.argsort(-final[best])]
+        return [
+            {
+                "node": int(nodes[i]),
+                "relevance": float(relevance[i]),
+                "match": float(match[i]),
+                "score": float(final[i]),
+            }
+            for i in best
+        ]
+
+    # ---- node names ----
+
+    @property
+    def nodes(self) -> pd.DataFrame:
+        """artist / song_title per node (read on first use)."""
+        if self._nodes is None:
+            import pandas as pd
+
+            nodes = pd.read_parquet(self.directory / "nodes.parquet")
+            nodes["label"] = nodes["artist"].astype(str) + " – " + nodes["song_title"].astype(str)
+            self._nodes = nodes
+        return self._nodes
+
+    def node_label(self, node: int) -> str:
+        return str(self.nodes["label"].iat[node])
+
+    @property
+    def search_index(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (sorted keys, node per key), memory-mapped from the graph directory.
+
+        Graphs built before the index existed get it built in memory from
+        the node labels, once.
+        """
+        if self._search is None:
+            keys_path = self.directory / "search_keys.npy"
+            if keys_path.exists():
+                self._search = (
+                    np.load(keys_path, mmap_mode="r"),
+                    np.load(self.directory / "search_nodes.npy", mmap_mode="r"),
+                )
+            else:
+                self._search = build_search_index(self.nodes["label"].tolist())
+        return self._search
+
+    def find_nodes(self, query: str, limit: int = 20) -> List[int]:
+        """
+        Nodes with a word in "artist – title" starting with query
+        (case-insensitive), with neighbours first.
+        """
+        query = normalize_search_text(query)
+        if not query:
+            return []
+        with timed("graph_search"):
+            keys, key_nodes = self.search_index
+            encoded = query.encode("utf-8")
+            prefix = encoded[:SEARCH_KEY_BYTES]
+            lo = np.searchsorted(keys, np.bytes_(prefix), side="left")
+            hi = np.searchsorted(keys, np.bytes_(prefix + b"\xff"), side="left")
+            hits = np.unique(np.asarray(key_nodes[lo:hi], dtype=np.int64))
+            if len(encoded) > SEARCH_KEY_BYTES:
+                hits = np.array(
+                    [n for n in hits.tolist() if query in normalize_search_text(self.node_label(n))],
+                    dtype=np.int64,
+                )
+            degrees = self.indptr[hits + 1] - self.indptr[hits]
+            return hits[np.argsort(-degrees, kind="stable")][:limit].tolist()
+
+
+def normalize_search_text(text: str) -> str:
+    """Lowercase with whitespace runs collapsed to one space."""
+    return " ".join(str(text).lower().split())
+
+
+def build_search_index(labels: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sorted search keys and their node ids for node labels.
+
+    Each label contributes one key per word: the lowercase label from that
+    word on, truncated to SEARCH_KEY_BYTES of UTF-8.
+    """
+    keys: List[bytes] = []
+    nodes: List[int] = []
+    for node, label in enumerate(labels):
+        words = normalize_search_text(label).split(" ")
+        for i in range(len(words)):
+            key = " ".join(words[i:]).encode("utf-8")[:SEARCH_KEY_BYTES]
+            if key:
+                keys.append(key)
+                nodes.append(node)
+    key_array = np.array(keys, dtype=f"S{SEARCH_KEY_BYTES}")
+    order = np.argsort(key_array, kind="stable")
+    return key_array[order], np.array(nodes, dtype=np.int32)[order]
+
+
+def load_graph(directory: str | Path = GRAPH_DIR) -> SimilarityGraph | None:
+    """The graph in directory, or None if it has not been built."""
+    if not (Path(directory) / "meta.json").exists():
+        return None
+    return SimilarityGraph(directory)
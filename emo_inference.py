@@ -0,0 +1,881 @@
+# emo_inference.py
+"""
+Real model path: checkpoint loading and batched prediction.
+
+torch, sentence_transformers, joblib and numpy are imported inside the
+functions that need them, so importing this module is cheap; the cost is
+paid by get_model()/warm_up().
+"""
+from __future__ import annotations
+
+import os
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterator, List, Sequence, Tuple
+
+from emo_metrics import TEXTS_SCORED, observe_batch, observe_cascade, timed
+from emo_startup import startup_stage
+
+if TYPE_CHECKING:
+    import numpy as np
+    import torch.nn as nn
+    from sentence_transformers import SentenceTransformer
+
+
+# =========================================================
+# Config / constants
+# =========================================================
+
+BASE_DIR = Path(__file__).parent
+MODELS_DIR = BASE_DIR / "training/models"
+
+# Checkpoint formats: ".safetensors" (weights + scaler arrays, JSON metadata,
+# memory-mapped, no pickle) and the notebook's legacy ".pt" (torch.load)
+CHECKPOINT_SUFFIX = ".safetensors"
+CHECKPOINT_FORMAT_VERSION = 1
+_METADATA_KEY = "emolyrics"
+
+# Checkpoint used when none is given (override with EMOLYRICS_CHECKPOINT);
+# the converted .safetensors file is preferred over the legacy .pt
+DEFAULT_CHECKPOINT = Path(
+    os.environ.get(
+        "EMOLYRICS_CHECKPOINT",
+        next(
+            (
+                path
+                for path in (
+                    MODELS_DIR / "emotion_classifier_v2.safetensors",
+                    MODELS_DIR / "emotion_classifier_v2.pt",
+                )
+                if path.exists()
+            ),
+            MODELS_DIR / "emotion_classifier_v2.pt",
+        ),
+    )
+)
+
+# Optional directory with local copies of the sentence-transformer encoders
+# (one sub-directory per model, e.g. <dir>/all-MiniLM-L6-v2) for offline use
+ENCODER_DIR = os.environ.get("EMOLYRICS_ENCODER_DIR", "")
+
+# Texts per encoder forward pass
+ENCODE_BATCH_SIZE = 32
+
+# Dummy input used to warm up the encoder
+WARMUP_TEXT = "Warming up the emotion model, la la la"
+
+# Cascade mode: score with DEFAULT_CHECKPOINT, re-score low-confidence texts
+# with the large checkpoint named in <DEFAULT_CHECKPOINT stem>.cascade.json
+# (written by training/tune_cascade.py)
+CASCADE_ENABLED = os.environ.get("EMOLYRICS_CASCADE", "0") == "1"
+
+# Loaded model cache: (model, label_classes, encoder, scaler)
+_MODEL_CACHE: Tuple | None = None  # loaded lazily
+_MODEL_LOCK = threading.Lock()
+
+# Emotion schema of the loaded checkpoint and the column permutation from
+# checkpoint label_classes order to schema order (set in get_model)
+_SCHEMA = None
+_PERMUTATION = None
+
+# Calibration temperature for DEFAULT_CHECKPOINT
+_TEMPERATURE: float | None = None  # loaded lazily
+
+# Large model of the cascade: (loaded model tuple, permutation, temperature, config)
+_CASCADE: Tuple | None = None  # loaded lazily
+
+
+# =========================================================
+# Model definition & loading
+# =========================================================
+
+class ScalerMismatchError(ValueError):
+    """A legacy .pt head whose shared scaler has another input dimension."""
+
+
+def resolve_encoder_path(encoder_name: str, encoder_dir: str | None = None) -> str:
+    """
+    Return a local path for encoder_name if encoder_dir (default:
+    ENCODER_DIR) has a copy of it, or if it is an encoder saved in
+    MODELS_DIR (e.g. a distilled student, see training/distill_student.py).
+
+    Falls back to the name itself (downloaded from the Hugging Face Hub).
+    """
+    if encoder_dir is None:
+        encoder_dir = ENCODER_DIR
+    short_name = encoder_name.split("/")[-1]
+    for directory in (encoder_dir, MODELS_DIR):
+        if directory and (Path(directory) / short_name).is_dir():
+            return str(Path(directory) / short_name)
+    return encoder_name
+
+
+class EmbeddingScaler:
+    """
+    StandardScaler.transform() from its mean_ / scale_ arrays.
+
+    Used for .safetensors checkpoints, which store the scaler as two arrays
+    instead of a joblib pickle.
+    """
+
+    def __init__(self, mean: np.ndarray, scale: np.ndarray) -> None:
+        self.mean_ = mean
+        self.scale_ = scale
+
+    def transform(self, embeddings: np.ndarray) -> np.ndarray:
+        return (embeddings - self.mean_) / self.scale_
+
+
+# Optional dimension reduction stored in a checkpoint (EmbeddingProjection)
+PROJECTION_KINDS = ("pca", "truncate")
+
+# Rows of the training embeddings used to fit a PCA projection
+PCA_FIT_ROWS = 50_000
+
+
+class EmbeddingProjection:
+    """
+    Linear map from encoder embeddings to a smaller dimension, applied
+    before the scaler and head.
+
+    kind "pca": (x - mean) @ components.T, fitted on training embeddings.
+    kind "truncate": the first dim coordinates, re-normalized
+    (Matryoshka-style; only meaningful for encoders trained so that
+    embedding prefixes are usable on their own).
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        input_dim: int,
+        dim: int,
+        mean: np.ndarray | None = None,
+        components: np.ndarray | None = None,
+    ) -> None:
+        if kind not in PROJECTION_KINDS:
+            raise ValueError(f"Unknown projection {kind!r} (expected one of {PROJECTION_KINDS})")
+        self.kind = kind
+        self.input_dim = input_dim
+        self.dim = dim
+        self.mean = mean
+        self.components = components
+
+    @classmethod
+    def fit(cls, embeddings: np.ndarray, kind: str, dim: int, seed: int = 0) -> "EmbeddingProjection":
+        """Fit on (a sample of at most PCA_FIT_ROWS) training embeddings."""
+        import numpy as np
+
+        input_dim = embeddings.shape[1]
+        if not 0 < dim < input_dim:
+            raise ValueError(f"Projection dim must be in (0, {input_dim}), got {dim}")
+        if kind != "pca":
+            return cls(kind, input_dim, dim)
+
+        rows = np.random.default_rng(seed).permutation(len(embeddings))[:PCA_FIT_ROWS]
+        sample = np.asarray(embeddings[np.sort(rows)], dtype=np.float64)
+        mean = sample.mean(axis=0)
+        _, _, vt = np.linalg.svd(sample - mean, full_matrices=False)
+        return cls(kind, input_dim, dim, mean.astype(np.float32), vt[:dim].astype(np.float32))
+
+    @property
+    def key(self) -> str:
+        """Short content hash, used to name projected embedding stores."""
+        import hashlib
+
+        import numpy as np
+
+        digest = hashlib.sha256(f"{self.kind}:{self.input_dim}:{self.dim}".encode())
+        for array in (self.mean, self.components):
+            if array is not None:
+                digest.update(np.ascontiguousarray(array).tobytes())
+        return f"{self.kind}{self.dim}-{digest.hexdigest()[:8]}"
+
+    def transform(self, embeddings: np.ndarray) -> np.ndarray:
+        import numpy as np
+
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if self.kind == "pca":
+            return (embeddings - self.mean) @ self.components.T
+        prefix = embeddings[:, : self.dim]
+        norms = np.linalg.norm(prefix, axis=1, keepdims=True)
+        return prefix / np.maximum(norms, 1e-12)
+
+    def metadata(self) -> Dict[str, object]:
+        return {"kind": self.kind, "input_dim": self.input_dim, "dim": self.dim}
+
+    def tensors(self) -> Dict[str, np.ndarray]:
+        if self.kind != "pca":
+            return {}
+        return {"projection.mean": self.mean, "projection.components": self.components}
+
+    @classmethod
+    def from_checkpoint(cls, metadata: Dict[str, object], arrays: Dict[str, np.ndarray]):
+        return cls(
+            metadata["kind"], metadata["input_dim"], metadata["dim"],
+            arrays.get("projection.mean"), arrays.get("projection.components"),
+        )
+
+
+class EmbeddingPreprocessor:
+    """
+    Projection followed by the (optional) scaler, with a scaler's
+    transform() interface.
+
+    Inputs with the encoder's dimension are projected first; inputs that
+    are already projected (the projected embedding store) only go through
+    the scaler.
+    """
+
+    def __init__(self, projection: EmbeddingProjection, scaler=None) -> None:
+        self.projection = projection
+        self.scaler = scaler
+
+    def transform(self, embeddings: np.ndarray) -> np.ndarray:
+        if embeddings.shape[1] == self.projection.input_dim:
+            embeddings = self.projection.transform(embeddings)
+        return embeddings if self.scaler is None else self.scaler.transform(embeddings)
+
+
+# safetensors dtype -> numpy dtype
+_SAFETENSORS_DTYPES = {
+    "F64": "<f8", "F32": "<f4", "F16": "<f2",
+    "I64": "<i8", "I32": "<i4", "I16": "<i2", "I8": "i1", "U8": "u1", "BOOL": "?",
+}
+
+
+def read_safetensors(path: str | Path) -> Tuple[Dict[str, np.ndarray], Dict[str, str]]:
+    """
+    Memory-map a .safetensors file: ({name: array}, metadata).
+
+    Arrays are copy-on-write views of one np.memmap, so nothing is read
+    until used and processes loading the same file share its page cache.
+    """
+    import numpy as np
+
+    header_len, header = _read_safetensors_header(path)
+    metadata = header.pop("__metadata__", {})
+
+    data = np.memmap(path, dtype=np.uint8, mode="c", offset=8 + header_len)
+    arrays = {}
+    for name, info in header.items():
+        start, end = info["data_offsets"]
+        dtype = np.dtype(_SAFETENSORS_DTYPES[info["dtype"]])
+        arrays[name] = data[start:end].view(dtype).reshape(info["shape"])
+    return arrays, metadata
+
+
+def _read_safetensors_header(path: str | Path) -> Tuple[int, dict]:
+    """(header length, parsed JSON header) of a .safetensors file."""
+    import json
+    import struct
+
+    with open(path, "rb") as f:
+        (header_len,) = struct.unpack("<Q", f.read(8))
+        return header_len, json.loads(f.read(header_len))
+
+
+def save_checkpoint(
+    path: str | Path,
+    model: nn.Module,
+    metadata: Dict[str, object],
+    scaler=None,
+    projection: EmbeddingProjection | None = None,
+) -> None:
+    """
+    Write a .safetensors checkpoint.
+
+    Tensors: the head state dict ("head.*") and, if given, the scaler's
+    mean_ / scale_ ("scaler.mean", "scaler.scale") and the projection's
+    arrays ("projection.*"). metadata (input_dim,
+    n_classes, label_classes, sentence_transformer_name, architecture, ...)
+    must be JSON-serializable and is stored in the file header.
+    """
+    import json
+
+    import numpy as np
+    from safetensors.numpy import save_file
+
+    tensors = {
+        f"head.{name}": value.detach().cpu().numpy()
+        for name, value in model.state_dict().items()
+    }
+    if scaler is not None:
+        tensors["scaler.mean"] = np.asarray(scaler.mean_, dtype=np.float64)
+        tensors["scaler.scale"] = np.asarray(scaler.scale_, dtype=np.float64)
+
+    metadata = {
+        **metadata,
+        "format_version": CHECKPOINT_FORMAT_VERSION,
+        "scale_embeddings": scaler is not None,
+    }
+    if projection is not None:
+        tensors.update(projection.tensors())
+        metadata["projection"] = projection.metadata()
+    save_file(tensors, str(path), metadata={_METADATA_KEY: json.dumps(metadata)})
+
+
+def _load_safetensors_head(checkpoint_path, device):
+    """(model, scaler, ckpt) of a .safetensors checkpoint; weights stay mmapped on CPU."""
+    import json
+
+    import torch
+
+    from emo_models import HEADS
+
+    arrays, metadata = read_safetensors(checkpoint_path)
+    ckpt = json.loads(metadata[_METADATA_KEY])
+    if ckpt.get("format_version", 1) > CHECKPOINT_FORMAT_VERSION:
+        raise ValueError(f"{checkpoint_path}: unsupported checkpoint format {ckpt['format_version']}")
+
+    state = {
+        name[len("head."):]: torch.from_numpy(array)
+        for name, array in arrays.items()
+        if name.startswith("head.")
+    }
+    model = HEADS[ckpt.get("architecture", "LinearReLUDropoutLinearNet")](ckpt["input_dim"], ckpt["n_classes"])
+    model.load_state_dict(state, assign=True)
+    model.to(device).eval()
+
+    scaler = None
+    if ckpt.get("scale_embeddings", False):
+        scaler = EmbeddingScaler(arrays["scaler.mean"], arrays["scaler.scale"])
+    if "projection" in ckpt:
+        scaler = EmbeddingPreprocessor(EmbeddingProjection.from_checkpoint(ckpt["projection"], arrays), scaler)
+    return model, scaler, ckpt
+
+
+def load_head(
+    checkpoint_path: str | Path = DEFAULT_CHECKPOINT,
+    device: str | None = None,
+):
+    """
+    Load only the classifier head of a checkpoint (no encoder).
+
+    Returns (model, label_classes, scaler, ckpt); ckpt is the checkpoint's
+    metadata dict, useful for keys such as "sentence_transformer_name".
+    For checkpoints with a projection, scaler is an EmbeddingPreprocessor
+    (projection + scaler) and is never None.
+    .safetensors checkpoints are memory-mapped and never unpickled; legacy
+    .pt checkpoints go through torch.load (convert them with
+    scripts/convert-checkpoints.py). Raises ScalerMismatchError (a
+    ValueError) if a legacy checkpoint's scaler does not match its input
+    dimension.
+    """
+    import joblib
+    import torch
+
+    from emo_models import HEADS
+
+    if device is None:
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+    device = torch.device(device)
+
+    if Path(checkpoint_path).suffix == CHECKPOINT_SUFFIX:
+        model, scaler, ckpt = _load_safetensors_head(checkpoint_path, device)
+        label_classes = [str(label) for label in ckpt.get("label_classes", [])]
+        return model, label_classes, scaler, ckpt
+
+    ckpt = torch.load(checkpoint_path, map_location=device, weights_only=False)
+
+    head = HEADS[ckpt.get("architecture", "LinearReLUDropoutLinearNet")]
+    model = head(ckpt["input_dim"], ckpt["n_classes"]).to(device)
+    model.load_state_dict(ckpt["model_state_dict"])
+    model.eval()
+
+    # "scaler_path" is relative to the checkpoint; older checkpoints share
+    # models/scaler.joblib, which only fits the 384-d MiniLM heads
+    scaler = None
+    if ckpt.get("scale_embeddings", False):
+        scaler_path = os.path.join(
+            os.path.dirname(checkpoint_path), ckpt.get("scaler_path", "scaler.joblib")
+        )
+        scaler = joblib.load(scaler_path)
+        n_features = getattr(scaler, "n_features_in_", len(scaler.mean_))
+        if n_features != ckpt["input_dim"]:
+            raise ScalerMismatchError(
+                f"{Path(checkpoint_path).name}: scaler {Path(scaler_path).name} has {n_features} "
+                f"features, head expects {ckpt['input_dim']}. Retrain this head with "
+                "training/train_head.py (its checkpoint embeds its own scaler) or set "
+                "'scaler_path' to the scaler it was trained with"
+            )
+
+    label_classes = [str(label) for label in ckpt.get("label_classes", [])]
+
+    return model, label_classes, scaler, ckpt
+
+
+def load_model(
+    checkpoint_path: str | Path = DEFAULT_CHECKPOINT,
+    device: str | None = None,
+):
+    """
+    Load a checkpoint exported by the training notebook.
+
+    Returns (model, label_classes, encoder, scaler); scaler is None when
+    the checkpoint was trained without scaled embeddings. The encoder is
+    read from ENCODER_DIR when a local copy exists.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    model, label_classes, scaler, ckpt = load_head(checkpoint_path, device)
+    encoder = SentenceTransformer(
+        resolve_encoder_path(ckpt["sentence_transformer_name"]),
+        device=str(next(model.parameters()).device),
+    )
+
+    return model, label_classes, encoder, scaler
+
+
+def get_model():
+    """Return the process-wide model, loading DEFAULT_CHECKPOINT on first use."""
+    global _MODEL_CACHE
+    if _MODEL_CACHE is None:
+        with _MODEL_LOCK:
+            if _MODEL_CACHE is None:
+                with startup_stage("model load"):
+                    loaded = load_model(DEFAULT_CHECKPOINT)
+                _set_schema(loaded[1])
+                _MODEL_CACHE = loaded
+    return _MODEL_CACHE
+
+
+def _set_schema(label_classes: Sequence[str]) -> None:
+    """Derive and validate the schema and column permutation at load time."""
+    global _SCHEMA, _PERMUTATION
+    from emo_scores import EmotionSchema
+
+    schema = EmotionSchema.from_label_classes(label_classes)
+    _PERMUTATION = schema.permutation(label_classes)
+    _SCHEMA = schema
+
+
+def get_cascade():
+    """
+    Return the cascade's large model, loading it on first use.
+
+    The large checkpoint must carry a scaler matching its own embedding
+    size (e.g. trained with training/train_head.py); legacy .pt heads that
+    share models/scaler.joblib are rejected by load_head.
+
+    (loaded, permutation, temperature, config): loaded is the load_model()
+    tuple of the large checkpoint, permutation maps its classes to the
+    small model's schema.
+    """
+    global _CASCADE
+    if _CASCADE is None:
+        import json
+
+        from emo_scores import cascade_path, load_temperature
+
+        get_model()
+        with _MODEL_LOCK:
+            if _CASCADE is None:
+                config_path = cascade_path(DEFAULT_CHECKPOINT)
+                if not config_path.exists():
+                    raise FileNotFoundError(
+                        f"EMOLYRICS_CASCADE=1 but {config_path} does not exist; "
+                        "run training/tune_cascade.py first"
+                    )
+                config = json.loads(config_path.read_text())
+                large_path = DEFAULT_CHECKPOINT.parent / config["large_checkpoint"]
+                with startup_stage("cascade model load"):
+                    loaded = load_model(large_path)
+                _CASCADE = (
+                    loaded,
+                    _SCHEMA.permutation(loaded[1]),
+                    load_temperature(large_path),
+                    config,
+                )
+    return _CASCADE
+
+
+def warm_up() -> None:
+    """
+    Load the model and run one dummy prediction.
+
+    The first forward pass allocates buffers and initializes thread pools;
+    doing it at startup keeps that cost away from the first user.
+    """
+    get_model()
+    if CASCADE_ENABLED:
+        get_cascade()
+    with startup_stage("warm-up encode"):
+        score_texts([WARMUP_TEXT])
+
+
+def share_model_memory(loaded=None) -> None:
+    """
+    Move CPU weights of the head and the encoder into shared memory.
+
+    Called in a parent process before forking workers: shared-memory
+    pages stay shared between all children instead of relying on
+    copy-on-write, so per-worker RSS only holds activations. With
+    EMOLYRICS_CASCADE=1 the cascade's large model is loaded and shared too.
+    """
+    model, _, encoder, _ = loaded if loaded is not None else get_model()
+    modules = [model, encoder]
+    if CASCADE_ENABLED:
+        large_model, _, large_encoder, _ = get_cascade()[0]
+        modules += [large_model, large_encoder]
+    for module in modules:
+        if next(module.parameters()).device.type == "cpu":
+            module.share_memory()
+
+
+def set_num_threads(n_threads: int) -> None:
+    """Limit torch intra-op threads (one share of the CPU per worker)."""
+    import torch
+
+    torch.set_num_threads(max(1, n_threads))
+
+
+# =========================================================
+# Prediction
+# =========================================================
+
+def encode_texts(
+    encoder: SentenceTransformer,
+    texts: Sequence[str],
+    batch_size: int = ENCODE_BATCH_SIZE,
+    return_token_counts: bool = False,
+):
+    """
+    Embed texts, shape (len(texts), embedding_dim), float32, input order.
+
+    Same result as encoder.encode(), but padding-aware: all texts are
+    tokenized once with the fast tokenizer, truncated at the encoder's
+    max_seq_length (tokens, not characters), sorted by token length and
+    encoded in batch_size buckets of similar length, so one long lyric no
+    longer pads a whole batch. Tokenization and the transformer forward
+    pass are timed on their own.
+    With return_token_counts, also returns the number of tokens of each
+    text (the weights of its mean pooling), see pool_embeddings().
+    """
+    import numpy as np
+    import torch
+    from sentence_transformers.util import batch_to_device
+
+    if len(texts) == 0:
+        empty = np.zeros((0, encoder.get_sentence_embedding_dimension()), dtype=np.float32)
+        return (empty, np.zeros(0, dtype=np.float32)) if return_token_counts else empty
+
+    tokens, lengths = tokenize_texts(encoder, texts)
+    order = np.argsort(lengths, kind="stable")
+    tokenizer = encoder.tokenizer
+
+    chunks = []
+    for start in range(0, len(order), batch_size):
+        bucket = order[start:start + batch_size]
+        with timed("tokenize"):
+            features = tokenizer.pad(
+                {key: [values[i] for i in bucket] for key, values in tokens.items()},
+                padding=True,
+                return_tensors="pt",
+            )
+            features = batch_to_device(dict(features), encoder.device)
+        with timed("encode"), torch.inference_mode():
+            embeddings = encoder.forward(features)["sentence_embedding"]
+        chunks.append(embeddings.float().cpu().numpy())
+
+    embeddings = np.empty((len(order), chunks[0].shape[1]), dtype=np.float32)
+    embeddings[order] = np.concatenate(chunks)
+    if return_token_counts:
+        return embeddings, lengths.astype(np.float32)
+    return embeddings
+
+
+def tokenize_texts(encoder: SentenceTransformer, texts: Sequence[str]):
+    """
+    Tokenize texts without padding, as encoder.tokenize() would.
+
+    Returns (tokens, lengths): the tokenizer output (lists per text) and
+    the token count of each text after truncation at max_seq_length.
+    """
+    import numpy as np
+
+    texts = [str(text).strip() for text in texts]
+    if getattr(encoder[0], "do_lower_case", False):
+        texts = [text.lower() for text in texts]
+
+    with timed("tokenize"):
+        tokens = encoder.tokenizer(
+            texts,
+            truncation="longest_first",
+            max_length=encoder.max_seq_length,
+        )
+    lengths = np.fromiter((len(ids) for ids in tokens["input_ids"]), dtype=np.int64, count=len(texts))
+    return dict(tokens), lengths
+
+
+def pool_embeddings(
+    embeddings: np.ndarray,
+    token_counts: np.ndarray,
+    spans: Sequence[Tuple[int, int]],
+) -> np.ndarray:
+    """
+    Approximate embeddings of concatenated texts from their parts.
+
+    Row i is the token-weighted mean of embeddings[start:end] for the i-th
+    (start, end) span, re-normalized when the encoder outputs unit vectors.
+    This lets overlapping windows share one encode of each block of lines.
+    """
+    import numpy as np
+
+    weighted = np.concatenate(
+        [np.zeros((1, embeddings.shape[1]), dtype=np.float64),
+         np.cumsum(embeddings * token_counts[:, None], axis=0, dtype=np.float64)]
+    )
+    totals = np.concatenate([[0.0], np.cumsum(token_counts, dtype=np.float64)])
+    starts = np.array([start for start, _ in spans], dtype=np.intp)
+    ends = np.array([end for _, end in spans], dtype=np.intp)
+
+    pooled = (weighted[ends] - weighted[starts]) / np.maximum(totals[ends] - totals[starts], 1.0)[:, None]
+    if np.allclose(np.linalg.norm(embeddings, axis=1), 1.0, atol=1e-3):
+        pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+    return pooled.astype(np.float32)
+
+
+def leave_one_out_embeddings(embeddings: np.ndarray, token_counts: np.ndarray) -> np.ndarray:
+    """
+    Pooled embedding of all parts, then of all parts but each one.
+
+    Row 0 pools every row of embeddings and row i + 1 every row but i, with
+    the token weighting and re-normalization of pool_embeddings.
+    """
+    import numpy as np
+
+    weighted = embeddings.astype(np.float64) * token_counts[:, None]
+    total, total_count = weighted.sum(axis=0), token_counts.sum()
+    pooled = np.vstack([total, total - weighted]) / np.maximum(
+        np.concatenate([[total_count], total_count - token_counts]), 1.0
+    )[:, None]
+    if np.allclose(np.linalg.norm(embeddings, axis=1), 1.0, atol=1e-3):
+        pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+    return pooled.astype(np.float32)
+
+
+def predict_embeddings(
+    model: nn.Module,
+    embeddings: np.ndarray,
+    scaler=None,
+) -> np.ndarray:
+    """Class probabilities from precomputed embeddings (scaler + head)."""
+    import numpy as np
+    import torch
+
+    device = next(model.parameters()).device
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+
+    if scaler is not None:
+        with timed("scaler"):
+            embeddings = scaler.transform(embeddings).astype(np.float32)
+
+    with timed("head"), torch.no_grad():
+        x = torch.from_numpy(embeddings).to(device)
+        probs = torch.softmax(model(x), dim=1).cpu().numpy()
+    return probs
+
+
+def predict_batch(
+    model: nn.Module,
+    encoder: SentenceTransformer,
+    texts: Sequence[str],
+    scaler=None,
+    batch_size: int = ENCODE_BATCH_SIZE,
+) -> np.ndarray:
+    """
+    Return class probabilities for many texts, shape (len(texts), n_classes).
+
+    All texts go through one encoder call (internally split into
+    batch_size chunks) and one forward pass of the classifier head.
+    """
+    embeddings = encode_texts(encoder, texts, batch_size)
+    return predict_embeddings(model, embeddings, scaler)
+
+
+def probs_to_matrix(
+    probs: np.ndarray,
+    label_classes: Sequence[str],
+    schema=None,
+) -> np.ndarray:
+    """Reorder checkpoint probability columns into schema order."""
+    from emo_scores import EmotionSchema
+
+    if schema is None:
+        schema = EmotionSchema.from_label_classes(label_classes)
+    return probs[:, schema.permutation(label_classes)]
+
+
+def get_schema():
+    """EmotionSchema of the process-wide model (loads it if needed)."""
+    get_model()
+    return _SCHEMA
+
+
+def peek_schema():
+    """
+    EmotionSchema of DEFAULT_CHECKPOINT without loading the model, or None.
+
+    The loaded model's schema once get_model() has run; before that, the
+    label classes in a .safetensors header (a few KB read, no torch
+    import). Legacy .pt checkpoints can only be read with torch.load, so
+    they give None until the model is loaded.
+    """
+    import json
+
+    from emo_scores import EmotionSchema
+
+    if _SCHEMA is not None:
+        return _SCHEMA
+    if DEFAULT_CHECKPOINT.suffix != CHECKPOINT_SUFFIX or not DEFAULT_CHECKPOINT.exists():
+        return None
+    _, header = _read_safetensors_header(DEFAULT_CHECKPOINT)
+    ckpt = json.loads(header.get("__metadata__", {}).get(_METADATA_KEY, "{}"))
+    label_classes = [str(label) for label in ckpt.get("label_classes", [])]
+    return EmotionSchema.from_label_classes(label_classes) if label_classes else None
+
+
+def get_temperature() -> float:
+    """Calibration temperature fitted for DEFAULT_CHECKPOINT (1.0 if none)."""
+    global _TEMPERATURE
+    if _TEMPERATURE is None:
+        from emo_scores import load_temperature
+
+        _TEMPERATURE = load_temperature(DEFAULT_CHECKPOINT)
+    return _TEMPERATURE
+
+
+def score_matrix(texts: Sequence[str]) -> np.ndarray:
+    """
+    Calibrated scores for texts with the process-wide model.
+
+    Shape (len(texts), len(get_schema().emotions)); columns in schema order.
+    With EMOLYRICS_CASCADE=1, uncertain rows are re-scored by the cascade's
+    large model (see _escalate).
+    """
+    from emo_scores import apply_temperature
+
+    model, _, encoder, scaler = get_model()
+    observe_batch(len(texts), source="local")
+    probs = predict_batch(model, encoder, texts, scaler)
+    TEXTS_SCORED.inc(len(texts), backend="local")
+    matrix = apply_temperature(probs[:, _PERMUTATION], get_temperature())
+    if CASCADE_ENABLED:
+        matrix = _escalate(texts, matrix)
+    return matrix
+
+
+def _escalate(texts: Sequence[str], matrix: np.ndarray) -> np.ndarray:
+    """
+    Re-score the rows below the cascade threshold with the large model.
+
+    The gate (margin or entropy confidence) and its threshold come from
+    the cascade config; the escalation rate is exported as a metric.
+    """
+    import numpy as np
+
+    from emo_scores import apply_temperature, cascade_confidence
+
+    (model, _, encoder, scaler), permutation, temperature, config = get_cascade()
+    confidence = cascade_confidence(matrix, config["metric"])
+    escalate = np.flatnonzero(confidence < config["threshold"])
+    observe_cascade(len(texts), len(escalate))
+    if escalate.size == 0:
+        return matrix
+
+    with timed("cascade"):
+        probs = predict_batch(model, encoder, [texts[i] for i in escalate], scaler)
+    matrix = matrix.copy()
+    matrix[escalate] = apply_temperature(probs[:, permutation], temperature)
+    return matrix
+
+
+def iter_window_matrix(
+    lines: Sequence[str],
+    window: int,
+    stride: int,
+    chunk_size: int = ENCODE_BATCH_SIZE,
+) -> Iterator[Tuple[List[int], np.ndarray]]:
+    """
+    Calibrated scores of sliding windows over lines, streamed.
+
+    Lines are grouped into blocks of gcd(window, stride) lines and every
+    block is encoded once; window embeddings are pooled from their blocks
+    (pool_embeddings), so a 200-line song costs ~200/stride block encodes
+    instead of 200/stride windows of `window` lines each. Yields
+    (window_starts, scores) as soon as all blocks of those windows are
+    encoded. Windows are scored by the default model only: with
+    EMOLYRICS_CASCADE=1 they are not escalated (pooled embeddings belong
+    to the default model's encoder).
+    """
+    import numpy as np
+
+    from emo_scores import apply_temperature
+    from emo_text import window_blocks
+
+    model, _, encoder, scaler = get_model()
+    block, spans, starts = window_blocks(len(lines), window, stride)
+    blocks = ["\n".join(lines[i:i + block]) for i in range(0, len(lines), block)]
+
+    embeddings, counts = [], []
+    done = 0
+    for start in range(0, len(blocks), chunk_size):
+        emb, cnt = encode_texts(
+            encoder, blocks[start:start + chunk_size], chunk_size, return_token_counts=True
+        )
+        embeddings.append(emb)
+        counts.append(cnt)
+        encoded = start + len(emb)
+
+        ready = done
+        while ready < len(spans) and spans[ready][1] <= encoded:
+            ready += 1
+        if ready == done:
+            continue
+
+        pooled = pool_embeddings(np.concatenate(embeddings), np.concatenate(counts), spans[done:ready])
+        observe_batch(ready - done, source="local")
+        probs = predict_embeddings(model, pooled, scaler)
+        TEXTS_SCORED.inc(ready - done, backend="local")
+        yield starts[done:ready], apply_temperature(probs[:, _PERMUTATION], get_temperature())
+        done = ready
+
+
+def occlusion_matrix(units: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Calibrated scores of a text and of every variant with one unit removed.
+
+    units are the parts of the text (lines or stanzas). Each unit is
+    encoded once; the full text and each leave-one-out variant are pooled
+    from the unit embeddings (see pool_embeddings), so n variants cost one
+    encode of the text plus one head pass over n + 1 rows. The baseline is
+    pooled like the variants, so contributions carry no pooling bias; it
+    can differ slightly from the score of the text encoded as a whole.
+    All rows are scored by the default model only: with EMOLYRICS_CASCADE=1
+    nothing is escalated (pooled embeddings belong to its encoder).
+    Returns (full scores (n_emotions,), variant scores (len(units), n_emotions)).
+    """
+    import numpy as np
+
+    from emo_scores import apply_temperature
+
+    model, _, encoder, scaler = get_model()
+    embeddings, counts = encode_texts(encoder, units, return_token_counts=True)
+
+    pooled = leave_one_out_embeddings(embeddings, counts)
+
+    observe_batch(len(pooled), source="local")
+    probs = predict_embeddings(model, pooled, scaler)
+    TEXTS_SCORED.inc(len(pooled), backend="local")
+    matrix = apply_temperature(probs[:, _PERMUTATION], get_temperature())
+    return matrix[0], matrix[1:]
+
+
+def score_texts(texts: Sequence[str]) -> List[Dict[str, float]]:
+    """Score texts with the process-wide model ({Emotion: score} per text)."""
+    if not texts:
+        return []
+    from emo_scores import matrix_to_scores
+
+    matrix = score_matrix(texts)
+    return matrix_to_scores(matrix, _SCHEMA.emotions)
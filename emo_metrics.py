@@ -0,0 +1,293 @@
+# emo_metrics.py
+"""
+In-process metrics: per-stage latency histograms, counters and gauges.
+
+Exposed in the Prometheus text format by the scoring service (GET
+/metrics), by the app's optional metrics port (EMOLYRICS_METRICS_PORT on
+EMOLYRICS_METRICS_HOST, 127.0.0.1 by default) and as a debug panel in the
+app (?debug=1).
+
+Set EMOLYRICS_METRICS=0 to turn instrumentation off: timed() then
+returns a shared no-op context manager.
+"""
+from __future__ import annotations
+
+import bisect
+import contextlib
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+
+# =========================================================
+# Config / constants
+# =========================================================
+
+METRICS_ENABLED = os.environ.get("EMOLYRICS_METRICS", "1") != "0"
+
+# Interface of the standalone /metrics endpoint; loopback unless overridden
+METRICS_HOST = os.environ.get("EMOLYRICS_METRICS_HOST", "127.0.0.1")
+
+# Seconds; covers a fast head forward pass up to a slow long-lyrics encode
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+# =========================================================
+# Metric types
+# =========================================================
+
+class Histogram:
+    """Cumulative-bucket histogram, one series per label set."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float]) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # label key -> [bucket counts..., +Inf count], sum
+        self._series: Dict[LabelKey, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._series.setdefault(
+                key, ([0] * (len(self.buckets) + 1), [0.0])
+            )
+            counts[index] += 1
+            total[0] += value
+
+    def stats(self) -> List[Dict[str, object]]:
+        """Count, mean and approximate p50/p95/p99 for every series."""
+        rows = []
+        with self._lock:
+            series = {k: (list(c), t[0]) for k, (c, t) in self._series.items()}
+        for key, (counts, total) in sorted(series.items()):
+            n = sum(counts)
+            row: Dict[str, object] = dict(key)
+            row.update({
+                "count": n,
+                "mean": total / n if n else 0.0,
+                "p50": self._quantile(counts, 0.50),
+                "p95": self._quantile(counts, 0.95),
+                "p99": self._quantile(counts, 0.99),
+            })
+            rows.append(row)
+        return rows
+
+    def _quantile(self, counts: List[int], q: float) -> float:
+        """Linear interpolation inside the bucket holding the q-th value."""
+        n = sum(counts)
+        if n == 0:
+            return 0.0
+        rank = q * n
+        seen = 0
+        for i, count in enumerate(counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def render(self) -> List[str]:
+        lines = []
+        with self._lock:
+            series = {k: (list(c), t[0]) for k, (c, t) in self._series.items()}
+        for key, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = (("le", f"{bound:g}"),)
+                lines.append(f"{self.name}_bucket{_format_labels(key, le)} {cumulative}")
+            cumulative += counts[-1]
+            lines.append(f'{self.name}_bucket{_format_labels(key, (("le", "+Inf"),))} {cumulative}')
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter, one series per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str) -> None:
+        self.name = name
+        self.help_text = help_text
+        self._lock = threading.Lock()
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, value: float = 1.0, **labels: str) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + value
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [
+            f"{self.name}{_format_labels(key)} {value:g}"
+            for key, value in sorted(values.items())
+        ]
+
+
+class Gauge(Counter):
+    """Value that can go up and down."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+
+# =========================================================
+# Registry & instruments
+# =========================================================
+
+REGISTRY: List[object] = []
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+STAGE_SECONDS = register(Histogram(
+    "emolyrics_stage_seconds",
+    "Wall time of each stage of the analyze/save/compare flows.",
+    LATENCY_BUCKETS,
+))
+BATCH_SIZE = register(Histogram(
+    "emolyrics_batch_size",
+    "Number of texts per scoring call.",
+    BATCH_SIZE_BUCKETS,
+))
+TEXTS_SCORED = register(Counter(
+    "emolyrics_texts_scored_total",
+    "Texts scored, by backend.",
+))
+CASCADE_TEXTS = register(Counter(
+    "emolyrics_cascade_texts_total",
+    "Texts scored by the model cascade, by stage (small / escalated).",
+))
+CASCADE_ESCALATION_RATE = register(Gauge(
+    "emolyrics_cascade_escalation_rate",
+    "Fraction of cascade texts escalated to the large model since start.",
+))
+SESSIONS = register(Gauge(
+    "emolyrics_sessions",
+    "App sessions in the session store, by tier (memory / disk).",
+))
+SESSION_BYTES = register(Gauge(
+    "emolyrics_session_bytes",
+    "Estimated in-memory size of session store values, by tier (memory / disk).",
+))
+SESSION_EVICTIONS = register(Counter(
+    "emolyrics_session_evictions_total",
+    "Sessions moved to disk (idle / limit) or deleted (ttl), by reason.",
+))
+TRACK_CACHE_ENTRIES = register(Gauge(
+    "emolyrics_track_cache_entries",
+    "Tracks in the process-wide playlist score cache.",
+))
+TRACK_CACHE_BYTES = register(Gauge(
+    "emolyrics_track_cache_bytes",
+    "Estimated memory of the process-wide playlist score cache.",
+))
+
+
+@contextlib.contextmanager
+def _timer(stage: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+_NULL_TIMER = contextlib.nullcontext()
+
+
+def timed(stage: str):
+    """Context manager timing a stage into STAGE_SECONDS (no-op when disabled)."""
+    if not METRICS_ENABLED:
+        return _NULL_TIMER
+    return _timer(stage)
+
+
+def observe_batch(size: int, source: str) -> None:
+    """Record the size of a scoring batch."""
+    if METRICS_ENABLED:
+        BATCH_SIZE.observe(size, source=source)
+
+
+def observe_cascade(n_texts: int, n_escalated: int) -> None:
+    """Count cascade texts and update the escalation rate gauge."""
+    CASCADE_TEXTS.inc(n_texts, stage="small")
+    CASCADE_TEXTS.inc(n_escalated, stage="escalated")
+    total = CASCADE_TEXTS.value(stage="small")
+    CASCADE_ESCALATION_RATE.set(CASCADE_TEXTS.value(stage="escalated") / max(total, 1.0))
+
+
+def render_prometheus() -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# =========================================================
+# Standalone /metrics endpoint (for the Streamlit process)
+# =========================================================
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        data = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def start_metrics_server(port: int, host: str = METRICS_HOST) -> ThreadingHTTPServer:
+    """Serve /metrics from a daemon thread (loopback only unless host says otherwise)."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,43 @@
+# emo_models.py
+"""Classifier heads (torch). Imported lazily by emo_inference."""
+import torch.nn as nn
+
+
+class SimpleLinearNet(nn.Module):
+    """A single linear layer from the embedding to num_classes logits."""
+
+    def __init__(self, input_dim, num_classes, dropout=0.0):
+        super(SimpleLinearNet, self).__init__()
+        self.net = nn.Sequential(
+            nn.Linear(input_dim, num_classes),
+        )
+
+    def forward(self, x):
+        return self.net(x)
+
+
+class LinearReLUDropoutLinearNet(nn.Module):
+    """Linear layer with 256 ReLU neurons, then a linear layer to num_classes.
+
+    Input: batch of embedding vectors of shape (batch_size, embedding_dim).
+    """
+
+    def __init__(self, input_dim, num_classes, dropout=0.1):
+        super(LinearReLUDropoutLinearNet, self).__init__()
+        self.net = nn.Sequential(
+            nn.Linear(input_dim, 256),
+            nn.ReLU(),
+            nn.Dropout(dropout),
+            nn.Linear(256, num_classes),
+        )
+
+    def forward(self, x):
+        return self.net(x)
+
+
+# Checkpoint "architecture" -> head class (checkpoints without the key are
+# LinearReLUDropoutLinearNet)
+HEADS = {
+    "SimpleLinearNet": SimpleLinearNet,
+    "LinearReLUDropoutLinearNet": LinearReLUDropoutLinearNet,
+}
@@ -0,0 +1,408 @@
+# emo_scores.py
+"""
+Vectorized score post-processing.
+
+Scores are handled as float matrices of shape (n_texts, n_emotions), with
+columns in the order of an EmotionSchema (EMOTION_ORDER by default). Dicts
+({emotion: score}) only exist at the UI / JSON boundary (matrix_to_scores /
+scores_to_matrix).
+"""
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+
+# =========================================================
+# Config / constants
+# =========================================================
+
+# Default order of emotions (columns of every score matrix)
+EMOTION_ORDER = ["Anger", "Fear", "Joy", "Love", "Sadness", "Surprise"]
+
+# Color palette for each emotion
+COLOR_MAP = {
+    "Anger": "#E63946",
+    "Fear": "#F4A261",
+    "Joy": "#2A9D8F",
+    "Love": "#E76F51",
+    "Sadness": "#457B9D",
+    "Surprise": "#8D99AE",
+}
+
+# Colors handed out, in order, to classes not in COLOR_MAP
+EXTRA_COLORS = ["#6D597A", "#52B788", "#B56576", "#355070", "#EAAC8B", "#9A8C98"]
+
+# Below this normalized-entropy confidence, or this top-1/top-2 margin, a
+# prediction is flagged as ambiguous (mixed emotions)
+AMBIGUOUS_CONFIDENCE = 0.25
+AMBIGUOUS_MARGIN = 0.10
+
+# Calibration file stored next to a checkpoint: <stem>.calibration.json
+CALIBRATION_SUFFIX = ".calibration.json"
+
+# Cascade config stored next to the small checkpoint: <stem>.cascade.json
+CASCADE_SUFFIX = ".cascade.json"
+
+_EPS = 1e-12
+
+
+# =========================================================
+# Emotion schema
+# =========================================================
+
+@dataclass(frozen=True)
+class EmotionSchema:
+    """
+    Emotions a model predicts, in UI column order, with their colors.
+
+    Known emotions keep their EMOTION_ORDER position; extra classes of a
+    checkpoint follow in checkpoint order with colors from EXTRA_COLORS.
+    """
+
+    emotions: Tuple[str, ...]
+    colors: Tuple[str, ...]
+
+    @classmethod
+    def from_label_classes(cls, label_classes: Sequence[str]) -> "EmotionSchema":
+        names = [display_name(label) for label in label_classes]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Duplicate classes in checkpoint label_classes: {list(label_classes)}")
+        known = [emo for emo in EMOTION_ORDER if emo in names]
+        extra = [name for name in names if name not in COLOR_MAP]
+        colors = [COLOR_MAP[emo] for emo in known]
+        colors += [EXTRA_COLORS[i % len(EXTRA_COLORS)] for i in range(len(extra))]
+        return cls(tuple(known + extra), tuple(colors))
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, object]) -> "EmotionSchema":
+        return cls(tuple(data["emotions"]), tuple(data["colors"]))
+
+    def to_dict(self) -> Dict[str, object]:
+        return {"emotions": list(self.emotions), "colors": list(self.colors)}
+
+    @property
+    def color_map(self) -> Dict[str, str]:
+        return dict(zip(self.emotions, self.colors))
+
+    def permutation(self, label_classes: Sequence[str]) -> np.ndarray:
+        """
+        Column indices such that probs[:, perm] is in schema order.
+
+        Raises ValueError unless the checkpoint classes and the schema
+        emotions match one to one.
+        """
+        names = [display_name(label) for label in label_classes]
+        if sorted(names) != sorted(self.emotions):
+            raise ValueError(
+                f"Checkpoint classes {names} do not match schema emotions {list(self.emotions)}"
+            )
+        return np.array([names.index(emo) for emo in self.emotions], dtype=np.intp)
+
+
+DEFAULT_SCHEMA = EmotionSchema(tuple(EMOTION_ORDER), tuple(COLOR_MAP[e] for e in EMOTION_ORDER))
+
+
+def display_name(label: str) -> str:
+    """Checkpoint label (LabelEncoder, lowercase) -> UI name ("sadness" -> "Sadness")."""
+    return str(label).strip().capitalize()
+
+
+# =========================================================
+# Dict <-> matrix
+# =========================================================
+
+def scores_to_matrix(
+    scores_list: Sequence[Dict[str, float]],
+    emotions: Sequence[str] = EMOTION_ORDER,
+) -> np.ndarray:
+    """Stack {emotion: score} dicts into a (n, len(emotions)) matrix."""
+    return np.array(
+        [[float(scores.get(emo, 0.0)) for emo in emotions] for scores in scores_list],
+        dtype=np.float64,
+    ).reshape(len(scores_list), len(emotions))
+
+
+def matrix_to_scores(
+    matrix: np.ndarray,
+    emotions: Sequence[str] = EMOTION_ORDER,
+) -> List[Dict[str, float]]:
+    """Inverse of scores_to_matrix."""
+    return [dict(zip(emotions, row)) for row in np.asarray(matrix, dtype=float).tolist()]
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Scale each row to sum to 1 (all-zero rows stay zero)."""
+    totals = matrix.sum(axis=1, keepdims=True)
+    return np.divide(matrix, totals, out=np.zeros_like(matrix, dtype=float), where=totals > 0)
+
+
+# =========================================================
+# Calibration (temperature scaling)
+# =========================================================
+
+def apply_temperature(probs: np.ndarray, temperature: float) -> np.ndarray:
+    """
+    Temperature-scale a batch of probability vectors.
+
+    softmax(log(p) / T) equals softmax(logits / T), so calibration can be
+    applied after the model's softmax.
+    """
+    if temperature == 1.0:
+        return probs
+    logits = np.log(np.clip(probs, _EPS, 1.0)) / temperature
+    logits -= logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def negative_log_likelihood(probs: np.ndarray, labels: np.ndarray) -> float:
+    """Mean NLL of the true labels."""
+    picked = probs[np.arange(len(labels)), labels]
+    return float(-np.log(np.clip(picked, _EPS, 1.0)).mean())
+
+
+def expected_calibration_error(probs: np.ndarray, labels: np.ndarray, n_bins: int = 15) -> float:
+    """ECE of the top-1 prediction over equal-width confidence bins."""
+    confidence = probs.max(axis=1)
+    correct = probs.argmax(axis=1) == labels
+    bins = np.minimum((confidence * n_bins).astype(int), n_bins - 1)
+    counts = np.bincount(bins, minlength=n_bins)
+    conf_sum = np.bincount(bins, weights=confidence, minlength=n_bins)
+    acc_sum = np.bincount(bins, weights=correct.astype(float), minlength=n_bins)
+    mask = counts > 0
+    gap = np.abs(acc_sum[mask] - conf_sum[mask])
+    return float(gap.sum() / max(len(labels), 1))
+
+
+def fit_temperature(
+    probs: np.ndarray,
+    labels: np.ndarray,
+    low: float = 0.05,
+    high: float = 10.0,
+    iterations: int = 60,
+) -> float:
+    """Temperature minimizing NLL (golden-section search on log T)."""
+    ratio = (np.sqrt(5) - 1) / 2
+    a, b = np.log(low), np.log(high)
+
+    def loss(log_t: float) -> float:
+        return negative_log_likelihood(apply_temperature(probs, float(np.exp(log_t))), labels)
+
+    c, d = b - ratio * (b - a), a + ratio * (b - a)
+    fc, fd = loss(c), loss(d)
+    for _ in range(iterations):
+        if fc < fd:
+            b, d, fd = d, c, fc
+            c = b - ratio * (b - a)
+            fc = loss(c)
+        else:
+            a, c, fc = c, d, fd
+            d = a + ratio * (b - a)
+            fd = loss(d)
+    return float(np.exp((a + b) / 2))
+
+
+def calibration_path(checkpoint_path: str | Path) -> Path:
+    checkpoint_path = Path(checkpoint_path)
+    return checkpoint_path.with_name(checkpoint_path.stem + CALIBRATION_SUFFIX)
+
+
+def load_temperature(checkpoint_path: str | Path) -> float:
+    """Fitted temperature for a checkpoint, or 1.0 if it was never calibrated."""
+    path = calibration_path(checkpoint_path)
+    if not path.exists():
+        return 1.0
+    return float(json.loads(path.read_text())["temperature"])
+
+
+# =========================================================
+# Model cascade
+# =========================================================
+
+def cascade_path(checkpoint_path: str | Path) -> Path:
+    checkpoint_path = Path(checkpoint_path)
+    return checkpoint_path.with_name(checkpoint_path.stem + CASCADE_SUFFIX)
+
+
+def cascade_confidence(matrix: np.ndarray, metric: str = "margin") -> np.ndarray:
+    """Per-row confidence used to gate the cascade: "margin" or "entropy"."""
+    if metric == "entropy":
+        return entropy_confidence(matrix)
+    if metric == "margin":
+        return top_margin(matrix)
+    raise ValueError(f"Unknown cascade metric: {metric}")
+
+
+def tune_cascade_threshold(
+    confidence: np.ndarray,
+    small_correct: np.ndarray,
+    large_correct: np.ndarray,
+    target_accuracy: float,
+) -> Dict[str, float]:
+    """
+    Lowest threshold whose cascade reaches target_accuracy.
+
+    Rows with confidence < threshold are escalated to the large model.
+    Escalating the k least confident rows gives accuracy
+    (large_correct[:k].sum() + small_correct[k:].sum()) / n, computed for
+    every k at once; the smallest k reaching the target wins (the most
+    accurate k if none does).
+    """
+    order = np.argsort(confidence, kind="stable")
+    conf = confidence[order]
+    small = small_correct[order].astype(float)
+    large = large_correct[order].astype(float)
+    n = len(conf)
+
+    escalated_hits = np.concatenate([[0.0], np.cumsum(large)])
+    kept_hits = np.concatenate([np.cumsum(small[::-1])[::-1], [0.0]])
+    accuracy = (escalated_hits + kept_hits) / max(n, 1)
+
+    reached = np.flatnonzero(accuracy >= target_accuracy)
+    k = int(reached[0]) if reached.size else int(np.argmax(accuracy))
+    if k == 0:
+        threshold = float(conf[0]) if n else 0.0
+    elif k == n:
+        threshold = float(np.nextafter(conf[-1], np.inf))
+    else:
+        threshold = float((conf[k - 1] + conf[k]) / 2)
+    return {
+        "threshold": threshold,
+        "accuracy": float(accuracy[k]),
+        "escalation_rate": k / max(n, 1),
+        "target_reached": bool(reached.size),
+    }
+
+
+# =========================================================
+# Batch summaries
+# =========================================================
+
+def top_k(matrix: np.ndarray, k: int = 3) -> tuple[np.ndarray, np.ndarray]:
+    """Indices and values of the k highest scores per row, best first."""
+    k = min(k, matrix.shape[1])
+    idx = np.argpartition(-matrix, k - 1, axis=1)[:, :k]
+    vals = np.take_along_axis(matrix, idx, axis=1)
+    order = np.argsort(-vals, axis=1)
+    return np.take_along_axis(idx, order, axis=1), np.take_along_axis(vals, order, axis=1)
+
+
+def entropy_confidence(matrix: np.ndarray) -> np.ndarray:
+    """
+    1 - H(p) / log(C): 1 for one-hot rows, 0 for uniform rows.
+
+    With a single class there is no uncertainty: every row gets 1.
+    """
+    if matrix.shape[1] < 2:
+        return np.ones(matrix.shape[0])
+    probs = normalize_rows(matrix)
+    entropy = -(probs * np.log(np.clip(probs, _EPS, 1.0))).sum(axis=1)
+    return 1.0 - entropy / np.log(matrix.shape[1])
+
+
+def top_margin(matrix: np.ndarray) -> np.ndarray:
+    """
+    Difference between the best and second-best score of each row
+    (the best score itself with a single class).
+    """
+    _, vals = top_k(matrix, 2)
+    if vals.shape[1] < 2:
+        return vals[:, 0].astype(np.float64)
+    return vals[:, 0] - vals[:, 1]
+
+
+def summarize(
+    matrix: np.ndarray,
+    emotions: Sequence[str] = EMOTION_ORDER,
+    k: int = 3,
+) -> List[Dict[str, object]]:
+    """
+    Per-row summary: top-k emotions, confidence, margin and ambiguous flag.
+
+    Everything is computed on the whole batch at once.
+    """
+    idx, vals = top_k(matrix, k)
+    confidence = entropy_confidence(matrix)
+    margin = top_margin(matrix)
+    ambiguous = (confidence < AMBIGUOUS_CONFIDENCE) | (margin < AMBIGUOUS_MARGIN)
+    names = np.asarray(emotions, dtype=object)
+    return [
+        {
+            "top": [[name, float(v)] for name, v in zip(names[i], v_row)],
+            "confidence": float(c),
+            "margin": float(m),
+            "ambiguous": bool(a),
+        }
+        for i, v_row, c, m, a in zip(idx, vals, confidence, margin, ambiguous)
+    ]
+
+
+# =========================================================
+# Playlist arcs
+# =========================================================
+
+def arc_target(
+    waypoints: Sequence[str],
+    n_tracks: int,
+    emotions: Sequence[str] = EMOTION_ORDER,
+) -> np.ndarray:
+    """
+    (n_tracks, n_emotions) target arc through the waypoint emotions.
+
+    Piecewise-linear between one-hot profiles placed evenly along the
+    track order, e.g. ["Joy", "Sadness"] goes from all joy to all sadness.
+    """
+    if len(waypoints) < 2:
+        raise ValueError("An arc needs at least two waypoint emotions")
+    anchors = np.zeros((len(waypoints), len(emotions)))
+    anchors[np.arange(len(waypoints)), [list(emotions).index(w) for w in waypoints]] = 1.0
+    position = np.linspace(0.0, len(waypoints) - 1, n_tracks)
+    lower = np.minimum(position.astype(int), len(waypoints) - 2)
+    t = (position - lower)[:, None]
+    return (1.0 - t) * anchors[lower] + t * anchors[lower + 1]
+
+
+def arc_fit(matrix: np.ndarray, target: np.ndarray) -> float:
+    """Mean per-track dot product of scores with the target (higher is closer)."""
+    return float(np.einsum("ij,ij->i", matrix, target).mean()) if len(matrix) else 0.0
+
+
+def reorder_to_arc(
+    matrix: np.ndarray,
+    target: np.ndarray,
+    max_passes: int = 20,
+) -> np.ndarray:
+    """
+    Track order (indices into matrix rows) that follows the target arc.
+
+    Tracks are first sorted by (last waypoint - first waypoint) score
+    contrast, which is already the best order for a two-waypoint arc (the
+    arc's weight on that contrast increases along the order). Pairwise
+    swaps that raise arc_fit are then applied, all candidates of a track
+    evaluated at once, until a pass finds none: O(passes * n^2) instead of
+    trying n! permutations.
+    """
+    n = len(matrix)
+    if n < 2:
+        return np.arange(n)
+    gain = matrix @ target.T  # gain[track, position]
+    order = np.argsort(gain[:, -1] - gain[:, 0], kind="stable")
+
+    for _ in range(max_passes):
+        improved = False
+        for i in range(n):
+            current = gain[order, np.arange(n)]
+            # Swapping positions i and j: track order[i] -> j, order[j] -> i
+            delta = gain[order[i], :] + gain[order, i] - current[i] - current
+            j = int(np.argmax(delta))
+            if delta[j] > 1e-12:
+                order[i], order[j] = order[j], order[i]
+                improved = True
+        if not improved:
+            break
+    return order
@@ -0,0 +1,421 @@
+# emo_service.py
+"""
+Standalone HTTP/JSON scoring service.
+
+Keeps one warm model per process and serves it to any number of UI
+replicas (see emo_client.py). Run from the project root:
+
+    python emo_service.py --port 8600
+
+With --workers N the parent loads the model once, moves the weights to
+shared memory and forks N workers that accept on the same socket.
+
+Endpoints:
+    GET  /health        -> {"status": "ok"}
+    GET  /schema        -> {"emotions": [...], "colors": [...], "max_request_texts": N}
+                           (emotions of the loaded checkpoint, /score/batch limit)
+    GET  /metrics       -> Prometheus text format (per worker process)
+    POST /score         {"lyrics": "..."}        -> {"scores": {...}, "summary": {...}}
+    POST /score/batch   {"lyrics": ["...", ...]} -> {"scores": [{...}, ...], "summary": [...]}
+
+Each summary holds the top-3 emotions, an entropy-based confidence, the
+top-1/top-2 margin and an "ambiguous" flag (see emo_scores.py).
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import os
+import queue
+import signal
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence
+
+from emo_metrics import Counter, register, render_prometheus, timed
+
+
+# =========================================================
+# Config / constants
+# =========================================================
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8600
+
+# Micro-batching: requests arriving within MAX_WAIT_MS are scored together
+MAX_BATCH_SIZE = 64
+MAX_WAIT_MS = 10
+
+# Requests allowed in flight at once; extra requests get 503
+MAX_INFLIGHT = 32
+INFLIGHT_WAIT_SECONDS = 1.0
+
+# Upper bound on texts in a single /score/batch request; clients learn it
+# from /schema or the 413 answer (see emo_client.score_batch)
+MAX_REQUEST_TEXTS = 1024
+
+# Pre-fork workers that fail before serving (e.g. a bad checkpoint) are
+# restarted after an exponential backoff; the service gives up after
+# MAX_STARTUP_FAILURES consecutive startup failures
+RESTART_BACKOFF_S = 0.5
+RESTART_BACKOFF_MAX_S = 30.0
+MAX_STARTUP_FAILURES = 5
+STARTUP_FAILED_EXIT_CODE = 3
+
+REJECTED_REQUESTS = register(Counter(
+    "emolyrics_service_rejected_total",
+    "Requests rejected by the service, by reason.",
+))
+
+ScoreFn = Callable[[Sequence[str]], List[Dict[str, float]]]
+
+
+# =========================================================
+# Request batching
+# =========================================================
+
+class MicroBatcher:
+    """
+    Collect texts from concurrent requests and score them together.
+
+    A single worker thread drains the queue, waiting at most max_wait_ms
+    for a batch to fill up to max_batch_size, then calls score_fn once.
+    """
+
+    def __init__(
+        self,
+        score_fn: ScoreFn,
+        max_batch_size: int = MAX_BATCH_SIZE,
+        max_wait_ms: float = MAX_WAIT_MS,
+    ) -> None:
+        self.score_fn = score_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue[tuple[str, Future]]" | None = None
+        self._owner_pid: int | None = None
+
+    def submit(self, texts: Sequence[str]) -> List[Future]:
+        """Queue texts for scoring; returns one future per text."""
+        work_queue = self._ensure_worker()
+        futures = []
+        for text in texts:
+            future: Future = Future()
+            work_queue.put((text, future))
+            futures.append(future)
+        return futures
+
+    def score(self, texts: Sequence[str]) -> List[Dict[str, float]]:
+        """Blocking helper: submit texts and wait for their scores."""
+        return [future.result() for future in self.submit(texts)]
+
+    def _ensure_worker(self) -> "queue.Queue":
+        """Start the worker thread lazily, once per process (fork-safe)."""
+        with self._lock:
+            if self._owner_pid != os.getpid():
+                self._queue = queue.Queue()
+                self._owner_pid = os.getpid()
+                threading.Thread(target=self._run, args=(self._queue,), daemon=True).start()
+            return self._queue
+
+    def _run(self, work_queue: "queue.Queue") -> None:
+        while True:
+            batch = [work_queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(work_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            texts = [text for text, _ in batch]
+            try:
+                results = self.score_fn(texts)
+            except Exception as exc:  # propagate to every waiting request
+                for _, future in batch:
+                    future.set_exception(exc)
+                continue
+            for (_, future), scores in zip(batch, results):
+                future.set_result(scores)
+
+
+# =========================================================
+# HTTP layer
+# =========================================================
+
+def _summaries(scores: List[Dict[str, float]], emotions: Sequence[str]) -> List[dict]:
+    """Top-k / confidence / ambiguous summary for a batch, in one pass."""
+    from emo_scores import scores_to_matrix, summarize
+
+    return summarize(scores_to_matrix(scores, emotions), emotions) if scores else []
+
+
+class ScoringHandler(BaseHTTPRequestHandler):
+    """JSON request handler; server attributes hold the batcher and limits."""
+
+    server_version = "EmoLyricsScoring/1.0"
+
+    def do_GET(self) -> None:
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif self.path == "/schema":
+            self._send_json(200, {**self.server.schema.to_dict(), "max_request_texts": MAX_REQUEST_TEXTS})
+        elif self.path == "/metrics":
+            data = render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        else:
+            self._send_json(404, {"error": f"Unknown path: {self.path}"})
+
+    def do_POST(self) -> None:
+        if self.path not in ("/score", "/score/batch"):
+            self._send_json(404, {"error": f"Unknown path: {self.path}"})
+            return
+
+        if not self.server.inflight.acquire(timeout=INFLIGHT_WAIT_SECONDS):
+            REJECTED_REQUESTS.inc(reason="busy")
+            self._send_json(503, {"error": "Server busy, retry later."})
+            return
+        try:
+            with timed("service_request"):
+                self._handle_score()
+        finally:
+            self.server.inflight.release()
+
+    def _handle_score(self) -> None:
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            lyrics = payload["lyrics"]
+        except (ValueError, KeyError, TypeError):
+            self._send_json(400, {"error": "Body must be JSON with a 'lyrics' field."})
+            return
+
+        if self.path == "/score":
+            if not isinstance(lyrics, str):
+                self._send_json(400, {"error": "'lyrics' must be a string."})
+                return
+            scores = self.server.batcher.score([lyrics])
+            self._send_json(200, {"scores": scores[0], "summary": _summaries(scores, self.server.schema.emotions)[0]})
+            return
+
+        if not isinstance(lyrics, list) or not all(isinstance(t, str) for t in lyrics):
+            self._send_json(400, {"error": "'lyrics' must be a list of strings."})
+            return
+        if len(lyrics) > MAX_REQUEST_TEXTS:
+            self._send_json(
+                413,
+                {"error": f"At most {MAX_REQUEST_TEXTS} texts per request.", "max_request_texts": MAX_REQUEST_TEXTS},
+            )
+            return
+        scores = self.server.batcher.score(lyrics)
+        self._send_json(200, {"scores": scores, "summary": _summaries(scores, self.server.schema.emotions)})
+
+    def _send_json(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args) -> None:
+        # Keep stdout quiet; errors still go through log_error
+        pass
+
+
+def make_server(
+    score_fn: ScoreFn,
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    max_batch_size: int = MAX_BATCH_SIZE,
+    max_wait_ms: float = MAX_WAIT_MS,
+    max_inflight: int = MAX_INFLIGHT,
+    schema=None,
+) -> ThreadingHTTPServer:
+    """
+    Build a threaded HTTP server around score_fn (not started yet).
+
+    schema is the EmotionSchema served at /schema (default: DEFAULT_SCHEMA).
+    """
+    from emo_scores import DEFAULT_SCHEMA
+
+    server = ThreadingHTTPServer((host, port), ScoringHandler)
+    server.schema = schema if schema is not None else DEFAULT_SCHEMA
+    server.daemon_threads = True
+    server.batcher = MicroBatcher(score_fn, max_batch_size, max_wait_ms)
+    server.inflight = threading.BoundedSemaphore(max_inflight)
+    return server
+
+
+def serve_prefork(
+    server: ThreadingHTTPServer,
+    workers: int,
+    on_worker_start: Optional[Callable[[], None]] = None,
+) -> None:
+    """
+    Fork `workers` children that all serve the already-bound socket.
+
+    Everything loaded before this call (model weights included) is
+    inherited by the children. gc.freeze() moves existing objects out of
+    the collector's reach so GC passes don't write to (and un-share) the
+    parent's pages. Crashed workers are restarted; workers that fail in
+    on_worker_start are restarted with an exponential backoff, and after
+    MAX_STARTUP_FAILURES such failures in a row all workers are stopped.
+    SIGTERM/SIGINT on the parent stops all of them.
+
+    Do not run inference in the parent before forking: torch's OpenMP
+    thread pool does not survive fork().
+    """
+    # Losing workers get EAGAIN on accept() instead of blocking
+    server.socket.setblocking(False)
+    gc.freeze()
+
+    children = set()
+    stopping = False
+
+    def spawn() -> None:
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            code = STARTUP_FAILED_EXIT_CODE
+            try:
+                if on_worker_start is not None:
+                    on_worker_start()
+                code = 1
+                server.serve_forever()
+                code = 0
+            except BaseException:
+                traceback.print_exc()
+            finally:
+                os._exit(code)
+        children.add(pid)
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(workers):
+        spawn()
+
+    startup_failures = 0
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if stopping:
+            continue
+        if os.waitstatus_to_exitcode(status) != STARTUP_FAILED_EXIT_CODE:
+            startup_failures = 0
+            print(f"Worker {pid} exited, restarting")
+            spawn()
+            continue
+
+        startup_failures += 1
+        if startup_failures >= MAX_STARTUP_FAILURES:
+            print(f"Worker {pid} failed to start {startup_failures} times in a row, giving up")
+            stop(None, None)
+            continue
+        delay = min(RESTART_BACKOFF_S * 2 ** (startup_failures - 1), RESTART_BACKOFF_MAX_S)
+        print(f"Worker {pid} failed to start, restarting in {delay:.1f}s")
+        time.sleep(delay)
+        if not stopping:
+            spawn()
+
+    server.server_close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="EmoLyrics scoring service")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--max-batch-size", type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS)
+    parser.add_argument("--max-inflight", type=int, default=MAX_INFLIGHT)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Pre-forked worker processes sharing one copy of the model",
+    )
+    parser.add_argument(
+        "--threads-per-worker",
+        type=int,
+        default=None,
+        help="Torch threads per worker (default: CPU count / workers)",
+    )
+    args = parser.parse_args()
+
+    from emo_inference import (
+        get_model,
+        get_schema,
+        score_texts,
+        set_num_threads,
+        share_model_memory,
+        warm_up,
+    )
+    from emo_startup import log_startup_report
+
+    print("Loading model...")
+    loaded = get_model()
+
+    server = make_server(
+        score_texts,
+        args.host,
+        args.port,
+        args.max_batch_size,
+        args.max_wait_ms,
+        args.max_inflight,
+        schema=get_schema(),
+    )
+    print(f"Scoring service listening on http://{args.host}:{args.port}")
+
+    threads = args.threads_per_worker or max(1, (os.cpu_count() or 1) // args.workers)
+
+    if args.workers > 1:
+        share_model_memory(loaded)
+        print(f"Forking {args.workers} workers ({threads} torch threads each)")
+
+        def on_worker_start() -> None:
+            # Warm up after fork: torch thread pools must not cross fork()
+            set_num_threads(threads)
+            warm_up()
+            log_startup_report()
+
+        serve_prefork(server, args.workers, on_worker_start)
+        return
+
+    set_num_threads(threads)
+    warm_up()
+    log_startup_report()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
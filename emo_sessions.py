@@ -0,0 +1,405 @@
+# emo_sessions.py
+"""
+Server-side store for per-session artifacts, with a memory bound.
+
+Streamlit keeps st.session_state alive for every open tab, so lyrics,
+scores, timelines and the versions DataFrame of idle tabs stay in the
+server's RSS indefinitely. The app keeps those values here instead (keyed
+by a session id held in st.session_state) and this store:
+
+  - accounts the size of every session's values;
+  - spills sessions idle for more than SESSION_IDLE_SECONDS to a file on
+    disk (the disk tier);
+  - spills the least recently used sessions when the resident total
+    exceeds SESSION_MEMORY_LIMIT_BYTES (the active session is never
+    spilled);
+  - deletes sessions, spilled or not, idle for more than
+    SESSION_TTL_SECONDS.
+
+A spilled session is reloaded transparently on its next access; a
+deleted one starts again from init_session_state's defaults. Sizes and
+evictions are exported through emo_metrics.
+
+Spill files are .npz archives holding the arrays plus a JSON document
+for everything else (see encode_values), loaded with allow_pickle=False:
+reading one never executes code. They live in a private directory (mode
+0700, owned by the app's user). File I/O runs outside the store lock, so
+a slow disk only delays the session being spilled or reloaded.
+"""
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from emo_metrics import SESSION_BYTES, SESSION_EVICTIONS, SESSIONS
+
+
+# =========================================================
+# Config / constants
+# =========================================================
+
+SESSION_IDLE_SECONDS = float(os.environ.get("EMOLYRICS_SESSION_IDLE_S", "600"))
+SESSION_TTL_SECONDS = float(os.environ.get("EMOLYRICS_SESSION_TTL_S", str(24 * 3600)))
+SESSION_MEMORY_LIMIT_BYTES = int(float(os.environ.get("EMOLYRICS_SESSION_MEMORY_MB", "512")) * 1e6)
+# Spill directory; by default a fresh private temporary directory per
+# process, removed at exit
+SESSION_SPILL_DIR = os.environ.get("EMOLYRICS_SESSION_DIR", "")
+
+# Idle / TTL checks run at most this often (on any session's access)
+SWEEP_INTERVAL_SECONDS = 10.0
+
+SPILL_SUFFIX = ".npz"
+_JSON_ENTRY = "__values__"
+
+
+def estimate_bytes(value) -> int:
+    """Approximate memory held by a session value."""
+    if hasattr(value, "memory_usage") and hasattr(value, "columns"):  # DataFrame
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if hasattr(value, "nbytes"):  # numpy array
+        return int(value.nbytes)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_bytes(k) + estimate_bytes(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_bytes(v) for v in value)
+    return sys.getsizeof(value)
+
+
+# =========================================================
+# Spill file format
+# =========================================================
+
+def encode_values(value, arrays: Dict[str, np.ndarray]):
+    """
+    A session value as JSON-compatible data; numeric arrays go to arrays.
+
+    Supported: None, bool, int, float, str, lists / tuples (read back as
+    lists), dicts with str keys, numpy arrays and scalars, and DataFrames
+    (numeric columns as arrays, other columns as JSON lists). Every dict
+    in the output is a one-key type tag, so user data never collides
+    with the tags. Raises TypeError for anything else.
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        if value.dtype.hasobject:
+            return {"list": encode_values(value.tolist(), arrays)}
+        name = f"a{len(arrays)}"
+        arrays[name] = value
+        return {"ndarray": name}
+    if isinstance(value, (list, tuple)):
+        return [encode_values(v, arrays) for v in value]
+    if isinstance(value, dict):
+        if not all(isinstance(k, str) for k in value):
+            raise TypeError("Session dicts must have str keys")
+        return {"dict": {k: encode_values(v, arrays) for k, v in value.items()}}
+    if hasattr(value, "columns") and hasattr(value, "index"):  # DataFrame
+        columns = {}
+        for col in value.columns:
+            data = value[col].to_numpy()
+            columns[str(col)] = encode_values(data if data.dtype.kind in "biuf" else data.tolist(), arrays)
+        return {"dataframe": {"index": encode_values(value.index.tolist(), arrays), "columns": columns}}
+    raise TypeError(f"Cannot store a {type(value).__name__} in a session spill file")
+
+
+def decode_values(data, arrays: Dict[str, np.ndarray]):
+    """Inverse of encode_values."""
+    if isinstance(data, list):
+        return [decode_values(v, arrays) for v in data]
+    if not isinstance(data, dict):
+        return data
+    (tag, body), = data.items()
+    if tag == "ndarray":
+        return arrays[body]
+    if tag == "list":
+        return np.array(decode_values(body, arrays), dtype=object)
+    if tag == "dict":
+        return {k: decode_values(v, arrays) for k, v in body.items()}
+    if tag == "dataframe":
+        import pandas as pd
+
+        columns = {k: decode_values(v, arrays) for k, v in body["columns"].items()}
+        return pd.DataFrame(columns, columns=list(columns), index=decode_values(body["index"], arrays))
+    raise ValueError(f"Unknown tag {tag!r} in session spill file")
+
+
+def write_spill_file(path: Path, values: Dict[str, object]) -> None:
+    """Write session values to path atomically (see encode_values)."""
+    arrays: Dict[str, np.ndarray] = {}
+    document = json.dumps(encode_values(values, arrays)).encode("utf-8")
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **{_JSON_ENTRY: np.frombuffer(document, dtype=np.uint8)}, **arrays)
+    os.replace(tmp_path, path)
+
+
+def read_spill_file(path: Path) -> Dict[str, object]:
+    """Session values written by write_spill_file (never unpickles)."""
+    with np.load(path, allow_pickle=False) as data:
+        arrays = {name: data[name] for name in data.files}
+    document = json.loads(arrays.pop(_JSON_ENTRY).tobytes().decode("utf-8"))
+    return decode_values(document, arrays)
+
+
+def private_directory(path: Path) -> Path:
+    """
+    Create path (mode 0700) if needed and check it is private.
+
+    Raises PermissionError if it is owned by another user; group / other
+    permissions are removed.
+    """
+    path.mkdir(mode=0o700, parents=True, exist_ok=True)
+    if hasattr(os, "getuid"):  # POSIX
+        info = path.stat()
+        if info.st_uid != os.getuid():
+            raise PermissionError(
+                f"Session directory {path} is owned by another user; "
+                "set EMOLYRICS_SESSION_DIR to a private directory"
+            )
+        if info.st_mode & 0o077:
+            os.chmod(path, 0o700)
+    return path
+
+
+# =========================================================
+# Store
+# =========================================================
+
+class _Session:
+    __slots__ = ("values", "sizes", "last_seen", "spilled", "io_lock")
+
+    def __init__(self, now: float) -> None:
+        self.values: Dict[str, object] = {}
+        self.sizes: Dict[str, int] = {}
+        self.last_seen = now
+        self.spilled = False
+        # Held during this session's file I/O (spill or reload)
+        self.io_lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        return sum(self.sizes.values())
+
+
+class SessionStore:
+    """Per-session values with a memory tier, a disk tier and a TTL."""
+
+    def __init__(
+        self,
+        spill_dir: str | Path = SESSION_SPILL_DIR,
+        idle_seconds: float = SESSION_IDLE_SECONDS,
+        ttl_seconds: float = SESSION_TTL_SECONDS,
+        memory_limit_bytes: int = SESSION_MEMORY_LIMIT_BYTES,
+    ) -> None:
+        if spill_dir:
+            self.spill_dir = private_directory(Path(spill_dir))
+            # Spill files of a previous server process cannot be claimed
+            for pattern in ("*" + SPILL_SUFFIX, "*.tmp", "*.pkl"):
+                for path in self.spill_dir.glob(pattern):
+                    path.unlink(missing_ok=True)
+        else:
+            self.spill_dir = Path(tempfile.mkdtemp(prefix="emolyrics-sessions-"))
+            atexit.register(shutil.rmtree, self.spill_dir, ignore_errors=True)
+        self.idle_seconds = idle_seconds
+        self.ttl_seconds = ttl_seconds
+        self.memory_limit_bytes = memory_limit_bytes
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, _Session] = {}
+        self._last_sweep = 0.0
+
+    # ---- access ----
+
+    def contains(self, session_id: str, key: str) -> bool:
+        with self._resident(session_id) as session:
+            return key in session.values
+
+    def get(self, session_id: str, key: str, default=None):
+        with self._resident(session_id) as session:
+            return session.values.get(key, default)
+
+    def set(self, session_id: str, key: str, value) -> None:
+        with self._resident(session_id) as session:
+            session.values[key] = value
+            session.sizes[key] = estimate_bytes(value)
+            victims = self._over_limit(keep=session_id)
+        self._evict(victims, [])
+
+    def touch(self, session_id: str) -> None:
+        """Mark a session active (reloading it if spilled) and run due sweeps."""
+        victims, expired = [], []
+        with self._resident(session_id):
+            now = time.monotonic()
+            if now - self._last_sweep >= SWEEP_INTERVAL_SECONDS:
+                self._last_sweep = now
+                victims, expired = self._sweep(now, keep=session_id)
+        self._evict(victims, expired)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return self._stats()
+
+    # ---- internals ----
+
+    def _resident(self, session_id: str) -> "_ResidentSession":
+        """Context manager: the session, in memory, with the store lock held."""
+        return _ResidentSession(self, session_id)
+
+    def _spill_path(self, session_id: str) -> Path:
+        return self.spill_dir / f"{session_id}{SPILL_SUFFIX}"
+
+    def _reload(self, session_id: str) -> None:
+        """Read a spilled session back from disk (store lock not held)."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is None:
+            return
+        with session.io_lock:
+            with self._lock:
+                if not session.spilled:
+                    return
+            path = self._spill_path(session_id)
+            try:
+                values = read_spill_file(path)
+            except (OSError, ValueError, KeyError) as exc:
+                # Deleted by a TTL sweep meanwhile, or unreadable: start empty
+                print(f"Warning: cannot reload session {session_id} ({exc}); starting it empty")
+                values = {}
+            with self._lock:
+                session.values = values
+                session.sizes = {key: estimate_bytes(value) for key, value in values.items()}
+                session.spilled = False
+            path.unlink(missing_ok=True)
+
+    def _spill(self, session_id: str, reason: str) -> None:
+        """Move a session's values to disk (store lock not held)."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is None:
+            return
+        with session.io_lock:
+            with self._lock:
+                if session.spilled or not session.values:
+                    return
+                values, last_seen = dict(session.values), session.last_seen
+            path = self._spill_path(session_id)
+            try:
+                write_spill_file(path, values)
+            except (OSError, TypeError, ValueError) as exc:
+                print(f"Warning: cannot spill session {session_id} ({exc}); keeping it in memory")
+                return
+            with self._lock:
+                # Used (or deleted) while being written: keep it in memory
+                keep = self._sessions.get(session_id) is not session or session.last_seen != last_seen
+                if not keep:
+                    session.values = {}
+                    session.spilled = True
+            if keep:
+                path.unlink(missing_ok=True)
+                return
+        SESSION_EVICTIONS.inc(reason=reason)
+
+    def _evict(self, victims: List[Tuple[str, str]], expired: List[str]) -> None:
+        """Spill victims and delete the files of expired sessions, then update metrics."""
+        for session_id in expired:
+            self._spill_path(session_id).unlink(missing_ok=True)
+        for session_id, reason in victims:
+            self._spill(session_id, reason)
+        with self._lock:
+            self._update_metrics()
+
+    # ---- bookkeeping (called with the store lock held) ----
+
+    def _sweep(self, now: float, keep: str) -> Tuple[List[Tuple[str, str]], List[str]]:
+        """(sessions to spill with their reason, ids of dropped spilled sessions)."""
+        victims, expired = [], []
+        for session_id, session in list(self._sessions.items()):
+            if session_id == keep:
+                continue
+            idle = now - session.last_seen
+            if idle > self.ttl_seconds:
+                del self._sessions[session_id]
+                SESSION_EVICTIONS.inc(reason="ttl")
+                if session.spilled:
+                    expired.append(session_id)
+            elif idle > self.idle_seconds and not session.spilled:
+                victims.append((session_id, "idle"))
+        spilling = {session_id for session_id, _ in victims}
+        victims += [v for v in self._over_limit(keep) if v[0] not in spilling]
+        return victims, expired
+
+    def _over_limit(self, keep: str) -> List[Tuple[str, str]]:
+        """Least recently used sessions to spill to get under the memory limit."""
+        resident = self._resident_bytes()
+        victims = []
+        if resident <= self.memory_limit_bytes:
+            return victims
+        by_age = sorted(
+            (s.last_seen, session_id) for session_id, s in self._sessions.items()
+            if not s.spilled and session_id != keep
+        )
+        for _, session_id in by_age:
+            resident -= self._sessions[session_id].nbytes
+            victims.append((session_id, "limit"))
+            if resident <= self.memory_limit_bytes:
+                break
+        return victims
+
+    def _resident_bytes(self) -> int:
+        return sum(s.nbytes for s in self._sessions.values() if not s.spilled)
+
+    def _stats(self) -> Dict[str, int]:
+        spilled: List[_Session] = [s for s in self._sessions.values() if s.spilled]
+        return {
+            "sessions_memory": len(self._sessions) - len(spilled),
+            "sessions_disk": len(spilled),
+            "bytes_memory": self._resident_bytes(),
+            "bytes_disk": sum(s.nbytes for s in spilled),
+        }
+
+    def _update_metrics(self) -> None:
+        stats = self._stats()
+        SESSIONS.set(stats["sessions_memory"], tier="memory")
+        SESSIONS.set(stats["sessions_disk"], tier="disk")
+        SESSION_BYTES.set(stats["bytes_memory"], tier="memory")
+        SESSION_BYTES.set(stats["bytes_disk"], tier="disk")
+
+
+class _ResidentSession:
+    """
+    `with store._resident(session_id) as session:` marks the session used
+    and yields it with its values in memory and the store lock held. A
+    spilled session is reloaded first, without holding the store lock.
+    """
+
+    def __init__(self, store: SessionStore, session_id: str) -> None:
+        self.store = store
+        self.session_id = session_id
+
+    def __enter__(self) -> _Session:
+        store = self.store
+        while True:
+            store._lock.acquire()
+            now = time.monotonic()
+            session = store._sessions.get(self.session_id)
+            if session is None:
+                session = store._sessions[self.session_id] = _Session(now)
+            session.last_seen = now
+            if not session.spilled:
+                return session
+            store._lock.release()
+            store._reload(self.session_id)
+
+    def __exit__(self, *exc) -> None:
+        self.store._lock.release()
@@ -0,0 +1,42 @@
+# emo_startup.py
+"""Startup timing: record how long each startup stage takes."""
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+# Reference point: first import of this module (import it first)
+STARTUP_T0 = time.perf_counter()
+
+_TIMINGS: Dict[str, float] = {}
+_REPORTED = False
+
+
+@contextmanager
+def startup_stage(name: str) -> Iterator[None]:
+    """Time a startup stage; repeated stages accumulate."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _TIMINGS[name] = _TIMINGS.get(name, 0.0) + time.perf_counter() - start
+
+
+def startup_report() -> str:
+    """Human-readable table of stage timings and time since STARTUP_T0."""
+    lines = ["Startup timings:"]
+    for name, seconds in _TIMINGS.items():
+        lines.append(f"  {name:<24} {seconds * 1000:8.1f} ms")
+    total = time.perf_counter() - STARTUP_T0
+    lines.append(f"  {'ready after':<24} {total * 1000:8.1f} ms")
+    return "\n".join(lines)
+
+
+def log_startup_report() -> None:
+    """Print the startup report once per process."""
+    global _REPORTED
+    if _REPORTED:
+        return
+    _REPORTED = True
+    print(startup_report(), flush=True)
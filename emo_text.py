@@ -0,0 +1,95 @@
+# emo_text.py
+"""Lyrics text helpers: line splitting, sliding windows over lines and playlists."""
+from __future__ import annotations
+
+import math
+import re
+from typing import List, Tuple
+
+# A line of three or more dashes separates the tracks of a pasted playlist
+TRACK_SEPARATOR = re.compile(r"^\s*-{3,}\s*$", re.MULTILINE)
+
+
+def split_lines(lyrics: str) -> List[str]:
+    """Non-empty, stripped lines of a lyrics string."""
+    return [line.strip() for line in lyrics.splitlines() if line.strip()]
+
+
+def window_starts(n_lines: int, window: int, stride: int) -> List[int]:
+    """
+    First line of every window of `window` lines, every `stride` lines.
+
+    Starts are multiples of stride; the last window may be shorter so the
+    final lines are always covered.
+    """
+    if n_lines <= window:
+        return [0]
+    last = math.ceil((n_lines - window) / stride) * stride
+    return list(range(0, last + 1, stride))
+
+
+def window_blocks(
+    n_lines: int,
+    window: int,
+    stride: int,
+) -> Tuple[int, List[Tuple[int, int]], List[int]]:
+    """
+    Split lines into shared blocks so overlapping windows can reuse them.
+
+    Blocks are gcd(window, stride) lines long, so every window is a run of
+    whole blocks. Returns (block_size, [(first_block, end_block)] per
+    window, window starts).
+    """
+    block = math.gcd(window, stride)
+    n_blocks = math.ceil(n_lines / block)
+    starts = window_starts(n_lines, window, stride)
+    spans = [
+        (start // block, min(math.ceil((start + window) / block), n_blocks))
+        for start in starts
+    ]
+    return block, spans, starts
+
+
+def window_texts(lines: List[str], window: int, stride: int) -> Tuple[List[str], List[int]]:
+    """Text of every window (lines joined by newlines) and its start line."""
+    starts = window_starts(len(lines), window, stride)
+    return ["\n".join(lines[s:s + window]) for s in starts], starts
+
+
+def split_stanzas(lyrics: str) -> List[List[str]]:
+    """Stanzas (groups of lines separated by blank lines), as lists of lines."""
+    stanzas: List[List[str]] = [[]]
+    for line in lyrics.splitlines():
+        if line.strip():
+            stanzas[-1].append(line.strip())
+        elif stanzas[-1]:
+            stanzas.append([])
+    return [stanza for stanza in stanzas if stanza]
+
+
+def group_units(units: List[List[str]], max_units: int) -> List[List[str]]:
+    """Merge adjacent units (lists of lines) so there are at most max_units."""
+    size = math.ceil(len(units) / max_units) if units else 1
+    if size <= 1:
+        return units
+    return [sum(units[i:i + size], []) for i in range(0, len(units), size)]
+
+
+def parse_playlist(text: str) -> List[Tuple[str, str]]:
+    """
+    (title, lyrics) of every track of a pasted playlist.
+
+    Tracks are separated by TRACK_SEPARATOR lines; a first line starting
+    with "#" is the track title, otherwise tracks are named "Track N".
+    Empty tracks are skipped.
+    """
+    tracks = []
+    for chunk in TRACK_SEPARATOR.split(text):
+        lines = chunk.strip().splitlines()
+        title = None
+        if lines and lines[0].startswith("#"):
+            title = lines.pop(0).lstrip("#").strip()
+        lyrics = "\n".join(lines).strip()
+        if lyrics:
+            tracks.append((title or f"Track {len(tracks) + 1}", lyrics))
+    return tracks
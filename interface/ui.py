@@ -1,21 +1,165 @@
 # interface/ui.py
 import time
-import uuid
 
-import pandas as pd
+import numpy as np
 import streamlit as st
 
 from emo_core import (
-    EMOTION_ORDER,
+    CUBE_DIMENSIONS,
+    SCORING_BATCH_SIZE,
+    SESSION_KEY_ATTRIBUTION,
     SESSION_KEY_SCORES,
     SESSION_KEY_LYRICS,
+    SESSION_KEY_PLAYLIST,
+    SESSION_KEY_TIMELINE,
+    TIMELINE_STRIDE_LINES,
+    TIMELINE_WINDOW_LINES,
+    append_versions,
+    get_emotion_schema,
+    count_uploaded_texts,
+    cube_keys,
+    cube_profile,
+    decode_uploaded_tracks,
+    explain_emotions,
     generate_emotion_scores,
+    generate_emotion_scores_batch,
+    iter_emotion_timeline,
+    iter_uploaded_texts,
+    load_emotion_cube,
+    load_similarity_graph,
     load_versions,
-    save_versions,
+    make_version_row,
+    read_text_stream,
+    render_attribution_panel,
     render_emotion_chart,
+    render_emotion_timeline,
     render_compare_scatter,
-    render_result_card,
+    render_playlist_arc,
+    render_scores_result_card,
+    score_playlist,
+    session_get,
+    session_set,
 )
+from emo_metrics import timed
+from emo_scores import arc_fit, arc_target, matrix_to_scores, reorder_to_arc, scores_to_matrix
+from emo_text import parse_playlist, split_lines
+
+
+def render_scoring_error(exc: OSError, detail: str = "") -> None:
+    """
+    Report a failed scoring call (service unreachable, busy after retries,
+    timeout or HTTP error) instead of a traceback.
+    """
+    st.error(f"Scoring failed: {exc}. {detail or 'Please try again in a moment.'}")
+
+
+def render_batch_upload(uploaded_files: list) -> None:
+    """
+    Score many uploaded lyrics files and save each one as a version.
+
+    Files (and .txt members of .zip archives) are decoded one by one and
+    scored in batches of SCORING_BATCH_SIZE, with a progress bar.
+    """
+    total = count_uploaded_texts(uploaded_files)
+    if total == 0:
+        st.warning("No .txt files found in the upload.")
+        return
+
+    st.info(f"{total} lyrics files ready to analyze.")
+    if not st.button(f"✨ Analyze and save all {total} files"):
+        return
+
+    progress = st.progress(0.0, text="Starting batch analysis...")
+    start_time = time.perf_counter()
+    done = 0
+    titles, texts = [], []
+
+    def flush() -> None:
+        nonlocal done
+        scores_list = generate_emotion_scores_batch(texts)
+        append_versions([
+            make_version_row(title, text, scores)
+            for title, text, scores in zip(titles, texts, scores_list)
+        ])
+        done += len(texts)
+        rate = done / max(time.perf_counter() - start_time, 1e-9)
+        progress.progress(
+            done / total,
+            text=f"Analyzed {done}/{total} files ({rate:.1f} files/sec)",
+        )
+        titles.clear()
+        texts.clear()
+
+    try:
+        for name, text in iter_uploaded_texts(uploaded_files):
+            if not text.strip():
+                total -= 1  # whitespace-only file: nothing to score
+                continue
+            titles.append(name)
+            texts.append(text)
+            if len(texts) >= SCORING_BATCH_SIZE:
+                flush()
+        if texts:
+            flush()
+    except OSError as exc:
+        render_scoring_error(
+            exc,
+            f"{done} of {total} files were saved; upload the remaining files again to retry.",
+        )
+        return
+
+    st.success(
+        f"Saved {done} versions. Open the compare tab to see them side by side."
+    )
+
+
+def render_timeline_stream(
+    lyrics: str,
+    window: int,
+    stride: int,
+    placeholder: st.delta_generator.DeltaGenerator,
+) -> None:
+    """
+    Score the emotion timeline of lyrics and draw it as chunks arrive.
+
+    Only shown when the lyrics have more lines than one window; the result
+    is kept in the session store so reruns redraw it without rescoring.
+    """
+    session_set(SESSION_KEY_TIMELINE, None)
+    if len(split_lines(lyrics)) <= window:
+        placeholder.empty()
+        return
+
+    starts, chunks = [], []
+    with timed("timeline"):
+        for chunk_starts, chunk_matrix in iter_emotion_timeline(lyrics, window, stride):
+            starts.extend(chunk_starts)
+            chunks.append(chunk_matrix)
+            render_emotion_timeline(starts, np.concatenate(chunks), window, placeholder)
+
+    session_set(SESSION_KEY_TIMELINE, {
+        "starts": starts,
+        "matrix": np.concatenate(chunks),
+        "window": window,
+    })
+
+
+def render_explain_panel() -> None:
+    """Emotion picker + lyrics highlighted by each line's contribution."""
+    attribution = session_get(SESSION_KEY_ATTRIBUTION)
+    if attribution is None:
+        st.caption("Run the analysis (with at least two lines) to see which lines drive each emotion.")
+        return
+
+    emotions = list(get_emotion_schema().emotions)
+    scores = session_get(SESSION_KEY_SCORES)
+    emotion = st.selectbox(
+        "Emotion to explain",
+        emotions,
+        index=emotions.index(max(emotions, key=lambda emo: scores.get(emo, 0.0))),
+        key="explain_emotion",
+    )
+    render_attribution_panel(attribution, emotion)
 
 
 def render_analyze_tab() -> None:
@@ -33,7 +177,7 @@ def render_analyze_tab() -> None:
 
         input_mode = st.radio(
             "How do you want to provide the lyrics?",
-            ["Type manually", "Upload file (.txt)"],
+            ["Type manually", "Upload files (.txt / .zip)"],
             horizontal=True,
         )
 
@@ -48,20 +192,20 @@ def render_analyze_tab() -> None:
                 key="lyrics_manual",
             )
         else:
-            uploaded_file = st.file_uploader(
-                "Upload a plain-text (.txt) file with the lyrics",
-                type=["txt"],
+            uploaded_files = st.file_uploader(
+                "Upload plain-text (.txt) files or a .zip of them",
+                type=["txt", "zip"],
+                accept_multiple_files=True,
                 key="lyrics_file_uploader",
             )
 
-            if uploaded_file is not None:
-                try:
-                    file_text = uploaded_file.read().decode(
-                        "utf-8",
-                        errors="ignore",
-                    )
-                except Exception:
-                    file_text = ""
+            single_txt = (
+                len(uploaded_files) == 1
+                and uploaded_files[0].name.lower().endswith(".txt")
+            )
+
+            if single_txt:
+                file_text = read_text_stream(uploaded_files[0])
 
                 lyrics = st.text_area(
                     "Loaded lyrics",
@@ -70,13 +214,34 @@ def render_analyze_tab() -> None:
                     label_visibility="collapsed",
                     key="lyrics_file",
                 )
+            elif uploaded_files:
+                render_batch_upload(uploaded_files)
+                lyrics = ""
             else:
                 st.info("Upload a file to view and edit the lyrics here.")
                 lyrics = ""
 
+        with st.expander("Emotion timeline settings"):
+            timeline_window = st.slider(
+                "Lines per window", 2, 32, TIMELINE_WINDOW_LINES, key="timeline_window"
+            )
+            timeline_stride = st.slider(
+                "Stride (lines)", 1, 16, TIMELINE_STRIDE_LINES, key="timeline_stride"
+            )
+
         st.write("")
         run_button = st.button("✨ Analyze emotional profile")
 
+        explain = st.toggle(
+            "🔍 Explain: highlight the lines behind each emotion", key="explain_mode"
+        )
+        explain_by = "Line"
+        if explain:
+            explain_by = st.radio(
+                "Attribute to", ["Line", "Stanza"], horizontal=True, key="explain_by"
+            )
+        attribution_container = st.container()
+
     # ----- Right column: chart + result card + save version -----
     with col_right:
         st.markdown(
@@ -87,63 +252,81 @@ def render_analyze_tab() -> None:
 
         chart_placeholder = st.empty()
         result_placeholder = st.empty()
+        timeline_placeholder = st.empty()
 
         # Initial render (previous scores or zeros)
-        current_scores = st.session_state[SESSION_KEY_SCORES]
+        current_scores = session_get(SESSION_KEY_SCORES)
         render_emotion_chart(current_scores, chart_placeholder)
 
         # Analysis logic
         if run_button:
             if lyrics.strip():
-                with st.spinner("Analyzing lyrics..."):
-                    old_scores = st.session_state[SESSION_KEY_SCORES]
-                    new_scores = generate_emotion_scores(lyrics)
-
-                    # Smooth animation between old and new values
-                    steps = 25
-                    for i in range(steps + 1):
-                        t = i / steps
-                        t_smooth = 1 - (1 - t) ** 3  # ease-out cubic
-
-                        interpolated = {}
-                        for emo in EMOTION_ORDER:
-                            start = old_scores[emo]
-                            end = new_scores[emo]
-                            interpolated[emo] = start + (
-                                end - start
-                            ) * t_smooth
-
-                        render_emotion_chart(interpolated, chart_placeholder)
-                        time.sleep(0.01)
-
-                    # Store new scores and lyrics in session
-                    st.session_state[SESSION_KEY_SCORES] = new_scores
-                    st.session_state[SESSION_KEY_LYRICS] = lyrics
-
-                # Show result card
-                top_emotion = max(new_scores, key=new_scores.get)
-                top_score = new_scores[top_emotion]
-                with result_placeholder:
-                    render_result_card(top_emotion, top_score)
+                try:
+                    with st.spinner("Analyzing lyrics..."), timed("analyze"):
+                        old_scores = session_get(SESSION_KEY_SCORES)
+                        new_scores = generate_emotion_scores(lyrics)
+
+                        # Smooth animation between old and new values
+                        with timed("animation"):
+                            steps = 25
+                            t = np.linspace(0.0, 1.0, steps + 1)
+                            t_smooth = 1 - (1 - t) ** 3  # ease-out cubic
+
+                            emotions = get_emotion_schema().emotions
+                            old_vec = scores_to_matrix([old_scores], emotions)[0]
+                            new_vec = scores_to_matrix([new_scores], emotions)[0]
+                            frames = old_vec + np.outer(t_smooth, new_vec - old_vec)
+
+                            for frame in matrix_to_scores(frames, emotions):
+                                render_emotion_chart(frame, chart_placeholder)
+                                time.sleep(0.01)
+
+                        # Store new scores and lyrics in session
+                        session_set(SESSION_KEY_SCORES, new_scores)
+                        session_set(SESSION_KEY_LYRICS, lyrics)
+
+                    # Show result card
+                    with result_placeholder:
+                        render_scores_result_card(new_scores)
+
+                    render_timeline_stream(
+                        lyrics, timeline_window, timeline_stride, timeline_placeholder
+                    )
+
+                    session_set(SESSION_KEY_ATTRIBUTION, None)
+                    if explain:
+                        with st.spinner("Finding the lines behind each emotion..."):
+                            session_set(
+                                SESSION_KEY_ATTRIBUTION, explain_emotions(lyrics, by=explain_by.lower())
+                            )
+                except OSError as exc:  # scoring service unreachable / busy / failed
+                    render_scoring_error(exc)
             else:
                 st.warning(
                     "Please enter or upload some lyrics before running the analysis."
                 )
                 # If there are previous scores, keep showing the last result card
                 if sum(current_scores.values()) > 0:
-                    top_emotion = max(current_scores, key=current_scores.get)
                     with result_placeholder:
-                        render_result_card(
-                            top_emotion, current_scores[top_emotion]
-                        )
+                        render_scores_result_card(current_scores)
         else:
             # No new analysis: show last result, if any
             if sum(current_scores.values()) > 0:
-                top_emotion = max(current_scores, key=current_scores.get)
                 with result_placeholder:
-                    render_result_card(
-                        top_emotion, current_scores[top_emotion]
-                    )
+                    render_scores_result_card(current_scores)
+
+            timeline = session_get(SESSION_KEY_TIMELINE)
+            if timeline is not None:
+                render_emotion_timeline(
+                    timeline["starts"],
+                    timeline["matrix"],
+                    timeline["window"],
+                    timeline_placeholder,
+                )
+
+        if explain:
+            with attribution_container:
+                render_explain_panel()
 
         # ----- Save version section -----
         st.write("")
@@ -163,25 +346,15 @@ def render_analyze_tab() -> None:
         )
 
         if st.button("Save current analysis as version"):
-            lyrics_to_save = st.session_state[SESSION_KEY_LYRICS]
-            scores_to_save = st.session_state[SESSION_KEY_SCORES]
+            lyrics_to_save = session_get(SESSION_KEY_LYRICS)
+            scores_to_save = session_get(SESSION_KEY_SCORES)
 
             if not lyrics_to_save.strip() or sum(scores_to_save.values()) == 0:
                 st.warning("Run an analysis first before saving a version.")
             else:
-                new_row = {
-                    "version_id": str(uuid.uuid4()),
-                    "title": version_title,
-                    "lyrics": lyrics_to_save,
-                }
-                for emo in EMOTION_ORDER:
-                    new_row[emo] = float(scores_to_save.get(emo, 0.0))
-
-                versions_df = pd.concat(
-                    [versions_df, pd.DataFrame([new_row])],
-                    ignore_index=True,
+                append_versions(
+                    [make_version_row(version_title, lyrics_to_save, scores_to_save)]
                 )
-                save_versions(versions_df)
                 st.success(f"Saved version: {version_title}")
 
 
@@ -230,12 +403,228 @@ def render_compare_tab() -> None:
 
     st.markdown("#### Numeric comparison table")
 
-    table_df = selected_df[["title"] + EMOTION_ORDER].copy()
+    emotions = list(get_emotion_schema().emotions)
+    table_df = selected_df[["title"] + emotions].copy()
 
     # Convert scores 0–1 to percentages with 1 decimal
-    for emo in EMOTION_ORDER:
+    for emo in emotions:
         table_df[emo] = (table_df[emo] * 100).round(1).astype(str) + " %"
 
     table_df = table_df.set_index("title").T
 
     st.dataframe(table_df)
+
+
+def render_catalogue_tab() -> None:
+    """Render the 'Compare with the catalogue' tab (precomputed aggregates)."""
+    st.markdown(
+        '<div class="section-title">'
+        '<span class="icon">📚</span>'
+        '<span>Compare with the catalogue</span></div>',
+        unsafe_allow_html=True,
+    )
+
+    current_scores = session_get(SESSION_KEY_SCORES)
+    if sum(current_scores.values()) == 0:
+        st.info("Analyze some lyrics in the first tab to compare them with the catalogue.")
+        return
+
+    render_catalogue_cube(current_scores)
+    render_similar_songs(current_scores)
+
+
+def render_catalogue_cube(current_scores: dict) -> None:
+    """Your lyrics vs. the precomputed average of a genre / decade / artist."""
+    cube = load_emotion_cube()
+    if cube is None:
+        st.info(
+            "No catalogue aggregates found. Build them with "
+            "`python build_emotion_cube.py` (from training/)."
+        )
+        return
+
+    col_dim, col_key = st.columns([1, 2])
+    with col_dim:
+        dimension_label = st.selectbox("Group by", list(CUBE_DIMENSIONS.keys()))
+    dimension = CUBE_DIMENSIONS[dimension_label]
+    keys = cube_keys(cube, dimension)
+    if not keys:
+        st.warning(f"The catalogue aggregates have no '{dimension_label}' groups.")
+        return
+    with col_key:
+        key = st.selectbox(dimension_label, keys)
+
+    import pandas as pd
+
+    group_title = f"Average {key}"
+    rows = [
+        {"title": "Your lyrics", **current_scores},
+        {"title": group_title, **cube_profile(cube, dimension, key)},
+    ]
+    st.markdown(f"#### Your lyrics vs. {key} ({int(cube.loc[(dimension, key), 'count'])} songs)")
+    render_compare_scatter(pd.DataFrame(rows))
+
+    emotions = list(get_emotion_schema().emotions)
+    table_df = pd.DataFrame(
+        {
+            "Your lyrics": current_scores,
+            "Mean": cube_profile(cube, dimension, key, "mean"),
+            "P10": cube_profile(cube, dimension, key, "p10"),
+            "Median": cube_profile(cube, dimension, key, "p50"),
+            "P90": cube_profile(cube, dimension, key, "p90"),
+        }
+    ).reindex(emotions)
+    st.dataframe((table_df * 100).round(1).astype(str) + " %")
+
+
+def render_similar_songs(current_scores: dict) -> None:
+    """
+    Songs similar to a catalogue song that also feel like your lyrics.
+
+    Walks the precomputed similar-songs graph around the chosen song and
+    ranks what it reaches by similarity times emotion match with the
+    current lyrics' scores.
+    """
+    st.markdown("#### Similar songs with your lyrics' mood")
+    graph = load_similarity_graph()
+    if graph is None:
+        st.info(
+            "No similar-songs graph found. Build it with "
+            "`python build_similar_graph.py` (from training/)."
+        )
+        return
+
+    query = st.text_input("Start from a song (artist or title)", key="similar_query")
+    if not query.strip():
+        return
+    seeds = graph.find_nodes(query)
+    if not seeds:
+        st.warning(f"No catalogue song matches '{query}'.")
+        return
+
+    col_seed, col_method, col_match = st.columns([2, 1, 1])
+    with col_seed:
+        seed = st.selectbox("Song", seeds, format_func=graph.node_label, key="similar_seed")
+    with col_method:
+        method = st.radio(
+            "Walk",
+            ["ppr", "bfs"],
+            format_func={"ppr": "Personalized PageRank", "bfs": "Neighbours (2 hops)"}.get,
+            key="similar_method",
+        )
+    with col_match:
+        min_match = st.slider("Minimum mood match", 0.0, 1.0, 0.5, 0.05, key="similar_min_match")
+
+    results = graph.recommend(seed, current_scores, method=method, min_match=min_match)
+    if not results:
+        st.info("No similar songs match your lyrics' mood; try lowering the minimum match.")
+        return
+
+    import pandas as pd
+
+    table_df = pd.DataFrame(
+        {
+            "Song": [graph.node_label(r["node"]) for r in results],
+            "Similarity": [r["relevance"] for r in results],
+            "Mood match": [r["match"] for r in results],
+            "Score": [r["score"] for r in results],
+        }
+    )
+    st.dataframe(table_df.round(3), hide_index=True)
+
+
+def render_playlist_tab() -> None:
+    """Render the 'Playlist' tab: arc, overall mix and reordering of many tracks."""
+    st.markdown(
+        '<div class="section-title">'
+        '<span class="icon">🎧</span>'
+        '<span>Playlist emotional arc</span></div>',
+        unsafe_allow_html=True,
+    )
+
+    input_mode = st.radio(
+        "How do you want to provide the playlist?",
+        ["Paste tracks", "Upload files (.txt / .zip)"],
+        horizontal=True,
+        key="playlist_input_mode",
+    )
+    if input_mode == "Paste tracks":
+        text = st.text_area(
+            "Playlist lyrics",
+            height=240,
+            placeholder="# First song title\nlyrics...\n---\n# Second song title\nlyrics...",
+            help='Separate tracks with a line of "---". A first line starting with "#" is the title.',
+            key="playlist_text",
+        )
+        tracks = parse_playlist(text)
+    else:
+        uploaded_files = st.file_uploader(
+            "Upload one .txt file per track, or a .zip of them (in track order)",
+            type=["txt", "zip"],
+            accept_multiple_files=True,
+            key="playlist_file_uploader",
+        )
+        tracks = decode_uploaded_tracks(uploaded_files or [])
+
+    if st.button(f"🎧 Analyze playlist ({len(tracks)} tracks)", disabled=len(tracks) < 2):
+        try:
+            with st.spinner("Scoring tracks..."):
+                matrix, n_cached = score_playlist([text for _, text in tracks])
+        except OSError as exc:
+            render_scoring_error(exc)
+        else:
+            session_set(SESSION_KEY_PLAYLIST, {"titles": [title for title, _ in tracks], "matrix": matrix})
+            st.caption(f"Scored {len(tracks) - n_cached} tracks, {n_cached} from cache.")
+
+    playlist = session_get(SESSION_KEY_PLAYLIST)
+    if playlist is None:
+        st.info("Paste or upload at least two tracks, then analyze the playlist.")
+        return
+
+    titles, matrix = playlist["titles"], playlist["matrix"]
+    emotions = list(get_emotion_schema().emotions)
+
+    st.markdown("#### Emotional arc (track order)")
+    render_playlist_arc(titles, matrix)
+
+    st.markdown("#### Overall mix")
+    render_emotion_chart(dict(zip(emotions, matrix.mean(axis=0))), st.empty())
+
+    with st.expander("Per-track profiles"):
+        import pandas as pd
+
+        tracks_df = pd.DataFrame(matrix, columns=emotions)
+        tracks_df.insert(0, "title", [f"{i}. {title}" for i, title in enumerate(titles, 1)])
+        render_compare_scatter(tracks_df)
+
+    st.markdown("#### Reorder toward a target arc")
+    col_start, col_via, col_end = st.columns(3)
+    with col_start:
+        start = st.selectbox(
+            "Start with", emotions, key="arc_start", index=emotions.index("Joy") if "Joy" in emotions else 0
+        )
+    with col_via:
+        via = st.selectbox("Pass through", ["(none)"] + emotions, key="arc_via")
+    with col_end:
+        end = st.selectbox(
+            "End with", emotions, key="arc_end", index=emotions.index("Sadness") if "Sadness" in emotions else len(emotions) - 1
+        )
+    waypoints = [start] + ([via] if via != "(none)" else []) + [end]
+
+    with timed("playlist_reorder"):
+        target = arc_target(waypoints, len(titles), emotions)
+        order = reorder_to_arc(matrix, target)
+    before, after = arc_fit(matrix, target), arc_fit(matrix[order], target)
+    st.caption(f"Arc fit: {before:.1%} in the current order, {after:.1%} reordered.")
+
+    reordered_titles = [titles[i] for i in order]
+    render_playlist_arc(reordered_titles, matrix[order], target)
+    st.dataframe(
+        {
+            "Position": list(range(1, len(order) + 1)),
+            "Track": reordered_titles,
+            "Was": [int(i) + 1 for i in order],
+            "Top emotion": [emotions[j] for j in matrix[order].argmax(axis=1)],
+        },
+        hide_index=True,
+    )
@@ -0,0 +1,288 @@
+"""
+Inference latency / throughput benchmark for the shipped checkpoints.
+
+Run from the project root:
+
+    python scripts/benchmark-inference.py --encoder-dir encoders/ --output bench.json
+    python scripts/benchmark-inference.py --compare bench_old.json --output bench.json
+
+Every checkpoint runs in a fresh process so peak RSS is measured per
+checkpoint. Three sweeps are run per checkpoint:
+  - length:  lyric length (chars) at batch size 1, all threads
+  - batch:   batch size at LENGTH_FOR_SWEEPS chars, all threads
+  - threads: torch thread count at LENGTH_FOR_SWEEPS chars, batch size 8
+
+Results are written as JSON (one row per configuration) so two runs can
+be diffed with --compare. The file is rewritten after every checkpoint;
+a checkpoint that fails to load or run (e.g. a legacy .pt whose shared
+scaler does not match its embedding size) is listed under "skipped" with
+the reason, and the other checkpoints are still benchmarked.
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+# Configuration
+MODELS_DIR = ROOT_DIR / "training/models"
+DATA_FILE = ROOT_DIR / "data/spotify_emotion_clean.csv"
+TEXT_COL = "lyrics"
+
+LENGTHS = [100, 500, 2000, 8000]  # characters
+BATCH_SIZES = [1, 8, 32, 64]
+LENGTH_FOR_SWEEPS = 500
+THREADS_SWEEP_BATCH = 8
+REPEATS = 20
+WARMUP_CALLS = 2
+RANDOM_SEED = 41
+
+# Small vocabulary for synthetic lyrics
+VOCAB = (
+    "love heart night baby cry fire rain dance fear alone tonight dream "
+    "money street gun broken tears smile sun burn run hold kiss lie "
+    "forever never home road cold lights sky wild free pain blood"
+).split()
+
+
+def synthetic_lyrics(n_chars: int, rng: random.Random) -> str:
+    """Random words from VOCAB, broken into lines, about n_chars long."""
+    words, size = [], 0
+    while size < n_chars:
+        word = rng.choice(VOCAB)
+        words.append(word)
+        size += len(word) + 1
+    lines = [" ".join(words[i:i + 8]) for i in range(0, len(words), 8)]
+    return "\n".join(lines)[:n_chars]
+
+
+def dataset_lyrics(path: Path, lengths, per_length: int, rng: random.Random) -> dict:
+    """Pick real lyrics whose length is closest to each target length."""
+    import pandas as pd
+
+    texts = pd.read_csv(path, usecols=[TEXT_COL])[TEXT_COL].dropna().astype(str)
+    text_lengths = texts.str.len()
+    picked = {}
+    for n_chars in lengths:
+        closest = (text_lengths - n_chars).abs().nsmallest(per_length * 5).index
+        idx = rng.sample(list(closest), min(per_length, len(closest)))
+        picked[n_chars] = texts.loc[idx].tolist()
+    return picked
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process (MB)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return peak / 1024 if sys.platform != "darwin" else peak / (1024 * 1024)
+
+
+def time_calls(fn, repeats: int, warmup: int) -> list:
+    """Call fn warmup + repeats times; return latencies (seconds)."""
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def summarize(latencies: list, batch_size: int) -> dict:
+    import numpy as np
+
+    lat = np.asarray(latencies) * 1000.0
+    return {
+        "p50_ms": round(float(np.percentile(lat, 50)), 3),
+        "p95_ms": round(float(np.percentile(lat, 95)), 3),
+        "p99_ms": round(float(np.percentile(lat, 99)), 3),
+        "mean_ms": round(float(lat.mean()), 3),
+        "texts_per_sec": round(batch_size * 1000.0 / float(lat.mean()), 2),
+    }
+
+
+def bench_checkpoint(job: dict) -> list:
+    """Benchmark one checkpoint (runs in its own process)."""
+    import torch
+
+    from emo_inference import load_model, predict_batch
+
+    rng = random.Random(RANDOM_SEED)
+    start = time.perf_counter()
+    model, _, encoder, scaler = load_model(job["checkpoint"], device=job["device"])
+    load_seconds = time.perf_counter() - start
+
+    base = {
+        "checkpoint": Path(job["checkpoint"]).name,
+        "encoder": Path(encoder.tokenizer.name_or_path).name,
+        "backend": f"torch-{job['device']}",
+        "load_seconds": round(load_seconds, 3),
+    }
+    max_threads = torch.get_num_threads()
+    rows = []
+
+    def run(sweep, source, texts, n_chars, batch_size, threads):
+        torch.set_num_threads(threads)
+        batch = (texts * batch_size)[:batch_size]
+        latencies = time_calls(
+            lambda: predict_batch(model, encoder, batch, scaler, batch_size=batch_size),
+            job["repeats"],
+            WARMUP_CALLS,
+        )
+        row = dict(base)
+        row.update({
+            "sweep": sweep,
+            "source": source,
+            "length_chars": n_chars,
+            "batch_size": batch_size,
+            "threads": threads,
+        })
+        row.update(summarize(latencies, batch_size))
+        row["peak_rss_mb"] = round(peak_rss_mb(), 1)
+        rows.append(row)
+        print(
+            f"  {base['checkpoint']:<45} {sweep:<8} {source:<9} "
+            f"len={n_chars:<5} bs={batch_size:<3} th={threads:<3} "
+            f"p50={row['p50_ms']:.1f}ms {row['texts_per_sec']:.1f} texts/s",
+            flush=True,
+        )
+
+    sources = {"synthetic": {n: [synthetic_lyrics(n, rng)] for n in job["lengths"]}}
+    if job.get("dataset_texts"):
+        sources["dataset"] = {int(k): v for k, v in job["dataset_texts"].items()}
+
+    for source, by_length in sources.items():
+        for n_chars, texts in by_length.items():
+            run("length", source, texts, n_chars, 1, max_threads)
+
+    sweep_text = [synthetic_lyrics(LENGTH_FOR_SWEEPS, rng)]
+    for batch_size in job["batch_sizes"]:
+        run("batch", "synthetic", sweep_text, LENGTH_FOR_SWEEPS, batch_size, max_threads)
+
+    thread_counts = sorted({t for t in (1, 2, 4, max_threads) if t <= max_threads})
+    for threads in thread_counts:
+        run("threads", "synthetic", sweep_text, LENGTH_FOR_SWEEPS, THREADS_SWEEP_BATCH, threads)
+
+    return rows
+
+
+def environment_info() -> dict:
+    import torch
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = ""
+    return {
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def row_key(row: dict) -> tuple:
+    return (
+        row["checkpoint"], row["backend"], row["sweep"], row["source"],
+        row["length_chars"], row["batch_size"], row["threads"],
+    )
+
+
+def compare(baseline_path: Path, rows: list) -> None:
+    """Print p50 / throughput ratios against a previous results file."""
+    baseline = {row_key(r): r for r in json.loads(baseline_path.read_text())["results"]}
+    print(f"\nComparison against {baseline_path} (new / old):")
+    for row in rows:
+        old = baseline.get(row_key(row))
+        if old is None:
+            continue
+        print(
+            f"  {row['checkpoint']:<45} {row['sweep']:<8} "
+            f"len={row['length_chars']:<5} bs={row['batch_size']:<3} th={row['threads']:<3} "
+            f"p50 x{row['p50_ms'] / old['p50_ms']:.2f}  "
+            f"texts/s x{row['texts_per_sec'] / old['texts_per_sec']:.2f}  "
+            f"rss x{row['peak_rss_mb'] / old['peak_rss_mb']:.2f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the emotion inference path")
+    parser.add_argument("--checkpoints", nargs="*", default=None,
+                        help="Checkpoint files (default: every checkpoint in training/models, "
+                             ".safetensors preferred over .pt)")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--lengths", type=int, nargs="*", default=LENGTHS)
+    parser.add_argument("--batch-sizes", type=int, nargs="*", default=BATCH_SIZES)
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    parser.add_argument("--dataset", type=Path, default=None,
+                        help=f"Cleaned CSV to draw real lyrics from (e.g. {DATA_FILE.relative_to(ROOT_DIR)})")
+    parser.add_argument("--encoder-dir", default=None,
+                        help="Directory with local copies of the encoders (offline runs)")
+    parser.add_argument("--output", type=Path, default=Path("bench_results.json"))
+    parser.add_argument("--compare", type=Path, default=None,
+                        help="Previous results JSON to compare against")
+    args = parser.parse_args()
+
+    if args.encoder_dir:
+        os.environ["EMOLYRICS_ENCODER_DIR"] = str(Path(args.encoder_dir).resolve())
+        os.environ.setdefault("HF_HUB_OFFLINE", "1")
+
+    checkpoints = args.checkpoints or sorted(
+        str(p)
+        for p in [*MODELS_DIR.glob("*.safetensors"), *MODELS_DIR.glob("*.pt")]
+        if p.suffix == ".safetensors" or not p.with_suffix(".safetensors").exists()
+    )
+
+    dataset_texts = None
+    if args.dataset is not None:
+        dataset_texts = dataset_lyrics(args.dataset, args.lengths, 4, random.Random(RANDOM_SEED))
+
+    rows, skipped = [], []
+    environment = environment_info()
+    ctx = mp.get_context("spawn")
+    for checkpoint in checkpoints:
+        print(f"Benchmarking {checkpoint}", flush=True)
+        job = {
+            "checkpoint": checkpoint,
+            "device": args.device,
+            "lengths": args.lengths,
+            "batch_sizes": args.batch_sizes,
+            "repeats": args.repeats,
+            "dataset_texts": dataset_texts,
+        }
+        # Fresh process per checkpoint: clean peak RSS, no shared caches
+        try:
+            with ctx.Pool(1) as pool:
+                rows.extend(pool.apply(bench_checkpoint, (job,)))
+        except Exception as exc:
+            reason = f"{type(exc).__name__}: {exc}"
+            print(f"  Skipped {checkpoint}: {reason}", flush=True)
+            skipped.append({"checkpoint": Path(checkpoint).name, "reason": reason})
+        # Rewritten after each checkpoint so an interrupted run keeps its results
+        results = {"environment": environment, "results": rows, "skipped": skipped}
+        args.output.write_text(json.dumps(results, indent=2))
+
+    print(f"\nSaved {len(rows)} results to {args.output} ({len(skipped)} checkpoints skipped)")
+
+    if args.compare is not None:
+        compare(args.compare, rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Convert the notebook's .pt checkpoints to .safetensors.
+
+Run from the project root:
+
+    python scripts/convert-checkpoints.py
+    python scripts/convert-checkpoints.py training/models/emotion_classifier_v2.pt
+
+For every checkpoint, the head weights and the scaler's mean/scale are
+written to <stem>.safetensors next to it, with the remaining metadata
+(input_dim, label_classes, encoder name, ...) in the file header. The
+converted head is reloaded through emo_inference.load_head and its
+predictions on random inputs are compared with the original before the
+next file; calibration / cascade JSON files are keyed on the stem and
+keep working unchanged. The .pt files are left in place.
+
+Legacy heads that cannot be loaded as they are (the notebook's mpnet and
+distilroberta heads share the 384-d MiniLM scaler) are skipped with a
+warning. The exit status is 1 only if a conversion or its prediction
+check fails.
+"""
+import argparse
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+import numpy as np
+
+from emo_inference import (
+    CHECKPOINT_SUFFIX,
+    MODELS_DIR,
+    ScalerMismatchError,
+    load_head,
+    predict_embeddings,
+    save_checkpoint,
+)
+
+# Keys of the .pt dict that are not metadata
+SKIPPED_KEYS = {"model_state_dict", "scaler_path", "scale_embeddings"}
+
+N_CHECK_ROWS = 64
+ATOL = 1e-6
+
+
+def jsonable(value):
+    """numpy / torch values (and dicts of them) -> plain JSON types."""
+    if isinstance(value, dict):
+        return {str(k): jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [jsonable(v) for v in value]
+    if hasattr(value, "tolist"):  # np.ndarray, np.generic, torch.Tensor
+        return value.tolist()
+    return value
+
+
+def convert(checkpoint: Path) -> Path:
+    # load_head rejects a scaler that does not match the head's input_dim
+    model, label_classes, scaler, ckpt = load_head(checkpoint, device="cpu")
+
+    metadata = {k: jsonable(v) for k, v in ckpt.items() if k not in SKIPPED_KEYS}
+    metadata["label_classes"] = label_classes
+    out_path = checkpoint.with_suffix(CHECKPOINT_SUFFIX)
+    save_checkpoint(out_path, model, metadata, scaler)
+
+    # Same predictions from both files
+    converted, converted_labels, converted_scaler, _ = load_head(out_path, device="cpu")
+    X = np.random.default_rng(0).normal(size=(N_CHECK_ROWS, ckpt["input_dim"])).astype(np.float32)
+    diff = np.abs(
+        predict_embeddings(model, X, scaler) - predict_embeddings(converted, X, converted_scaler)
+    ).max()
+    if converted_labels != label_classes or diff > ATOL:
+        out_path.unlink()
+        raise ValueError(f"{checkpoint.name}: converted checkpoint differs (max |dp| = {diff:.2e})")
+    return out_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert .pt checkpoints to .safetensors")
+    parser.add_argument("checkpoints", nargs="*", type=Path,
+                        help="Checkpoint files (default: every .pt in training/models)")
+    args = parser.parse_args()
+
+    checkpoints = args.checkpoints or sorted(MODELS_DIR.glob("*.pt"))
+    failed = []
+    for checkpoint in checkpoints:
+        try:
+            out_path = convert(checkpoint)
+        except ScalerMismatchError as e:
+            print(f"Warning: skipped {checkpoint.name} (incompatible legacy head): {e}")
+            continue
+        except (KeyError, ValueError) as e:
+            print(f"Failed {checkpoint.name}: {e}")
+            failed.append(checkpoint)
+            continue
+        print(f"Converted {checkpoint.name} -> {out_path.name} "
+              f"({out_path.stat().st_size / 1e6:.1f} MB, was {checkpoint.stat().st_size / 1e6:.1f} MB)")
+
+    if failed:
+        print(f"{len(failed)} checkpoint(s) failed to convert: {', '.join(c.name for c in failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+Load test: many simulated Streamlit sessions driving app.py headlessly.
+
+Run from the project root:
+
+    python scripts/loadtest-app.py --concurrency 1 4 16 32 --duration 30
+
+Each simulated user is a streamlit.testing AppTest session (own session
+state, same process) running a random mix of actions: analyze lyrics,
+save the current analysis as a version, and compare saved versions.
+Sessions run in threads of this single process, so the results show how
+far one app process scales.
+
+Scoring uses the "stub" backend of emo_core (random scores after a
+simulated model latency) unless --backend is given, so the test runs on
+any Linux box without the model.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+# Configuration
+APP_FILE = ROOT_DIR / "app.py"
+TEXT_COL = "lyrics"
+
+CONCURRENCY_LEVELS = [1, 2, 4, 8, 16]
+DURATION_SECONDS = 20
+RUN_TIMEOUT_SECONDS = 60
+RANDOM_SEED = 41
+
+# Action mix (weights)
+ACTION_WEIGHTS = {"analyze": 0.6, "save_version": 0.25, "compare": 0.15}
+
+# Lyric length distribution (chars): log-normal around ~1500, clipped like
+# clean-emotion.py
+LENGTH_MU = 7.3
+LENGTH_SIGMA = 0.6
+MIN_TEXT_LEN = 30
+MAX_TEXT_LEN = 10_000
+
+VOCAB = (
+    "love heart night baby cry fire rain dance fear alone tonight dream "
+    "money street gun broken tears smile sun burn run hold kiss lie "
+    "forever never home road cold lights sky wild free pain blood"
+).split()
+
+
+class LyricsSource:
+    """Realistic-length lyrics: real ones from a CSV, or synthetic."""
+
+    def __init__(self, dataset: Path | None, rng: random.Random) -> None:
+        self.rng = rng
+        self.texts = None
+        if dataset is not None:
+            import pandas as pd
+
+            texts = pd.read_csv(dataset, usecols=[TEXT_COL])[TEXT_COL].dropna()
+            self.texts = texts.astype(str).sample(
+                n=min(len(texts), 2000), random_state=RANDOM_SEED
+            ).tolist()
+
+    def sample(self) -> str:
+        if self.texts:
+            return self.rng.choice(self.texts)
+        n_chars = int(self.rng.lognormvariate(LENGTH_MU, LENGTH_SIGMA))
+        n_chars = max(MIN_TEXT_LEN, min(MAX_TEXT_LEN, n_chars))
+        words, size = [], 0
+        while size < n_chars:
+            word = self.rng.choice(VOCAB)
+            words.append(word)
+            size += len(word) + 1
+        return "\n".join(" ".join(words[i:i + 8]) for i in range(0, len(words), 8))
+
+
+class SimulatedSession:
+    """One user: an AppTest instance plus the actions it can perform."""
+
+    def __init__(self, lyrics: LyricsSource, rng: random.Random) -> None:
+        from streamlit.testing.v1 import AppTest
+
+        self.lyrics = lyrics
+        self.rng = rng
+        self.app = AppTest.from_file(str(APP_FILE), default_timeout=RUN_TIMEOUT_SECONDS)
+        self.app.run()
+        self.analyzed = False
+        self.saved = 0
+
+    def _button(self, prefix: str):
+        for button in self.app.button:
+            if button.label.startswith(prefix):
+                return button
+        raise LookupError(f"Button not found: {prefix}")
+
+    def analyze(self) -> None:
+        self.app.text_area(key="lyrics_manual").input(self.lyrics.sample())
+        self._button("✨ Analyze").click().run()
+        self.analyzed = True
+
+    def save_version(self) -> None:
+        if not self.analyzed:
+            self.analyze()
+        self._button("Save current analysis").click().run()
+        self.saved += 1
+
+    def compare(self) -> None:
+        while self.saved < 2:
+            self.save_version()
+        options = self.app.multiselect[0].options
+        picks = self.rng.sample(list(options), min(len(options), 3))
+        self.app.multiselect[0].set_value(picks).run()
+
+    def check(self) -> None:
+        if len(self.app.exception):
+            raise RuntimeError(self.app.exception[0].message)
+
+
+def percentile(values: list, q: float) -> float:
+    """Nearest-rank percentile of a list (q in [0, 100])."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def run_level(concurrency: int, duration: float, lyrics: LyricsSource) -> dict:
+    """Run `concurrency` sessions for `duration` seconds; return stats."""
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+    actions = list(ACTION_WEIGHTS)
+    weights = list(ACTION_WEIGHTS.values())
+
+    def user(seed: int) -> None:
+        rng = random.Random(seed)
+        try:
+            session = SimulatedSession(lyrics, rng)
+        except Exception:
+            with lock:
+                errors["session_start"] += 1
+            return
+        while time.monotonic() < deadline:
+            action = rng.choices(actions, weights)[0]
+            start = time.perf_counter()
+            try:
+                getattr(session, action)()
+                session.check()
+                ok = True
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies[action].append(elapsed)
+                if not ok:
+                    errors[action] += 1
+
+    threads = [
+        threading.Thread(target=user, args=(RANDOM_SEED + i,), daemon=True)
+        for i in range(concurrency)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    total_actions = sum(len(v) for v in latencies.values())
+    total_errors = sum(errors.values())
+    per_action = {
+        action: {
+            "count": len(values),
+            "errors": errors.get(action, 0),
+            "p50_ms": round(percentile(values, 50) * 1000, 1),
+            "p95_ms": round(percentile(values, 95) * 1000, 1),
+            "p99_ms": round(percentile(values, 99) * 1000, 1),
+        }
+        for action, values in sorted(latencies.items())
+    }
+    return {
+        "concurrency": concurrency,
+        "wall_seconds": round(wall, 2),
+        "actions": total_actions,
+        "actions_per_sec": round(total_actions / wall, 2) if wall else 0.0,
+        "error_rate": round(total_errors / max(total_actions, 1), 4),
+        "session_start_errors": errors.get("session_start", 0),
+        "per_action": per_action,
+    }
+
+
+def print_level(stats: dict) -> None:
+    print(
+        f"\nconcurrency={stats['concurrency']:<4} actions={stats['actions']:<6} "
+        f"{stats['actions_per_sec']:.2f} actions/s  error rate={stats['error_rate']:.2%}"
+    )
+    for action, row in stats["per_action"].items():
+        print(
+            f"  {action:<13} n={row['count']:<5} errors={row['errors']:<4} "
+            f"p50={row['p50_ms']:>8.1f}ms p95={row['p95_ms']:>8.1f}ms "
+            f"p99={row['p99_ms']:>8.1f}ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent session load test for app.py")
+    parser.add_argument("--concurrency", type=int, nargs="*", default=CONCURRENCY_LEVELS)
+    parser.add_argument("--duration", type=float, default=DURATION_SECONDS,
+                        help="Seconds per concurrency level")
+    parser.add_argument("--backend", default="stub",
+                        help="EMOLYRICS_BACKEND for the app (stub, random, local, remote)")
+    parser.add_argument("--stub-base-ms", type=float, default=None)
+    parser.add_argument("--stub-ms-per-kchar", type=float, default=None)
+    parser.add_argument("--dataset", type=Path, default=None,
+                        help="Cleaned CSV to draw real lyrics from")
+    parser.add_argument("--output", type=Path, default=None, help="Write results as JSON")
+    args = parser.parse_args()
+
+    # Must be set before app.py (and emo_core) is first imported
+    os.environ["EMOLYRICS_BACKEND"] = args.backend
+    if args.stub_base_ms is not None:
+        os.environ["EMOLYRICS_STUB_BASE_MS"] = str(args.stub_base_ms)
+    if args.stub_ms_per_kchar is not None:
+        os.environ["EMOLYRICS_STUB_MS_PER_KCHAR"] = str(args.stub_ms_per_kchar)
+
+    lyrics = LyricsSource(args.dataset, random.Random(RANDOM_SEED))
+
+    results = []
+    for concurrency in args.concurrency:
+        print(f"Running {concurrency} sessions for {args.duration:.0f}s...", flush=True)
+        stats = run_level(concurrency, args.duration, lyrics)
+        print_level(stats)
+        results.append(stats)
+
+    if args.output is not None:
+        args.output.write_text(json.dumps({"backend": args.backend, "levels": results}, indent=2))
+        print(f"\nSaved results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
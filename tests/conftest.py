@@ -0,0 +1,7 @@
+"""Make the root modules (emo_*.py) importable when pytest runs from anywhere."""
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
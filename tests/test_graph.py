@@ -0,0 +1,108 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from emo_graph import SimilarityGraph, build_search_index
+
+EMOTIONS = ["Joy", "Sadness"]
+
+# 0 - 1 - 2 - 3 path, plus 0 - 4; node 5 isolated
+EDGES = [(0, 1, 0.9), (1, 2, 0.8), (2, 3, 0.7), (0, 4, 0.5)]
+SCORES = [[0.5, 0.5], [0.9, 0.1], [0.1, 0.9], [0.2, 0.8], [1.0, 0.0], [0.5, 0.5]]
+LABELS = [
+    ("The Beatles", "Hey Jude"),
+    ("The Beatles", "Let It Be"),
+    ("Adele", "Someone Like You"),
+    ("Adele", "Hello"),
+    ("Pharrell Williams", "Happy"),
+    ("Nobody", "Alone"),
+]
+
+
+@pytest.fixture
+def graph(tmp_path):
+    n = len(SCORES)
+    src = np.array([e[0] for e in EDGES] + [e[1] for e in EDGES])
+    dst = np.array([e[1] for e in EDGES] + [e[0] for e in EDGES])
+    weight = np.array([e[2] for e in EDGES] * 2, dtype=np.float32)
+    order = np.lexsort((dst, src))
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+    np.save(tmp_path / "indptr.npy", indptr)
+    np.save(tmp_path / "indices.npy", dst[order].astype(np.int32))
+    np.save(tmp_path / "weights.npy", weight[order])
+    np.save(tmp_path / "scores.npy", np.array(SCORES, dtype=np.float16))
+    pd.DataFrame(LABELS, columns=["artist", "song_title"]).to_parquet(tmp_path / "nodes.parquet", index=False)
+    (tmp_path / "meta.json").write_text(json.dumps({"emotions": EMOTIONS, "n_nodes": n}))
+    return SimilarityGraph(tmp_path)
+
+
+def test_bfs_relevance_is_edge_weight_over_depth(graph):
+    assert graph.bfs(0, max_depth=1) == pytest.approx({1: 0.9, 4: 0.5})
+    assert graph.bfs(0, max_depth=2) == pytest.approx({1: 0.9, 4: 0.5, 2: 0.4})
+    assert graph.bfs(5) == {}
+    assert len(graph.bfs(0, max_nodes=1)) == 1
+
+
+def test_personalized_pagerank_concentrates_near_the_seed(graph):
+    rank = graph.personalized_pagerank([0], epsilon=1e-6)
+    assert sum(rank.values()) <= 1.0 + 1e-9
+    assert max(rank, key=rank.get) == 0
+    assert rank[1] > rank[2] > rank.get(3, 0.0)
+    assert 5 not in rank
+    assert graph.personalized_pagerank([5]) == pytest.approx({5: 1.0})
+
+
+@pytest.mark.parametrize("method", ["bfs", "ppr"])
+def test_recommend_ranks_by_mood_match(graph, method):
+    results = graph.recommend(0, {"Joy": 1.0, "Sadness": 0.0}, method=method)
+    nodes = [row["node"] for row in results]
+    assert 0 not in nodes
+    assert nodes[0] in (1, 4)
+    assert [row["score"] for row in results] == sorted((row["score"] for row in results), reverse=True)
+
+    sad = graph.recommend(0, {"Joy": 0.0, "Sadness": 1.0}, method=method, min_match=0.9)
+    assert all(row["match"] >= 0.9 for row in sad)
+    assert 4 not in [row["node"] for row in sad]
+
+
+def test_recommend_rejects_unknown_method(graph):
+    with pytest.raises(ValueError):
+        graph.recommend(0, {"Joy": 1.0}, method="dfs")
+
+
+def brute_force_find(labels, query):
+    query = " ".join(query.lower().split())
+    return {
+        node for node, label in enumerate(labels)
+        if (" " + " ".join(label.lower().split())).find(" " + query) >= 0
+    }
+
+
+@pytest.mark.parametrize("query", ["beatles", "The b", "  HEY   jude", "hello", "someone like", "x"])
+def test_find_nodes_matches_word_prefixes(graph, query):
+    labels = [f"{artist} – {title}" for artist, title in LABELS]
+    assert set(graph.find_nodes(query, limit=100)) == brute_force_find(labels, query)
+
+
+def test_find_nodes_prefers_connected_songs(graph):
+    assert graph.find_nodes("a") == [2, 3, 5]  # Adele (degrees 2, 1), then Alone (0)
+    assert graph.find_nodes("l") == [1, 2]  # Let It Be, Like You; before isolated "Nobody" / "Alone"
+    assert graph.find_nodes("   ") == []
+
+
+def test_find_nodes_uses_the_saved_index_and_long_queries(graph, tmp_path):
+    labels = [f"{artist} – {title}" for artist, title in LABELS]
+    labels[2] = "Adele – " + "a very long title " * 4
+    keys, nodes = build_search_index(labels)
+    np.save(tmp_path / "search_keys.npy", keys)
+    np.save(tmp_path / "search_nodes.npy", nodes)
+    reloaded = SimilarityGraph(tmp_path)
+    assert isinstance(reloaded.search_index[0], np.memmap)
+    assert reloaded.find_nodes("hello") == [3]
+    # Longer than a key: matched on the truncated key, then checked on the label
+    long_query = "a very long title a very long title a very"
+    assert len(long_query.encode()) > keys.dtype.itemsize
+    assert reloaded.find_nodes(long_query) == []  # nodes.parquet still has the old title
@@ -0,0 +1,46 @@
+import pytest
+
+from emo_metrics import Counter, Gauge, Histogram
+
+
+def parse(lines):
+    return dict(line.rsplit(" ", 1) for line in lines)
+
+
+def test_histogram_buckets_are_cumulative_and_inclusive():
+    hist = Histogram("test_seconds", "help", (0.1, 1.0, 10.0))
+    for value in (0.05, 0.1, 0.5, 1.0, 5.0, 50.0):
+        hist.observe(value, stage="encode")
+    rendered = parse(hist.render())
+    assert rendered['test_seconds_bucket{stage="encode",le="0.1"}'] == "2"
+    assert rendered['test_seconds_bucket{stage="encode",le="1"}'] == "4"
+    assert rendered['test_seconds_bucket{stage="encode",le="10"}'] == "5"
+    assert rendered['test_seconds_bucket{stage="encode",le="+Inf"}'] == "6"
+    assert rendered['test_seconds_count{stage="encode"}'] == "6"
+    assert float(rendered['test_seconds_sum{stage="encode"}']) == pytest.approx(56.65)
+
+
+def test_histogram_stats_per_series():
+    hist = Histogram("test_seconds", "help", (1.0, 2.0, 4.0))
+    for _ in range(10):
+        hist.observe(1.5, stage="head")
+    hist.observe(0.5, stage="tokenize")
+    rows = {row["stage"]: row for row in hist.stats()}
+    assert rows["head"]["count"] == 10
+    assert rows["head"]["mean"] == pytest.approx(1.5)
+    assert 1.0 <= rows["head"]["p50"] <= 2.0
+    assert rows["head"]["p99"] <= 2.0
+    assert rows["tokenize"]["p50"] <= 1.0
+
+
+def test_counter_and_gauge():
+    counter = Counter("test_total", "help")
+    counter.inc(backend="local")
+    counter.inc(2, backend="local")
+    assert counter.value(backend="local") == 3
+    assert counter.value(backend="remote") == 0
+
+    gauge = Gauge("test_bytes", "help")
+    gauge.set(10, tier="memory")
+    gauge.set(4, tier="memory")
+    assert gauge.render() == ['test_bytes{tier="memory"} 4']
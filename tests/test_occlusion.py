@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from emo_inference import leave_one_out_embeddings, pool_embeddings
+
+
+def linear_softmax_head(embeddings, weights):
+    logits = embeddings.astype(np.float64) @ weights
+    exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def unit_embeddings(seed, n_units=5, dim=16, normalized=True):
+    rng = np.random.default_rng(seed)
+    embeddings = rng.normal(size=(n_units, dim)).astype(np.float32)
+    if normalized:
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    counts = rng.integers(1, 40, size=n_units).astype(np.float64)
+    return embeddings, counts
+
+
+@pytest.mark.parametrize("normalized", [True, False])
+def test_leave_one_out_rows_match_pooling_each_variant(normalized):
+    embeddings, counts = unit_embeddings(0, normalized=normalized)
+    pooled = leave_one_out_embeddings(embeddings, counts)
+    n = len(embeddings)
+    assert pooled.shape == (n + 1, embeddings.shape[1])
+    np.testing.assert_allclose(pooled[0], pool_embeddings(embeddings, counts, [(0, n)])[0], atol=1e-6)
+    for i in range(n):
+        rest = np.delete(np.arange(n), i)
+        direct = pool_embeddings(embeddings[rest], counts[rest], [(0, n - 1)])[0]
+        np.testing.assert_allclose(pooled[i + 1], direct, atol=1e-6)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_contributions_match_a_direct_rescore(seed):
+    """Baseline minus variant, as explain mode computes it, equals re-scoring each variant."""
+    embeddings, counts = unit_embeddings(seed)
+    weights = np.random.default_rng(100 + seed).normal(size=(embeddings.shape[1], 6))
+    matrix = linear_softmax_head(leave_one_out_embeddings(embeddings, counts), weights)
+    contributions = matrix[0][None, :] - matrix[1:]
+
+    n = len(embeddings)
+    baseline = linear_softmax_head(pool_embeddings(embeddings, counts, [(0, n)]), weights)[0]
+    for i in range(n):
+        rest = np.delete(np.arange(n), i)
+        variant = linear_softmax_head(pool_embeddings(embeddings[rest], counts[rest], [(0, n - 1)]), weights)[0]
+        np.testing.assert_allclose(contributions[i], baseline - variant, atol=1e-5)
+    np.testing.assert_allclose(contributions.sum(axis=1), 0.0, atol=1e-6)
+
+
+def test_single_unit_variant_is_empty():
+    embeddings, counts = unit_embeddings(0, n_units=1)
+    pooled = leave_one_out_embeddings(embeddings, counts)
+    np.testing.assert_allclose(pooled[1], 0.0)
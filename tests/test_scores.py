@@ -0,0 +1,118 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from emo_scores import (
+    apply_temperature,
+    arc_fit,
+    arc_target,
+    entropy_confidence,
+    expected_calibration_error,
+    fit_temperature,
+    reorder_to_arc,
+    summarize,
+    top_margin,
+    tune_cascade_threshold,
+)
+
+
+def brute_force_fit(matrix, target):
+    return max(arc_fit(matrix[list(p)], target) for p in itertools.permutations(range(len(matrix))))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_reorder_to_arc_is_optimal_for_two_waypoints(seed):
+    matrix = np.random.default_rng(seed).dirichlet(np.ones(6), size=6)
+    target = arc_target(["Joy", "Sadness"], len(matrix))
+    order = reorder_to_arc(matrix, target)
+    assert sorted(order.tolist()) == list(range(len(matrix)))
+    assert arc_fit(matrix[order], target) == pytest.approx(brute_force_fit(matrix, target))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_reorder_to_arc_has_no_improving_swap(seed):
+    matrix = np.random.default_rng(seed).dirichlet(np.ones(6), size=6)
+    target = arc_target(["Joy", "Fear", "Sadness"], len(matrix))
+    order = reorder_to_arc(matrix, target)
+    fit = arc_fit(matrix[order], target)
+    contrast = np.argsort((matrix @ target.T)[:, -1] - (matrix @ target.T)[:, 0], kind="stable")
+    assert fit >= arc_fit(matrix[contrast], target) - 1e-12
+    for i, j in itertools.combinations(range(len(order)), 2):
+        swapped = order.copy()
+        swapped[[i, j]] = swapped[[j, i]]
+        assert arc_fit(matrix[swapped], target) <= fit + 1e-9
+
+
+def test_reorder_to_arc_small_inputs():
+    target = arc_target(["Joy", "Sadness"], 1)
+    assert reorder_to_arc(np.ones((1, 6)), target).tolist() == [0]
+    assert reorder_to_arc(np.zeros((0, 6)), target[:0]).tolist() == []
+
+
+def test_arc_target_needs_two_waypoints():
+    with pytest.raises(ValueError):
+        arc_target(["Joy"], 4)
+
+
+def test_tune_cascade_threshold_escalates_least_confident_first():
+    confidence = np.array([0.1, 0.2, 0.3, 0.9])
+    small = np.array([False, False, True, True])
+    large = np.array([True, True, True, True])
+    result = tune_cascade_threshold(confidence, small, large, target_accuracy=1.0)
+    assert result["target_reached"]
+    assert result["escalation_rate"] == 0.5
+    assert result["accuracy"] == 1.0
+    assert 0.2 < result["threshold"] <= 0.3
+    assert ((confidence < result["threshold"]) == ~small).all()
+
+
+def test_tune_cascade_threshold_without_escalation_or_unreachable_target():
+    confidence = np.array([0.4, 0.8])
+    both = np.array([True, True])
+    kept = tune_cascade_threshold(confidence, both, both, target_accuracy=0.5)
+    assert kept["escalation_rate"] == 0.0
+    assert (confidence >= kept["threshold"]).all()
+
+    unreachable = tune_cascade_threshold(confidence, np.array([False, False]), np.array([True, False]), 1.0)
+    assert not unreachable["target_reached"]
+    assert unreachable["accuracy"] == 0.5
+    assert unreachable["escalation_rate"] == 0.5
+
+
+def test_apply_temperature_keeps_ranking_and_sharpens_or_flattens():
+    probs = np.array([[0.6, 0.3, 0.1], [0.2, 0.5, 0.3]])
+    assert apply_temperature(probs, 1.0) is probs
+    sharp, flat = apply_temperature(probs, 0.5), apply_temperature(probs, 2.0)
+    for scaled in (sharp, flat):
+        np.testing.assert_allclose(scaled.sum(axis=1), 1.0)
+        assert (scaled.argmax(axis=1) == probs.argmax(axis=1)).all()
+    assert (sharp.max(axis=1) > probs.max(axis=1)).all()
+    assert (flat.max(axis=1) < probs.max(axis=1)).all()
+
+
+def test_fit_temperature_recovers_overconfidence():
+    rng = np.random.default_rng(0)
+    labels = rng.integers(0, 4, size=2000)
+    logits = rng.normal(size=(2000, 4))
+    logits[np.arange(2000), labels] += 1.0
+    calibrated = np.exp(logits) / np.exp(logits).sum(axis=1, keepdims=True)
+    overconfident = apply_temperature(calibrated, 1 / 3)
+    temperature = fit_temperature(overconfident, labels)
+    assert temperature == pytest.approx(3.0, rel=0.15)
+    fixed = apply_temperature(overconfident, temperature)
+    assert expected_calibration_error(fixed, labels) < expected_calibration_error(overconfident, labels)
+
+
+def test_entropy_confidence_bounds():
+    np.testing.assert_allclose(entropy_confidence(np.eye(4)), 1.0)
+    np.testing.assert_allclose(entropy_confidence(np.full((2, 4), 0.25)), 0.0, atol=1e-12)
+
+
+def test_single_class_scores_are_confident():
+    matrix = np.array([[1.0], [0.4]])
+    np.testing.assert_array_equal(entropy_confidence(matrix), [1.0, 1.0])
+    np.testing.assert_array_equal(top_margin(matrix), [1.0, 0.4])
+    rows = summarize(matrix, ["Joy"])
+    assert [row["top"] for row in rows] == [[["Joy", 1.0]], [["Joy", 0.4]]]
+    assert all(np.isfinite(row["confidence"]) for row in rows)
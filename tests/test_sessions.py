@@ -0,0 +1,90 @@
+import os
+import stat
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from emo_sessions import SessionStore, private_directory, read_spill_file, write_spill_file
+
+
+def sample_values():
+    return {
+        "lyrics": "la la\nla",
+        "scores": {"Joy": 0.75, "Sadness": 0.25},
+        "matrix": np.arange(12, dtype=np.float32).reshape(3, 4),
+        "labels": np.array(["a", None], dtype=object),
+        "top": [("Joy", 0.75), ("Sadness", 0.25)],
+        "flags": (True, None, 3),
+        "versions": pd.DataFrame({"name": ["v1", "v2"], "Joy": [0.1, 0.9]}),
+    }
+
+
+def test_spill_file_round_trip(tmp_path):
+    path = tmp_path / "session.npz"
+    write_spill_file(path, sample_values())
+    values = read_spill_file(path)
+
+    assert values["lyrics"] == "la la\nla"
+    assert values["scores"] == {"Joy": 0.75, "Sadness": 0.25}
+    np.testing.assert_array_equal(values["matrix"], sample_values()["matrix"])
+    assert values["matrix"].dtype == np.float32
+    assert values["labels"].tolist() == ["a", None]
+    # Tuples come back as lists
+    assert values["top"] == [["Joy", 0.75], ["Sadness", 0.25]]
+    assert values["flags"] == [True, None, 3]
+    pd.testing.assert_frame_equal(values["versions"], sample_values()["versions"], check_dtype=False)
+
+
+def test_spill_file_never_needs_pickle(tmp_path):
+    path = tmp_path / "session.npz"
+    write_spill_file(path, sample_values())
+    with np.load(path, allow_pickle=False) as data:
+        assert all(data[name].dtype != object for name in data.files)
+
+
+def test_spill_file_rejects_unsupported_values(tmp_path):
+    with pytest.raises(TypeError):
+        write_spill_file(tmp_path / "a.npz", {"bad": object()})
+    with pytest.raises(TypeError):
+        write_spill_file(tmp_path / "b.npz", {"bad": {1: "int key"}})
+
+
+def test_user_dicts_do_not_collide_with_type_tags(tmp_path):
+    path = tmp_path / "session.npz"
+    tricky = {"ndarray": "a0", "dict": {"list": [1]}}
+    write_spill_file(path, {"value": tricky})
+    assert read_spill_file(path)["value"] == tricky
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="POSIX permissions")
+def test_private_directory_mode(tmp_path):
+    shared = tmp_path / "shared"
+    shared.mkdir(mode=0o755)
+    os.chmod(shared, 0o755)
+    assert private_directory(shared) == shared
+    assert stat.S_IMODE(shared.stat().st_mode) == 0o700
+    assert stat.S_IMODE(private_directory(tmp_path / "new" / "dir").stat().st_mode) == 0o700
+
+
+def test_store_spills_over_limit_and_reloads(tmp_path):
+    store = SessionStore(spill_dir=tmp_path / "spill", memory_limit_bytes=0)
+    store.set("a", "matrix", np.ones((4, 6)))
+    store.set("a", "top", ("Joy", 1.0))
+    store.set("b", "lyrics", "hello")
+
+    stats = store.stats()
+    assert (stats["sessions_memory"], stats["sessions_disk"]) == (1, 1)
+    assert (tmp_path / "spill" / "a.npz").exists()
+
+    np.testing.assert_array_equal(store.get("a", "matrix"), np.ones((4, 6)))
+    assert store.get("a", "top") == ["Joy", 1.0]
+    assert not (tmp_path / "spill" / "a.npz").exists()
+    assert store.get("b", "lyrics") == "hello"
+
+
+def test_store_drops_sessions_after_ttl(tmp_path):
+    store = SessionStore(spill_dir=tmp_path / "spill", ttl_seconds=0.0)
+    store.set("a", "lyrics", "hello")
+    store.touch("b")
+    assert not store.contains("a", "lyrics")
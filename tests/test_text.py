@@ -0,0 +1,44 @@
+import pytest
+
+from emo_text import group_units, parse_playlist, split_stanzas, window_blocks, window_starts, window_texts
+
+
+@pytest.mark.parametrize("n_lines, window, stride, expected", [
+    (5, 8, 2, [0]),
+    (8, 8, 2, [0]),
+    (9, 8, 2, [0, 2]),
+    (12, 8, 2, [0, 2, 4]),
+    (13, 8, 3, [0, 3, 6]),
+])
+def test_window_starts_cover_the_last_line(n_lines, window, stride, expected):
+    starts = window_starts(n_lines, window, stride)
+    assert starts == expected
+    assert starts[-1] + window >= n_lines
+
+
+@pytest.mark.parametrize("n_lines, window, stride", [(1, 8, 2), (9, 8, 2), (23, 8, 2), (23, 6, 4), (40, 9, 6)])
+def test_window_blocks_rebuild_every_window(n_lines, window, stride):
+    lines = [f"line {i}" for i in range(n_lines)]
+    block, spans, starts = window_blocks(n_lines, window, stride)
+    blocks = [lines[i:i + block] for i in range(0, n_lines, block)]
+    texts, text_starts = window_texts(lines, window, stride)
+    assert starts == text_starts
+    assert ["\n".join(sum(blocks[a:b], [])) for a, b in spans] == texts
+
+
+def test_group_units_merges_adjacent_units():
+    units = [[f"l{i}"] for i in range(10)]
+    assert group_units(units, 20) is units
+    grouped = group_units(units, 4)
+    assert len(grouped) <= 4
+    assert sum(grouped, []) == sum(units, [])
+    assert group_units([], 4) == []
+
+
+def test_split_stanzas():
+    assert split_stanzas("a\n b \n\n\nc\n") == [["a", "b"], ["c"]]
+
+
+def test_parse_playlist_titles_and_empty_tracks():
+    text = "# First\nla la\n---\nno title\n\n-----\n   \n---\n#Last\nend"
+    assert parse_playlist(text) == [("First", "la la"), ("Track 2", "no title"), ("Last", "end")]
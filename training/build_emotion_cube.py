@@ -0,0 +1,151 @@
+"""
+Build the catalogue emotion cube: aggregate emotion scores of every song
+by artist, genre, year, decade and genre x decade.
+
+Run from training/:
+
+    python build_emotion_cube.py --checkpoint models/emotion_classifier_v2.pt
+
+Every row of the cleaned dataset is scored once (from the notebook's
+embedding cache when present) and, for each group, the song count, mean
+and 10th / 50th / 90th percentile of each emotion are written to
+data/emotion_cube.parquet. Rows are sorted by (dimension, key) so the
+app can index them once and look groups up without touching the dataset
+(see emo_core.load_emotion_cube()).
+"""
+import argparse
+import re
+
+import numpy as np
+import pandas as pd
+
+from data_utils import MODELS_DIR, ROOT_DIR, load_clean_dataset, load_embeddings
+from emo_inference import load_head, predict_embeddings, probs_to_matrix
+from emo_scores import EmotionSchema, apply_temperature, load_temperature
+
+# Dataset columns (as kept by scripts/clean-emotion.py)
+ARTIST_COL = "artist"
+GENRE_COL = "Genre"
+RELEASE_DATE_COL = "Release Date"
+
+OUTPUT_FILE = ROOT_DIR / "data/emotion_cube.parquet"
+
+# Rows scored per head forward pass
+SCORE_CHUNK_ROWS = 8192
+
+# Groups with fewer songs are left out of the cube
+MIN_GROUP_SIZE = 3
+
+PERCENTILES = [0.1, 0.5, 0.9]
+
+# First four-digit year in a release date ("2013-04-29", "April 2013")
+YEAR_PATTERN = r"((?:19|20)\d{2})"
+
+
+def score_catalogue(df: pd.DataFrame, checkpoint: str):
+    """Calibrated (n_rows, n_emotions) scores in schema order, and the schema."""
+    model, label_classes, scaler, ckpt = load_head(checkpoint)
+    schema = EmotionSchema.from_label_classes(label_classes)
+    temperature = load_temperature(checkpoint)
+    # Checkpoints with a projection read the smaller float16 projected store
+    projection = getattr(scaler, "projection", None)
+
+    chunks = []
+    for start in range(0, len(df), SCORE_CHUNK_ROWS):
+        part = df.iloc[start:start + SCORE_CHUNK_ROWS]
+        embeddings = load_embeddings(part, ckpt["sentence_transformer_name"], projection)
+        probs = predict_embeddings(model, embeddings, scaler)
+        chunks.append(apply_temperature(probs_to_matrix(probs, label_classes, schema), temperature))
+        print(f"Scored {min(start + SCORE_CHUNK_ROWS, len(df))}/{len(df)} songs")
+    return np.concatenate(chunks).astype(np.float32), schema
+
+
+def normalize_genre(genre: str) -> str:
+    """'Hip-Hop ' -> 'hip hop'."""
+    return re.sub(r"\s+", " ", genre.replace("-", " ")).strip().lower()
+
+
+def group_keys(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    One (position, dimension, key) row per song and group it belongs to.
+
+    Songs with several genres ("Hip-Hop, Rap") count in each of them.
+    """
+    frames = []
+    positions = np.arange(len(df))
+
+    def add(dimension: str, keys: pd.Series) -> None:
+        keys = keys.dropna()
+        keys = keys[keys != ""]
+        frames.append(pd.DataFrame({"pos": keys.index, "dimension": dimension, "key": keys.values}))
+
+    if ARTIST_COL in df.columns:
+        add("artist", pd.Series(df[ARTIST_COL].astype(str).str.strip().values, index=positions))
+
+    decades = None
+    if RELEASE_DATE_COL in df.columns:
+        years = pd.Series(
+            df[RELEASE_DATE_COL].astype(str).str.extract(YEAR_PATTERN)[0].values, index=positions
+        )
+        add("year", years)
+        decades = years.dropna().astype(int).floordiv(10).mul(10).astype(str) + "s"
+        add("decade", decades)
+    else:
+        print(f"No '{RELEASE_DATE_COL}' column; skipping year and decade groups.")
+
+    if GENRE_COL in df.columns:
+        genres = (
+            pd.Series(df[GENRE_COL].values, index=positions)
+            .dropna()
+            .astype(str)
+            .str.split(",")
+            .explode()
+            .map(normalize_genre)
+        )
+        add("genre", genres)
+        if decades is not None:
+            joined = genres.to_frame("genre").join(decades.rename("decade"), how="inner")
+            add("genre_decade", joined["genre"] + " | " + joined["decade"])
+    else:
+        print(f"No '{GENRE_COL}' column; skipping genre groups.")
+
+    return pd.concat(frames, ignore_index=True).drop_duplicates()
+
+
+def build_cube(scores: np.ndarray, keys: pd.DataFrame, emotions) -> pd.DataFrame:
+    """Count, mean and PERCENTILES of every emotion per (dimension, key)."""
+    values = pd.DataFrame(scores[keys["pos"].to_numpy()], columns=list(emotions))
+    values["dimension"] = keys["dimension"].to_numpy()
+    values["key"] = keys["key"].to_numpy()
+
+    grouped = values.groupby(["dimension", "key"], sort=True)
+    cube = grouped.size().rename("count").to_frame()
+    cube = cube.join(grouped.mean().add_suffix("_mean"))
+    for q in PERCENTILES:
+        cube = cube.join(grouped.quantile(q).add_suffix(f"_p{int(q * 100)}"))
+
+    cube = cube[cube["count"] >= MIN_GROUP_SIZE].reset_index()
+    float_cols = cube.columns.difference(["dimension", "key", "count"])
+    cube[float_cols] = cube[float_cols].astype(np.float32)
+    cube["count"] = cube["count"].astype(np.int32)
+    cube["dimension"] = cube["dimension"].astype("category")
+    return cube
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the catalogue emotion cube")
+    parser.add_argument("--checkpoint", default=str(MODELS_DIR / "emotion_classifier_v2.pt"))
+    parser.add_argument("--output", default=str(OUTPUT_FILE))
+    args = parser.parse_args()
+
+    df = load_clean_dataset()
+    scores, schema = score_catalogue(df, args.checkpoint)
+    cube = build_cube(scores, group_keys(df), schema.emotions)
+
+    cube.to_parquet(args.output, index=False)
+    print(cube.groupby("dimension", observed=True).size().to_string())
+    print(f"Saved {len(cube)} groups to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
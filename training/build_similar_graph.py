@@ -0,0 +1,222 @@
+"""
+Build the similar-songs graph used by emo_graph.
+
+Run from training/:
+
+    python build_similar_graph.py --checkpoint models/emotion_classifier_v2.pt
+
+The raw dataset lists, per song, similar songs as (artist, song,
+similarity score) triples: either flat "Similar Artist N" / "Similar Song
+N" / "Similarity Score N" columns or one "Similar Songs" column holding a
+list of such records. clean-emotion.py keeps them in the cleaned CSV.
+Each triple is resolved to a row of the cleaned dataset by normalized
+artist + title (unresolved ones are counted and dropped), edges are made
+symmetric (keeping the highest score of duplicate pairs) and stored in
+CSR form. Every node also gets its calibrated emotion scores, computed
+from the embedding store like build_emotion_cube.py, and a sorted
+word-prefix index of its "artist – title" label for the app's song search. Output goes to
+data/similar_graph/ (see emo_graph.py); the previous graph is replaced
+only once the new one is complete. A short query benchmark is printed at
+the end.
+"""
+import argparse
+import ast
+import json
+import os
+import re
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from build_emotion_cube import ARTIST_COL, score_catalogue
+from data_utils import MODELS_DIR, RANDOM_SEED, load_clean_dataset
+from emo_graph import GRAPH_DIR, SimilarityGraph, build_search_index
+
+SONG_COL = "song_title"
+SIMILAR_COL = "Similar Songs"
+SIMILAR_FLAT_PATTERN = re.compile(r"^(Similar Artist|Similar Song|Similarity Score) (\d+)$")
+
+# Score of a similar song listed without one
+DEFAULT_SIMILARITY = 1.0
+
+BENCHMARK_QUERIES = 200
+
+
+def normalize_name(names: pd.Series) -> pd.Series:
+    """Lowercase, trim and collapse whitespace for artist / title matching."""
+    return names.astype(str).str.lower().str.replace(r"\s+", " ", regex=True).str.strip()
+
+
+def _parse_records(cell) -> list:
+    """A "Similar Songs" cell (JSON or Python literal list of dicts) -> list."""
+    if not isinstance(cell, str) or not cell.strip():
+        return []
+    try:
+        records = json.loads(cell)
+    except json.JSONDecodeError:
+        try:
+            records = ast.literal_eval(cell)
+        except (ValueError, SyntaxError):
+            return []
+    return records if isinstance(records, list) else []
+
+
+def similar_song_triples(df: pd.DataFrame) -> pd.DataFrame:
+    """(src position, artist, song, score) for every similar song listed in df."""
+    flat = {}
+    for col in df.columns:
+        match = SIMILAR_FLAT_PATTERN.match(col)
+        if match:
+            flat.setdefault(int(match.group(2)), {})[match.group(1)] = col
+
+    frames = []
+    if flat:
+        for cols in flat.values():
+            if "Similar Artist" not in cols or "Similar Song" not in cols:
+                continue
+            score = df[cols["Similarity Score"]] if "Similarity Score" in cols else DEFAULT_SIMILARITY
+            frames.append(pd.DataFrame({
+                "src": np.arange(len(df)),
+                "artist": df[cols["Similar Artist"]].to_numpy(),
+                "song": df[cols["Similar Song"]].to_numpy(),
+                "score": score if np.isscalar(score) else score.to_numpy(),
+            }))
+    elif SIMILAR_COL in df.columns:
+        rows = []
+        for src, cell in enumerate(df[SIMILAR_COL].to_numpy()):
+            for record in _parse_records(cell):
+                if not isinstance(record, dict):
+                    continue
+                fields = {
+                    prefix: value
+                    for key, value in record.items()
+                    for prefix in ("Similar Artist", "Similar Song", "Similarity Score")
+                    if str(key).startswith(prefix)
+                }
+                rows.append((
+                    src,
+                    fields.get("Similar Artist"),
+                    fields.get("Similar Song"),
+                    fields.get("Similarity Score", DEFAULT_SIMILARITY),
+                ))
+        frames.append(pd.DataFrame(rows, columns=["src", "artist", "song", "score"]))
+    else:
+        raise ValueError(
+            f"No '{SIMILAR_COL}' or 'Similar Artist N' columns in the cleaned dataset; "
+            "re-run scripts/clean-emotion.py on the raw spotify_dataset.csv"
+        )
+
+    triples = pd.concat(frames, ignore_index=True).dropna(subset=["artist", "song"])
+    triples["score"] = pd.to_numeric(triples["score"], errors="coerce").fillna(DEFAULT_SIMILARITY)
+    return triples
+
+
+def resolve_edges(df: pd.DataFrame, triples: pd.DataFrame) -> tuple:
+    """(src, dst, weight) arrays of the triples whose song is in df."""
+    keys = normalize_name(df[ARTIST_COL]) + "\0" + normalize_name(df[SONG_COL])
+    lookup = pd.Series(np.arange(len(df)), index=keys.to_numpy())
+    lookup = lookup[~lookup.index.duplicated()]
+
+    wanted = normalize_name(triples["artist"]) + "\0" + normalize_name(triples["song"])
+    dst = lookup.reindex(wanted.to_numpy()).to_numpy()
+    found = ~np.isnan(dst)
+    print(f"Resolved {found.sum()}/{len(triples)} similar songs to dataset rows")
+    return (
+        triples["src"].to_numpy()[found].astype(np.int64),
+        dst[found].astype(np.int64),
+        triples["score"].to_numpy()[found].astype(np.float32),
+    )
+
+
+def build_csr(n_nodes: int, src: np.ndarray, dst: np.ndarray, weight: np.ndarray) -> tuple:
+    """Symmetric CSR (indptr, indices, weights) without self loops or duplicate edges."""
+    keep = src != dst
+    src, dst, weight = src[keep], dst[keep], weight[keep]
+    src, dst = np.concatenate([src, dst]), np.concatenate([dst, src])
+    weight = np.concatenate([weight, weight])
+
+    # Sort by (src, dst, -weight) and keep the first (highest) of each pair
+    order = np.lexsort((-weight, dst, src))
+    src, dst, weight = src[order], dst[order], weight[order]
+    first = np.r_[True, (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])]
+    src, dst, weight = src[first], dst[first], weight[first]
+
+    indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n_nodes), out=indptr[1:])
+    return indptr, dst.astype(np.int32), weight.astype(np.float32)
+
+
+def benchmark(directory, n_queries: int = BENCHMARK_QUERIES) -> None:
+    """p50 / p95 latency of find_nodes() and of recommend() from random seeds with edges."""
+    graph = SimilarityGraph(directory)
+    with_edges = np.flatnonzero(np.diff(graph.indptr) > 0)
+    if len(with_edges) == 0:
+        print("Graph has no edges; skipping benchmark")
+        return
+    rng = np.random.default_rng(RANDOM_SEED)
+    target = dict(zip(graph.emotions, rng.dirichlet(np.ones(len(graph.emotions)))))
+    queries = [graph.node_label(int(n)).split(" – ")[-1][:4] for n in rng.choice(graph.n_nodes, 50)]
+    times = []
+    for query in queries:
+        t0 = time.perf_counter()
+        graph.find_nodes(query)
+        times.append((time.perf_counter() - t0) * 1000)
+    print(f"search: p50 {np.percentile(times, 50):.2f} ms, p95 {np.percentile(times, 95):.2f} ms")
+    for method in ("bfs", "ppr"):
+        times = []
+        for seed in rng.choice(with_edges, size=min(n_queries, len(with_edges)), replace=False):
+            t0 = time.perf_counter()
+            graph.recommend(int(seed), target, method=method)
+            times.append((time.perf_counter() - t0) * 1000)
+        print(f"{method}: p50 {np.percentile(times, 50):.2f} ms, p95 {np.percentile(times, 95):.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the similar-songs graph")
+    parser.add_argument("--checkpoint", default=str(MODELS_DIR / "emotion_classifier_v2.pt"))
+    parser.add_argument("--output", default=str(GRAPH_DIR))
+    args = parser.parse_args()
+
+    df = load_clean_dataset()
+    triples = similar_song_triples(df)
+    src, dst, weight = resolve_edges(df, triples)
+    indptr, indices, weights = build_csr(len(df), src, dst, weight)
+    scores, schema = score_catalogue(df, args.checkpoint)
+
+    output = os.path.abspath(args.output)
+    tmp_dir = output + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    np.save(os.path.join(tmp_dir, "indptr.npy"), indptr)
+    np.save(os.path.join(tmp_dir, "indices.npy"), indices)
+    np.save(os.path.join(tmp_dir, "weights.npy"), weights)
+    np.save(os.path.join(tmp_dir, "scores.npy"), scores.astype(np.float16))
+    nodes = df[[ARTIST_COL, SONG_COL]].astype(str).rename(columns={ARTIST_COL: "artist"})
+    nodes.to_parquet(os.path.join(tmp_dir, "nodes.parquet"), index=False)
+    search_keys, search_nodes = build_search_index((nodes["artist"] + " – " + nodes[SONG_COL]).tolist())
+    np.save(os.path.join(tmp_dir, "search_keys.npy"), search_keys)
+    np.save(os.path.join(tmp_dir, "search_nodes.npy"), search_nodes)
+    meta = {
+        "emotions": list(schema.emotions),
+        "n_nodes": int(len(df)),
+        "n_edges": int(len(indices)),
+        "checkpoint": os.path.basename(args.checkpoint),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+
+    shutil.rmtree(output, ignore_errors=True)
+    os.replace(tmp_dir, output)
+    degrees = np.diff(indptr)
+    print(
+        f"Saved graph to {output}: {meta['n_nodes']} songs, {meta['n_edges']} directed edges, "
+        f"{(degrees > 0).sum()} songs with neighbours (mean degree {degrees.mean():.2f})"
+    )
+    benchmark(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Dataset helpers shared by the training scripts.
+
+Reproduces the data preparation of emotion-classification-lyrics.ipynb
+(dropna, moderate downsampling, label encoding, stratified 80/20 split)
+so scripts can work on exactly the notebook's held-out test split.
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+TRAINING_DIR = Path(__file__).resolve().parent
+ROOT_DIR = TRAINING_DIR.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+# Same configuration as the notebook (Cell 2 / Cell 3)
+TEXT_COL = "lyrics"
+TARGET_COL = "emotion"
+DATA_PATH = ROOT_DIR / "data/spotify_emotion_clean.csv"
+MODELS_DIR = TRAINING_DIR / "models"
+
+RANDOM_SEED = 41
+DOWNSAMPLING_MAX_MULTIPLIER = 10.0
+TEST_SIZE = 0.2
+
+# Full-dataset embeddings per (encoder, projection key), opened once per process
+_EMBEDDINGS_CACHE = {}
+
+
+def embeddings_path(st_model_name: str) -> Path:
+    """Legacy embedding cache written by older notebook runs (see embedding_store)."""
+    return ROOT_DIR / f"data/spotify_lyrics_embeddings_{st_model_name.split('/')[-1]}.npy"
+
+
+def load_clean_dataset(path=DATA_PATH) -> pd.DataFrame:
+    """Read the cleaned CSV; row_idx aligns rows with the embedding cache."""
+    df = pd.read_csv(path)
+    df = df.dropna(subset=[TEXT_COL, TARGET_COL])
+    df[TEXT_COL] = df[TEXT_COL].astype(str)
+    df["row_idx"] = np.arange(len(df), dtype=np.int64)
+    return df
+
+
+def downsample(df: pd.DataFrame, max_multiplier: float = DOWNSAMPLING_MAX_MULTIPLIER) -> pd.DataFrame:
+    """Cap each class at max_multiplier * minority count."""
+    max_per_class = int(max_multiplier * df[TARGET_COL].value_counts().min())
+    return (
+        df.groupby(TARGET_COL, group_keys=False)
+          .apply(lambda g: g.sample(n=min(len(g), max_per_class), random_state=RANDOM_SEED))
+          .reset_index(drop=True)
+    )
+
+
+def encode_labels(labels, label_classes) -> np.ndarray:
+    """Map string labels to indices of label_classes (checkpoint order)."""
+    lookup = {label: i for i, label in enumerate(label_classes)}
+    return np.array([lookup[label] for label in labels], dtype=np.int64)
+
+
+def notebook_split(df: pd.DataFrame, y: np.ndarray):
+    """(train_idx, test_idx) positions of the notebook's train/test split."""
+    from sklearn.model_selection import train_test_split
+
+    return train_test_split(
+        np.arange(len(df)), test_size=TEST_SIZE, random_state=RANDOM_SEED, stratify=y
+    )
+
+
+def load_embeddings(df: pd.DataFrame, st_model_name: str, projection=None) -> np.ndarray:
+    """
+    Embeddings for the rows of df (via row_idx).
+
+    Read from the content-hashed embedding store (embedding_store.py),
+    which encodes the cleaned dataset once per encoder and dataset version.
+    With a projection (a checkpoint's EmbeddingProjection), rows come from
+    the smaller float16 projected store instead.
+    """
+    cache_key = (st_model_name, projection.key if projection is not None else None)
+    if cache_key not in _EMBEDDINGS_CACHE:
+        from embedding_store import load_or_build, load_or_build_projected
+
+        if projection is None:
+            _EMBEDDINGS_CACHE[cache_key] = load_or_build(load_clean_dataset(), st_model_name)
+        else:
+            _EMBEDDINGS_CACHE[cache_key] = load_or_build_projected(
+                load_clean_dataset(), st_model_name, projection
+            )
+    full = _EMBEDDINGS_CACHE[cache_key]
+    return np.asarray(full[df["row_idx"].to_numpy()], dtype=np.float32)
+
+
+def heldout_split(label_classes):
+    """
+    The notebook's held-out test rows: (test_df, y_test).
+
+    y_test is encoded in label_classes order.
+    """
+    df = downsample(load_clean_dataset())
+    y = encode_labels(df[TARGET_COL], label_classes)
+    _, test_idx = notebook_split(df, y)
+    return df.iloc[test_idx].reset_index(drop=True), y[test_idx]
@@ -0,0 +1,338 @@
+"""
+Distill the mpnet classifier into a compact student encoder + head.
+
+Run from training/ (CPU is fine):
+
+    python train_head.py --encoder sentence-transformers/all-mpnet-base-v2
+    python distill_student.py --student sentence-transformers/all-MiniLM-L6-v2 --layers 4
+
+The teacher checkpoint needs a scaler fitted on its own embeddings. The
+default is train_head.py's mpnet output. The notebook's legacy mpnet .pt
+shares the 384-d MiniLM scaler.joblib and is rejected at startup.
+
+1. Teacher outputs: the teacher head is run once over the stored teacher
+   embeddings of the whole cleaned dataset (embedding_store.py) and its
+   probabilities are cached under data/distill/. Later runs reuse them, so
+   the teacher encoder never runs during distillation.
+2. Student: a sentence-transformer (optionally cut to its first --layers
+   transformer layers) plus a fresh head, fine-tuned end to end on a
+   sample of the notebook's train split with
+   alpha * T^2 * KL(teacher_T || student_T) + (1 - alpha) * CE(labels).
+3. Export: the student encoder is saved in models/<name>/ (found by
+   emo_inference.resolve_encoder_path) and the head as a standard
+   checkpoint models/emotion_classifier_<name>.safetensors.
+4. Report: held-out accuracy / macro F1 and single-lyric CPU latency of
+   the student, the teacher and the existing MiniLM checkpoint, written
+   to models/emotion_classifier_<name>.distill.json.
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+from data_utils import (
+    MODELS_DIR,
+    RANDOM_SEED,
+    ROOT_DIR,
+    TARGET_COL,
+    TEXT_COL,
+    downsample,
+    encode_labels,
+    heldout_split,
+    load_clean_dataset,
+    load_embeddings,
+    notebook_split,
+)
+from embedding_store import texts_fingerprint
+from emo_inference import (
+    encode_texts,
+    load_head,
+    predict_batch,
+    predict_embeddings,
+    resolve_encoder_path,
+    save_checkpoint,
+)
+from emo_models import HEADS
+
+DISTILL_DIR = ROOT_DIR / "data/distill"
+
+# Rows per teacher head pass when caching teacher outputs
+TEACHER_CHUNK_ROWS = 8192
+
+# Student training defaults (sized for a CPU run)
+MAX_TRAIN_ROWS = 20_000
+EPOCHS = 2
+BATCH_SIZE = 16
+ENCODER_LR = 2e-5
+HEAD_LR = 1e-3
+MAX_SEQ_LENGTH = 256
+DISTILL_TEMPERATURE = 2.0
+DISTILL_ALPHA = 0.7
+
+# Evaluation
+EVAL_ROWS = 2000
+LATENCY_SAMPLES = 50
+
+
+# =========================================================
+# Teacher outputs (cached)
+# =========================================================
+
+def teacher_probs(teacher: str, df) -> np.ndarray:
+    """
+    Teacher probabilities for every row of the cleaned dataset (row_idx
+    order, checkpoint label order), cached per teacher and dataset version.
+    """
+    fingerprint = texts_fingerprint(df.sort_values("row_idx")[TEXT_COL].tolist())[:16]
+    path = DISTILL_DIR / f"{Path(teacher).stem}.{fingerprint}.probs.npy"
+    if path.exists():
+        print(f"Using cached teacher outputs {path}")
+        return np.load(path, mmap_mode="r")
+
+    model, _, scaler, ckpt = load_head(teacher, device="cpu")
+    DISTILL_DIR.mkdir(parents=True, exist_ok=True)
+    ordered = df.sort_values("row_idx")
+    chunks = []
+    for start in range(0, len(ordered), TEACHER_CHUNK_ROWS):
+        part = ordered.iloc[start:start + TEACHER_CHUNK_ROWS]
+        embeddings = load_embeddings(part, ckpt["sentence_transformer_name"], getattr(scaler, "projection", None))
+        chunks.append(predict_embeddings(model, embeddings, scaler).astype(np.float32))
+        print(f"Teacher outputs {min(start + TEACHER_CHUNK_ROWS, len(ordered))}/{len(ordered)}")
+    np.save(path, np.concatenate(chunks))
+    print("Saved teacher outputs to", path)
+    return np.load(path, mmap_mode="r")
+
+
+# =========================================================
+# Student
+# =========================================================
+
+def truncate_layers(encoder, n_layers: int) -> None:
+    """Keep only the first n_layers transformer layers of a sentence-transformer."""
+    auto_model = encoder[0].auto_model
+    layers = auto_model.encoder.layer
+    if n_layers >= len(layers):
+        return
+    auto_model.encoder.layer = layers[:n_layers]
+    auto_model.config.num_hidden_layers = n_layers
+
+
+def distill(
+    encoder,
+    head,
+    texts,
+    soft_targets: np.ndarray,
+    labels: np.ndarray,
+    epochs: int,
+    temperature: float,
+    alpha: float,
+) -> None:
+    """Fine-tune encoder + head on teacher soft targets and hard labels."""
+    import torch
+    import torch.nn.functional as F
+    from sentence_transformers.util import batch_to_device
+
+    optimizer = torch.optim.AdamW([
+        {"params": encoder.parameters(), "lr": ENCODER_LR},
+        {"params": head.parameters(), "lr": HEAD_LR},
+    ])
+    targets = torch.from_numpy(np.ascontiguousarray(soft_targets))
+    y = torch.from_numpy(labels)
+    generator = torch.Generator().manual_seed(RANDOM_SEED)
+
+    encoder.train()
+    head.train()
+    t0 = time.perf_counter()
+    for epoch in range(1, epochs + 1):
+        running_loss, seen = 0.0, 0
+        for step, idx in enumerate(torch.randperm(len(texts), generator=generator).split(BATCH_SIZE), 1):
+            features = batch_to_device(encoder.tokenize([texts[i] for i in idx]), encoder.device)
+            logits = head(encoder(features)["sentence_embedding"])
+
+            soft = F.kl_div(
+                F.log_softmax(logits / temperature, dim=1), targets[idx], reduction="batchmean"
+            ) * temperature ** 2
+            hard = F.cross_entropy(logits, y[idx])
+            loss = alpha * soft + (1 - alpha) * hard
+
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            running_loss += loss.item() * len(idx)
+            seen += len(idx)
+            if step % 100 == 0:
+                rate = seen / max(time.perf_counter() - t0, 1e-9)
+                print(f"Epoch {epoch} step {step} - loss {running_loss / seen:.4f} ({rate:.1f} texts/s)")
+        print(f"Epoch {epoch}/{epochs} - Loss: {running_loss / seen:.4f}")
+
+    encoder.eval()
+    head.eval()
+
+
+# =========================================================
+# Report
+# =========================================================
+
+def accuracy_f1(probs: np.ndarray, y: np.ndarray) -> dict:
+    from sklearn.metrics import f1_score
+
+    pred = probs.argmax(axis=1)
+    return {
+        "accuracy": float(np.mean(pred == y)),
+        "f1_macro": float(f1_score(y, pred, average="macro", zero_division=0)),
+    }
+
+
+def single_text_latency(model, encoder, scaler, texts) -> dict:
+    """p50 / p95 milliseconds to score one lyric at a time."""
+    predict_batch(model, encoder, [texts[0]], scaler)  # warm-up
+    times = []
+    for text in texts:
+        start = time.perf_counter()
+        predict_batch(model, encoder, [text], scaler)
+        times.append((time.perf_counter() - start) * 1000)
+    return {"p50_ms": float(np.percentile(times, 50)), "p95_ms": float(np.percentile(times, 95))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distill the teacher classifier into a small student")
+    parser.add_argument(
+        "--teacher",
+        default=str(MODELS_DIR / "emotion_classifier_all-mpnet-base-v2_LinearReLUDropoutLinearNet.safetensors"),
+        help="Teacher checkpoint with its own scaler (default: train_head.py's mpnet output)",
+    )
+    parser.add_argument("--student", default="sentence-transformers/all-MiniLM-L6-v2")
+    parser.add_argument("--baseline", default=str(MODELS_DIR / "emotion_classifier_all-MiniLM-L6-v2.pt"))
+    parser.add_argument("--layers", type=int, default=0, help="Keep the first N encoder layers (0 = all)")
+    parser.add_argument("--architecture", choices=sorted(HEADS), default="LinearReLUDropoutLinearNet")
+    parser.add_argument("--max-train-rows", type=int, default=MAX_TRAIN_ROWS)
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--max-seq-length", type=int, default=MAX_SEQ_LENGTH)
+    parser.add_argument("--temperature", type=float, default=DISTILL_TEMPERATURE)
+    parser.add_argument("--alpha", type=float, default=DISTILL_ALPHA)
+    parser.add_argument("--eval-rows", type=int, default=EVAL_ROWS)
+    parser.add_argument("--latency-samples", type=int, default=LATENCY_SAMPLES)
+    args = parser.parse_args()
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    from emo_scores import apply_temperature
+
+    # Fails fast on a teacher whose scaler does not match its embeddings
+    try:
+        _, label_classes, _, _ = load_head(args.teacher, device="cpu")
+    except ValueError as e:
+        parser.error(str(e))
+    n_classes = len(label_classes)
+
+    # ---- Teacher soft targets for a sample of the notebook's train split ----
+    full_df = load_clean_dataset()
+    probs_all = teacher_probs(args.teacher, full_df)
+
+    df = downsample(full_df)
+    y = encode_labels(df[TARGET_COL], label_classes)
+    train_idx, _ = notebook_split(df, y)
+    rng = np.random.default_rng(RANDOM_SEED)
+    train_idx = rng.permutation(train_idx)[: args.max_train_rows]
+    train_df = df.iloc[train_idx]
+    soft_targets = apply_temperature(
+        np.asarray(probs_all[train_df["row_idx"].to_numpy()], dtype=np.float64), args.temperature
+    ).astype(np.float32)
+
+    # ---- Student ----
+    student = SentenceTransformer(resolve_encoder_path(args.student), device="cpu")
+    if args.layers:
+        truncate_layers(student, args.layers)
+    student.max_seq_length = args.max_seq_length
+    head = HEADS[args.architecture](student.get_sentence_embedding_dimension(), n_classes)
+
+    print(f"Distilling into {args.student} ({args.layers or 'all'} layers) on {len(train_df)} texts...")
+    t0 = time.perf_counter()
+    distill(
+        student, head, train_df[TEXT_COL].tolist(), soft_targets, y[train_idx],
+        args.epochs, args.temperature, args.alpha,
+    )
+    train_seconds = time.perf_counter() - t0
+
+    # ---- Export ----
+    student_name = f"distilled-{args.student.split('/')[-1]}" + (f"-L{args.layers}" if args.layers else "")
+    student.save(str(MODELS_DIR / student_name))
+    ckpt_path = MODELS_DIR / f"emotion_classifier_{student_name}.safetensors"
+    save_checkpoint(
+        ckpt_path,
+        head,
+        {
+            "input_dim": student.get_sentence_embedding_dimension(),
+            "n_classes": n_classes,
+            "label_classes": [str(label) for label in label_classes],
+            "sentence_transformer_name": student_name,
+            "use_class_weights": False,
+            "class_weights": None,
+            "architecture": args.architecture,
+            "distillation": {
+                "teacher": Path(args.teacher).name,
+                "student_base": args.student,
+                "layers": args.layers or None,
+                "temperature": args.temperature,
+                "alpha": args.alpha,
+                "train_rows": len(train_df),
+                "epochs": args.epochs,
+            },
+        },
+    )
+    print("Saved student encoder to", MODELS_DIR / student_name)
+    print("Saved model checkpoint to", ckpt_path)
+
+    # ---- Report: held-out accuracy and single-lyric latency ----
+    test_df, y_test = heldout_split(label_classes)
+    eval_idx = rng.permutation(len(test_df))[: args.eval_rows]
+    eval_df, y_eval = test_df.iloc[eval_idx], y_test[eval_idx]
+    eval_texts = eval_df[TEXT_COL].tolist()
+    latency_texts = eval_texts[: args.latency_samples]
+
+    report = {"train_seconds": train_seconds, "eval_rows": len(eval_df), "models": {}}
+    with torch.no_grad():
+        student_probs = predict_embeddings(head, encode_texts(student, eval_texts))
+    report["models"]["student"] = {
+        "checkpoint": ckpt_path.name,
+        **accuracy_f1(student_probs, y_eval),
+        **single_text_latency(head, student, None, latency_texts),
+    }
+
+    for role, checkpoint in [("teacher", args.teacher), ("minilm", args.baseline)]:
+        if not Path(checkpoint).exists():
+            print(f"Skipping {role}: {checkpoint} not found")
+            continue
+        try:
+            model, classes, scaler, ckpt = load_head(checkpoint, device="cpu")
+        except ValueError as e:  # scaler / input_dim mismatch
+            print(f"Skipping {role}: {e}")
+            report["models"][role] = {"checkpoint": Path(checkpoint).name, "skipped": str(e)}
+            continue
+        if list(classes) != list(label_classes):
+            raise ValueError(f"{checkpoint} classes {classes} differ from the teacher's {label_classes}")
+        encoder = SentenceTransformer(resolve_encoder_path(ckpt["sentence_transformer_name"]), device="cpu")
+        embeddings = load_embeddings(eval_df, ckpt["sentence_transformer_name"], getattr(scaler, "projection", None))
+        probs = predict_embeddings(model, embeddings, scaler)
+        report["models"][role] = {
+            "checkpoint": Path(checkpoint).name,
+            **accuracy_f1(probs, y_eval),
+            **single_text_latency(model, encoder, scaler, latency_texts),
+        }
+
+    print(f"\n{'model':<10}{'accuracy':>10}{'f1_macro':>10}{'p50_ms':>10}{'p95_ms':>10}")
+    for role, row in report["models"].items():
+        if "skipped" in row:
+            continue
+        print(f"{role:<10}{row['accuracy']:>10.4f}{row['f1_macro']:>10.4f}{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}")
+
+    report_path = ckpt_path.with_suffix(".distill.json")
+    report_path.write_text(json.dumps(report, indent=2))
+    print("Saved report to", report_path)
+
+
+if __name__ == "__main__":
+    main()
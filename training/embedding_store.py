@@ -0,0 +1,206 @@
+"""
+Versioned, content-hashed store of sentence-transformer embeddings.
+
+One entry per (encoder, cleaned dataset) pair:
+
+    data/embeddings/<encoder>/<key>/embeddings.npy   (n_rows, dim) float32
+    data/embeddings/<encoder>/<key>/manifest.json
+
+key hashes the store format, the encoder name, the encoder's max sequence
+length and the exact texts it encodes (in row_idx order). Any change to
+the cleaning pipeline changes the texts and therefore the key, so a
+stale cache is never read: it is simply a different entry. The manifest
+is written last; an entry without one is incomplete and gets rebuilt.
+
+A checkpoint with a projection (emo_inference.EmbeddingProjection) also
+gets a float16 copy of the entry in its reduced dimension, built from the
+full-size entry:
+
+    data/embeddings/<encoder>/<key>/projected-<projection key>.npy
+
+This replaces the notebook's manual RECOMPUTE_EMBEDDINGS flag.
+"""
+import functools
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from data_utils import ROOT_DIR, TEXT_COL, embeddings_path
+
+STORE_DIR = ROOT_DIR / "data/embeddings"
+STORE_FORMAT_VERSION = 1
+
+# Texts encoded (and flushed to disk) per step while building an entry
+BUILD_CHUNK_ROWS = 4096
+
+
+def texts_fingerprint(texts) -> str:
+    """sha256 of the texts, in order."""
+    digest = hashlib.sha256()
+    for text in texts:
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def store_key(encoder_name: str, max_seq_length: int, fingerprint: str) -> str:
+    payload = json.dumps(
+        {
+            "format": STORE_FORMAT_VERSION,
+            "encoder": encoder_name,
+            "max_seq_length": max_seq_length,
+            "texts_sha256": fingerprint,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def entry_dir(encoder_name: str, key: str) -> Path:
+    return STORE_DIR / encoder_name.split("/")[-1] / key
+
+
+@functools.lru_cache(maxsize=None)
+def _load_encoder(encoder_name: str):
+    from sentence_transformers import SentenceTransformer
+
+    from emo_inference import resolve_encoder_path
+
+    return SentenceTransformer(resolve_encoder_path(encoder_name))
+
+
+def _check_manifest(manifest: dict, encoder_name: str, fingerprint: str, n_rows: int) -> None:
+    """Raise ValueError unless an entry was built for these inputs."""
+    expected = {
+        "format": STORE_FORMAT_VERSION,
+        "encoder": encoder_name,
+        "texts_sha256": fingerprint,
+        "n_rows": n_rows,
+    }
+    mismatched = {k: (manifest.get(k), v) for k, v in expected.items() if manifest.get(k) != v}
+    if mismatched:
+        raise ValueError(f"Embedding store entry does not match (found, expected): {mismatched}")
+
+
+def load_or_build(
+    df: pd.DataFrame,
+    encoder_name: str,
+    rebuild: bool = False,
+    adopt_notebook_cache: bool = False,
+) -> np.ndarray:
+    """
+    Embeddings of every row of df (the full cleaned dataset, row_idx order).
+
+    Returns a read-only memory map. The entry is built with
+    emo_inference.encode_texts when missing (or when rebuild is set). With
+    adopt_notebook_cache, an existing notebook .npy cache of the right
+    shape is copied into the store instead of re-encoding; it cannot be
+    verified, so only use it if it was built from the current dataset.
+    """
+    texts = df.sort_values("row_idx")[TEXT_COL].tolist()
+    fingerprint = texts_fingerprint(texts)
+    max_seq_length = _max_seq_length(encoder_name)
+    key = store_key(encoder_name, max_seq_length, fingerprint)
+    directory = entry_dir(encoder_name, key)
+    manifest_path = directory / "manifest.json"
+    data_path = directory / "embeddings.npy"
+
+    if manifest_path.exists() and not rebuild:
+        manifest = json.loads(manifest_path.read_text())
+        _check_manifest(manifest, encoder_name, fingerprint, len(texts))
+        print(f"Using embedding store entry {directory}")
+        return np.load(data_path, mmap_mode="r")
+
+    directory.mkdir(parents=True, exist_ok=True)
+    legacy = embeddings_path(encoder_name)
+    if adopt_notebook_cache and legacy.exists():
+        cached = np.load(legacy, mmap_mode="r")
+        if cached.shape[0] != len(texts):
+            raise ValueError(f"{legacy} has {cached.shape[0]} rows, dataset has {len(texts)}")
+        print(f"Adopting notebook cache {legacy} (unverified) into {directory}")
+        out = np.lib.format.open_memmap(data_path, mode="w+", dtype=np.float32, shape=cached.shape)
+        out[:] = cached
+        source = f"adopted:{legacy.name}"
+    else:
+        from emo_inference import encode_texts
+
+        encoder = _load_encoder(encoder_name)
+        dim = encoder.get_sentence_embedding_dimension()
+        out = np.lib.format.open_memmap(data_path, mode="w+", dtype=np.float32, shape=(len(texts), dim))
+        t0 = time.perf_counter()
+        for start in range(0, len(texts), BUILD_CHUNK_ROWS):
+            end = min(start + BUILD_CHUNK_ROWS, len(texts))
+            out[start:end] = encode_texts(encoder, texts[start:end])
+            rate = end / max(time.perf_counter() - t0, 1e-9)
+            print(f"Encoded {end}/{len(texts)} texts ({rate:.0f} texts/s)")
+        source = "encoded"
+    out.flush()
+
+    manifest = {
+        "format": STORE_FORMAT_VERSION,
+        "encoder": encoder_name,
+        "max_seq_length": max_seq_length,
+        "texts_sha256": fingerprint,
+        "n_rows": len(texts),
+        "dim": int(out.shape[1]),
+        "source": source,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    tmp_path = manifest_path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(manifest, indent=2))
+    os.replace(tmp_path, manifest_path)
+    print(f"Saved embedding store entry {directory}")
+    del out
+    return np.load(data_path, mmap_mode="r")
+
+
+def load_or_build_projected(
+    df: pd.DataFrame,
+    encoder_name: str,
+    projection,
+    rebuild: bool = False,
+) -> np.ndarray:
+    """
+    float16 (n_rows, projection.dim) embeddings of every row of df.
+
+    Read-only memory map next to the full-size entry, named after the
+    projection's content hash; built chunk by chunk from that entry (which
+    is built first if needed). The file is written under a temporary name
+    and renamed when complete.
+    """
+    full = load_or_build(df, encoder_name)
+    if full.shape[1] != projection.input_dim:
+        raise ValueError(
+            f"Projection expects {projection.input_dim}-d embeddings, {encoder_name} has {full.shape[1]}"
+        )
+    data_path = Path(full.filename).with_name(f"projected-{projection.key}.npy")
+    if data_path.exists() and not rebuild:
+        return np.load(data_path, mmap_mode="r")
+
+    tmp_path = data_path.with_suffix(".tmp.npy")
+    out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float16, shape=(len(full), projection.dim))
+    for start in range(0, len(full), BUILD_CHUNK_ROWS):
+        out[start:start + BUILD_CHUNK_ROWS] = projection.transform(full[start:start + BUILD_CHUNK_ROWS])
+    out.flush()
+    del out
+    os.replace(tmp_path, data_path)
+    print(
+        f"Saved projected embeddings {data_path} "
+        f"({data_path.stat().st_size / 1e6:.0f} MB, full size {Path(full.filename).stat().st_size / 1e6:.0f} MB)"
+    )
+    return np.load(data_path, mmap_mode="r")
+
+
+def _max_seq_length(encoder_name: str) -> int:
+    """Encoder max sequence length (sentence_bert_config.json, else loads it)."""
+    from emo_inference import resolve_encoder_path
+
+    config = Path(resolve_encoder_path(encoder_name)) / "sentence_bert_config.json"
+    if config.exists():
+        return int(json.loads(config.read_text())["max_seq_length"])
+    return int(_load_encoder(encoder_name).max_seq_length)
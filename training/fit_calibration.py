@@ -0,0 +1,65 @@
+"""
+Fit temperature-scaling calibration for a checkpoint.
+
+Run from training/:
+
+    python fit_calibration.py --checkpoint models/emotion_classifier_v2.pt
+
+Uses the notebook's held-out test split: the temperature is fitted on one
+half and NLL / ECE are reported on the other. The result is written next
+to the checkpoint as <stem>.calibration.json and picked up automatically
+by emo_inference.score_matrix().
+"""
+import argparse
+import json
+
+import numpy as np
+
+from data_utils import MODELS_DIR, RANDOM_SEED, heldout_split, load_embeddings
+from emo_inference import load_head, predict_embeddings
+from emo_scores import (
+    apply_temperature,
+    calibration_path,
+    expected_calibration_error,
+    fit_temperature,
+    negative_log_likelihood,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit temperature scaling on held-out data")
+    parser.add_argument("--checkpoint", default=str(MODELS_DIR / "emotion_classifier_v2.pt"))
+    args = parser.parse_args()
+
+    model, label_classes, scaler, ckpt = load_head(args.checkpoint)
+    test_df, y_test = heldout_split(label_classes)
+    embeddings = load_embeddings(test_df, ckpt["sentence_transformer_name"], getattr(scaler, "projection", None))
+    probs = predict_embeddings(model, embeddings, scaler)
+
+    # Fit on one half of the held-out rows, evaluate on the other half
+    rng = np.random.default_rng(RANDOM_SEED)
+    order = rng.permutation(len(y_test))
+    fit_idx, eval_idx = order[: len(order) // 2], order[len(order) // 2:]
+
+    temperature = fit_temperature(probs[fit_idx], y_test[fit_idx])
+    before, after = probs[eval_idx], apply_temperature(probs[eval_idx], temperature)
+    report = {
+        "temperature": temperature,
+        "n_fit": int(len(fit_idx)),
+        "n_eval": int(len(eval_idx)),
+        "nll_before": negative_log_likelihood(before, y_test[eval_idx]),
+        "nll_after": negative_log_likelihood(after, y_test[eval_idx]),
+        "ece_before": expected_calibration_error(before, y_test[eval_idx]),
+        "ece_after": expected_calibration_error(after, y_test[eval_idx]),
+    }
+
+    for key, value in report.items():
+        print(f"{key:>12}: {value:.4f}" if isinstance(value, float) else f"{key:>12}: {value}")
+
+    out_path = calibration_path(args.checkpoint)
+    out_path.write_text(json.dumps(report, indent=2))
+    print("Saved calibration to", out_path)
+
+
+if __name__ == "__main__":
+    main()
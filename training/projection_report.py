@@ -0,0 +1,91 @@
+"""
+Accuracy vs. embedding dimension for projected heads.
+
+Run from training/:
+
+    python projection_report.py --encoder sentence-transformers/all-mpnet-base-v2 --dims 64 128 256
+
+For each projection kind and dimension, a projection is fitted on the
+notebook's train split and a head is trained on the projected embeddings
+(same recipe as train_head.py); the full-dimension head is the baseline.
+Rows report held-out accuracy / macro F1, head CPU latency per 1,000
+embeddings and the size of the dataset's embedding store (float32 full,
+float16 projected). The report is written to
+models/projection_report_<encoder>.json; train the chosen configuration
+with train_head.py --projection <kind> --dim <N>.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from data_utils import DOWNSAMPLING_MAX_MULTIPLIER, MODELS_DIR, RANDOM_SEED, load_clean_dataset
+from embedding_store import load_or_build
+from emo_inference import PROJECTION_KINDS, EmbeddingProjection, predict_embeddings
+from emo_models import HEADS
+from train_head import fit_and_evaluate, prepare_split
+
+DIMS = [64, 128, 256]
+LATENCY_ROWS = 1000
+LATENCY_REPEATS = 20
+
+
+def head_latency_ms(model, n_features: int) -> float:
+    """Median ms to run the head on LATENCY_ROWS embeddings (CPU)."""
+    X = np.random.default_rng(0).normal(size=(LATENCY_ROWS, n_features)).astype(np.float32)
+    times = []
+    for _ in range(LATENCY_REPEATS):
+        t0 = time.perf_counter()
+        predict_embeddings(model, X)
+        times.append((time.perf_counter() - t0) * 1000)
+    return float(np.median(times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuracy vs. dimension of projected heads")
+    parser.add_argument("--encoder", default="sentence-transformers/all-mpnet-base-v2")
+    parser.add_argument("--architecture", choices=sorted(HEADS), default="LinearReLUDropoutLinearNet")
+    parser.add_argument("--kinds", nargs="*", choices=PROJECTION_KINDS, default=list(PROJECTION_KINDS))
+    parser.add_argument("--dims", type=int, nargs="*", default=DIMS)
+    parser.add_argument("--max-multiplier", type=float, default=DOWNSAMPLING_MAX_MULTIPLIER)
+    args = parser.parse_args()
+
+    df = load_clean_dataset()
+    full = load_or_build(df, args.encoder)
+    label_classes, X_train, X_test, y_train, y_test = prepare_split(full, df, args.max_multiplier)
+    n_classes, full_dim = len(label_classes), X_train.shape[1]
+
+    configs = [(None, full_dim)] + [(kind, dim) for kind in args.kinds for dim in args.dims if dim < full_dim]
+    rows = []
+    for kind, dim in configs:
+        projection = EmbeddingProjection.fit(X_train, kind, dim, seed=RANDOM_SEED) if kind else None
+        print(f"Training {kind or 'full'} {dim}-d head", flush=True)
+        result = fit_and_evaluate(
+            args.architecture, X_train, X_test, y_train, y_test, n_classes, projection=projection
+        )
+        bytes_per_value = 2 if kind else 4  # projected stores are float16
+        rows.append({
+            "projection": kind or "none",
+            "dim": dim,
+            **result["metrics"],
+            "head_ms_per_1k": head_latency_ms(result["model"], dim),
+            "store_mb": len(df) * dim * bytes_per_value / 1e6,
+        })
+
+    baseline = rows[0]
+    print(f"\n{'projection':<12}{'dim':>6}{'accuracy':>10}{'d_acc':>8}{'f1':>8}{'head_ms':>9}{'store_mb':>10}")
+    for row in rows:
+        print(
+            f"{row['projection']:<12}{row['dim']:>6}{row['accuracy']:>10.4f}"
+            f"{row['accuracy'] - baseline['accuracy']:>+8.4f}{row['f1']:>8.4f}"
+            f"{row['head_ms_per_1k']:>9.2f}{row['store_mb']:>10.0f}"
+        )
+
+    out_path = MODELS_DIR / f"projection_report_{args.encoder.split('/')[-1]}.json"
+    out_path.write_text(json.dumps({"encoder": args.encoder, "n_rows": len(df), "rows": rows}, indent=2))
+    print("Saved report to", out_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Train a classifier head on cached sentence-transformer embeddings.
+
+Run from training/:
+
+    python train_head.py --encoder sentence-transformers/all-MiniLM-L6-v2 \
+        --architecture SimpleLinearNet --max-multiplier 5
+
+Embeddings come from the content-hashed embedding store
+(embedding_store.py), so trying another head or downsampling setting
+never re-runs the encoder: the store entry is only built the first time
+an encoder is used on a given version of the cleaned dataset. The data
+preparation, class weights, loss and optimizer follow the notebook.
+
+With --projection pca|truncate --dim N, the embeddings are first reduced
+to N dimensions by a projection fitted on the train split, which is
+stored in the checkpoint and applied before the scaler at inference.
+
+The output is a .safetensors checkpoint (head weights, projection, scaler
+mean/scale and the notebook's export metadata), loadable with
+emo_inference.load_model().
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+
+from data_utils import (
+    DOWNSAMPLING_MAX_MULTIPLIER,
+    MODELS_DIR,
+    RANDOM_SEED,
+    TARGET_COL,
+    downsample,
+    encode_labels,
+    load_clean_dataset,
+    notebook_split,
+)
+from embedding_store import load_or_build
+from emo_inference import PROJECTION_KINDS, EmbeddingProjection, save_checkpoint
+from emo_models import HEADS
+
+# Same hyperparameters as the notebook (Cell 2 / Cell 6)
+BATCH_SIZE = 32
+NUM_EPOCHS = 15
+LEARNING_RATE = 1e-3
+LABEL_SMOOTHING = 0.1
+DROPOUT_RATE = 0.0
+
+
+def train_head(
+    architecture: str,
+    X_train: np.ndarray,
+    y_train: np.ndarray,
+    n_classes: int,
+    epochs: int = NUM_EPOCHS,
+    batch_size: int = BATCH_SIZE,
+    lr: float = LEARNING_RATE,
+    class_weights: np.ndarray | None = None,
+    dropout: float = DROPOUT_RATE,
+):
+    """Train a head with Adam + (weighted, label-smoothed) cross-entropy."""
+    import torch
+    import torch.nn as nn
+
+    torch.manual_seed(RANDOM_SEED)
+    model = HEADS[architecture](X_train.shape[1], n_classes, dropout=dropout)
+    optimizer = torch.optim.Adam(model.parameters(), lr=lr)
+    weight = torch.from_numpy(class_weights) if class_weights is not None else None
+    criterion = nn.CrossEntropyLoss(weight=weight, label_smoothing=LABEL_SMOOTHING)
+
+    X = torch.from_numpy(X_train)
+    y = torch.from_numpy(y_train)
+    for epoch in range(1, epochs + 1):
+        model.train()
+        running_loss = 0.0
+        for idx in torch.randperm(len(X)).split(batch_size):
+            optimizer.zero_grad()
+            loss = criterion(model(X[idx]), y[idx])
+            loss.backward()
+            optimizer.step()
+            running_loss += loss.item() * len(idx)
+        if epoch % 5 == 0 or epoch == 1:
+            print(f"Epoch {epoch}/{epochs} - Loss: {running_loss / len(X):.4f}")
+
+    model.eval()
+    return model
+
+
+def prepare_split(full: np.ndarray, df, max_multiplier: float):
+    """Downsample df and split its stored embeddings like the notebook."""
+    df = downsample(df, max_multiplier)
+    label_classes = sorted(df[TARGET_COL].unique())  # same order as LabelEncoder
+    y = encode_labels(df[TARGET_COL], label_classes)
+    X = np.asarray(full[df["row_idx"].to_numpy()], dtype=np.float32)
+    train_idx, test_idx = notebook_split(df, y)
+    return label_classes, X[train_idx], X[test_idx], y[train_idx], y[test_idx]
+
+
+def fit_and_evaluate(
+    architecture: str,
+    X_train: np.ndarray,
+    X_test: np.ndarray,
+    y_train: np.ndarray,
+    y_test: np.ndarray,
+    n_classes: int,
+    projection: EmbeddingProjection | None = None,
+    scale: bool = True,
+    use_class_weights: bool = True,
+    epochs: int = NUM_EPOCHS,
+    lr: float = LEARNING_RATE,
+) -> dict:
+    """
+    Project (optional), scale (optional) and train a head; evaluate on X_test.
+
+    Returns model, scaler, class_weights, y_pred and metrics (precision /
+    recall / f1 macro, accuracy).
+    """
+    import torch
+    from sklearn.metrics import precision_recall_fscore_support
+    from sklearn.preprocessing import StandardScaler
+
+    if projection is not None:
+        X_train, X_test = projection.transform(X_train), projection.transform(X_test)
+
+    scaler = None
+    if scale:
+        scaler = StandardScaler()
+        X_train = scaler.fit_transform(X_train).astype(np.float32)
+        X_test = scaler.transform(X_test).astype(np.float32)
+
+    class_weights = None
+    if use_class_weights:
+        counts = np.bincount(y_train, minlength=n_classes)
+        class_weights = (len(y_train) / (n_classes * counts)).astype(np.float32)
+
+    model = train_head(
+        architecture, X_train, y_train, n_classes,
+        epochs=epochs, lr=lr, class_weights=class_weights,
+    )
+
+    with torch.no_grad():
+        y_pred = model(torch.from_numpy(X_test)).argmax(dim=1).numpy()
+    precision, recall, f1, _ = precision_recall_fscore_support(
+        y_test, y_pred, average="macro", zero_division=0
+    )
+    metrics = {
+        "precision": float(precision),
+        "recall": float(recall),
+        "f1": float(f1),
+        "accuracy": float(np.mean(y_pred == y_test)),
+    }
+    return {"model": model, "scaler": scaler, "class_weights": class_weights, "y_pred": y_pred, "metrics": metrics}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train a head on cached embeddings")
+    parser.add_argument("--encoder", default="sentence-transformers/all-MiniLM-L6-v2")
+    parser.add_argument("--architecture", choices=sorted(HEADS), default="LinearReLUDropoutLinearNet")
+    parser.add_argument("--max-multiplier", type=float, default=DOWNSAMPLING_MAX_MULTIPLIER)
+    parser.add_argument("--epochs", type=int, default=NUM_EPOCHS)
+    parser.add_argument("--lr", type=float, default=LEARNING_RATE)
+    parser.add_argument("--no-class-weights", action="store_true")
+    parser.add_argument("--no-scale", action="store_true", help="Train on unscaled embeddings")
+    parser.add_argument("--projection", choices=PROJECTION_KINDS, default=None,
+                        help="Reduce the embeddings before the scaler (fitted on the train split)")
+    parser.add_argument("--dim", type=int, default=256, help="Projected dimension (with --projection)")
+    parser.add_argument("--rebuild-embeddings", action="store_true")
+    parser.add_argument(
+        "--adopt-notebook-cache",
+        action="store_true",
+        help="Copy an existing data/spotify_lyrics_embeddings_*.npy into the store (unverified)",
+    )
+    parser.add_argument("--output", default=None, help="Checkpoint path (default: models/...)")
+    args = parser.parse_args()
+
+    from sklearn.metrics import classification_report
+
+    df = load_clean_dataset()
+    full = load_or_build(df, args.encoder, args.rebuild_embeddings, args.adopt_notebook_cache)
+
+    t0 = time.perf_counter()
+    label_classes, X_train, X_test, y_train, y_test = prepare_split(full, df, args.max_multiplier)
+    projection = None
+    if args.projection:
+        projection = EmbeddingProjection.fit(X_train, args.projection, args.dim, seed=RANDOM_SEED)
+
+    n_classes = len(label_classes)
+    result = fit_and_evaluate(
+        args.architecture, X_train, X_test, y_train, y_test, n_classes,
+        projection=projection, scale=not args.no_scale, use_class_weights=not args.no_class_weights,
+        epochs=args.epochs, lr=args.lr,
+    )
+    metrics, class_weights = result["metrics"], result["class_weights"]
+    print(f"\nTrained in {time.perf_counter() - t0:.1f}s")
+    print(
+        f"Precision: {metrics['precision']:.4f} | Recall: {metrics['recall']:.4f} | "
+        f"F1: {metrics['f1']:.4f} | Accuracy: {metrics['accuracy']:.4f}"
+    )
+    print(classification_report(y_test, result["y_pred"], target_names=label_classes, zero_division=0))
+
+    encoder_short = args.encoder.split("/")[-1]
+    suffix = f"_{projection.kind}{projection.dim}" if projection is not None else ""
+    out_path = Path(
+        args.output or MODELS_DIR / f"emotion_classifier_{encoder_short}_{args.architecture}{suffix}.safetensors"
+    )
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+
+    metadata = {
+        "input_dim": projection.dim if projection is not None else int(X_train.shape[1]),
+        "n_classes": n_classes,
+        "label_classes": [str(label) for label in label_classes],
+        "sentence_transformer_name": args.encoder,
+        "use_class_weights": class_weights is not None,
+        "class_weights": class_weights.tolist() if class_weights is not None else None,
+        "architecture": args.architecture,
+        "downsampling_max_multiplier": args.max_multiplier,
+        "test_metrics": metrics,
+    }
+    save_checkpoint(out_path, result["model"], metadata, result["scaler"], projection)
+    print("Saved model checkpoint to", out_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Tune the confidence threshold of the small -> large model cascade.
+
+Run from training/:
+
+    python train_head.py --encoder sentence-transformers/all-mpnet-base-v2
+    python tune_cascade.py --small models/emotion_classifier_all-MiniLM-L6-v2.pt \
+        --large models/emotion_classifier_all-mpnet-base-v2_LinearReLUDropoutLinearNet.safetensors
+
+The large checkpoint needs a scaler fitted on its own embeddings. The
+notebook's legacy mpnet .pt shares the 384-d MiniLM scaler.joblib and is
+rejected, so train the large head with train_head.py first, as above.
+
+Both checkpoints score the notebook's held-out split (from the embedding
+store, so nothing is re-encoded). On one half, the threshold on the small
+model's confidence (top-1/top-2 margin or entropy) is set to the lowest
+value whose cascade reaches the target accuracy; the other half reports
+cascade accuracy and escalation rate. The result is written next to the
+small checkpoint as <stem>.cascade.json and used by emo_inference when
+EMOLYRICS_CASCADE=1 and the small checkpoint is EMOLYRICS_CHECKPOINT.
+"""
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+
+from data_utils import MODELS_DIR, RANDOM_SEED, heldout_split, load_embeddings
+from emo_inference import load_head, predict_embeddings, probs_to_matrix
+from emo_scores import (
+    EmotionSchema,
+    apply_temperature,
+    cascade_confidence,
+    cascade_path,
+    load_temperature,
+    tune_cascade_threshold,
+)
+
+
+def heldout_scores(checkpoint: str, test_df, schema: EmotionSchema) -> np.ndarray:
+    """Calibrated held-out scores of a checkpoint, in schema order."""
+    model, label_classes, scaler, ckpt = load_head(checkpoint)
+    embeddings = load_embeddings(test_df, ckpt["sentence_transformer_name"], getattr(scaler, "projection", None))
+    probs = predict_embeddings(model, embeddings, scaler)
+    return apply_temperature(probs_to_matrix(probs, label_classes, schema), load_temperature(checkpoint))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune the cascade escalation threshold")
+    parser.add_argument("--small", default=str(MODELS_DIR / "emotion_classifier_all-MiniLM-L6-v2.pt"))
+    parser.add_argument(
+        "--large",
+        default=str(MODELS_DIR / "emotion_classifier_all-mpnet-base-v2_LinearReLUDropoutLinearNet.safetensors"),
+        help="Large checkpoint with its own scaler (default: train_head.py's mpnet output)",
+    )
+    parser.add_argument("--metric", choices=["margin", "entropy"], default="margin")
+    parser.add_argument(
+        "--target-accuracy",
+        type=float,
+        default=None,
+        help="Cascade accuracy to reach (default: large model accuracy - 0.005)",
+    )
+    args = parser.parse_args()
+
+    _, label_classes, _, _ = load_head(args.small)
+    schema = EmotionSchema.from_label_classes(label_classes)
+    test_df, y_test = heldout_split(label_classes)
+    # y_test indexes label_classes; map it to schema column order
+    y = np.argsort(schema.permutation(label_classes))[y_test]
+
+    try:
+        small = heldout_scores(args.small, test_df, schema)
+        large = heldout_scores(args.large, test_df, schema)
+    except ValueError as e:  # scaler / input_dim mismatch (see load_head)
+        parser.error(str(e))
+    small_correct = small.argmax(axis=1) == y
+    large_correct = large.argmax(axis=1) == y
+    confidence = cascade_confidence(small, args.metric)
+
+    # Tune on one half of the held-out rows, evaluate on the other half
+    rng = np.random.default_rng(RANDOM_SEED)
+    order = rng.permutation(len(y))
+    fit_idx, eval_idx = order[: len(order) // 2], order[len(order) // 2:]
+
+    target = args.target_accuracy
+    if target is None:
+        target = float(large_correct[fit_idx].mean()) - 0.005
+    fit = tune_cascade_threshold(
+        confidence[fit_idx], small_correct[fit_idx], large_correct[fit_idx], target
+    )
+    if not fit["target_reached"]:
+        print(f"Warning: target accuracy {target:.4f} not reachable; using the most accurate threshold.")
+
+    escalate = confidence[eval_idx] < fit["threshold"]
+    cascade_correct = np.where(escalate, large_correct[eval_idx], small_correct[eval_idx])
+    report = {
+        "large_checkpoint": Path(args.large).name,
+        "metric": args.metric,
+        "threshold": fit["threshold"],
+        "target_accuracy": target,
+        "n_fit": int(len(fit_idx)),
+        "n_eval": int(len(eval_idx)),
+        "accuracy_small": float(small_correct[eval_idx].mean()),
+        "accuracy_large": float(large_correct[eval_idx].mean()),
+        "accuracy_cascade": float(cascade_correct.mean()),
+        "escalation_rate": float(escalate.mean()),
+    }
+
+    for key, value in report.items():
+        print(f"{key:>18}: {value:.4f}" if isinstance(value, float) else f"{key:>18}: {value}")
+
+    out_path = cascade_path(args.small)
+    out_path.write_text(json.dumps(report, indent=2))
+    print("Saved cascade config to", out_path)
+
+
+if __name__ == "__main__":
+    main()